@@ -8,342 +8,4199 @@ Logique : Recherche le nœud PE dans cb_nd1 ou cb_nd2 du câble DI
 import zipfile
 import csv
 import sys
-from collections import defaultdict
+import argparse
+import hashlib
+import glob
+import pickle
+import io
+import codecs
+import gzip
+import sqlite3
+import shutil
+import mmap
+import tempfile
+import itertools
+import heapq
+import math
+import json
+import queue
+import threading
+from itertools import compress
+import multiprocessing
+import multiprocessing.connection
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager, nullcontext, redirect_stdout, redirect_stderr
+from operator import itemgetter, methodcaller
+from array import array
 import time
 import os
 from datetime import datetime
 
-def process_ftte_analysis(zip_path):
+# Taille des blocs décompressés lus à chaque appel (mémoire bornée)
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Plans d'indexation des fibres
+# - direct : toutes les fibres dont le câble existe sont indexées
+# - semijoin : une première passe sur t_position.csv collecte les fibres des
+#   cassettes FTTE, seules ces fibres sont ensuite indexées
+FIBRE_PLANS = ('auto', 'direct', 'semijoin')
+
+# En mode auto, le plan semijoin est choisi au-delà de cette taille décompressée de t_fibre.csv
+SEMIJOIN_MIN_FIBRE_SIZE = 128 * 1024 * 1024
+
+# Statut de la résolution câble -> PM (attribut pm_status des câbles)
+PM_RESOLVED = 0
+REJECT_NO_PE = 1
+REJECT_NO_SITE = 2
+REJECT_NO_LOCAL = 3
+
+# Codes de rejet supplémentaires relevés par le diagnostic (--diagnostics)
+REJECT_FIBRE1_NOT_FOUND = 4
+REJECT_FIBRE2_NOT_FOUND = 5
+REJECT_NOT_TR_DI = 6
+REJECT_REASONS = {
+    REJECT_FIBRE1_NOT_FOUND: "Fibre1 non trouvée",
+    REJECT_FIBRE2_NOT_FOUND: "Fibre2 non trouvée",
+    REJECT_NOT_TR_DI: "Pas TR-DI",
+    REJECT_NO_PE: "Pas de PE dans le câble DI",
+    REJECT_NO_SITE: "Site non trouvé pour le PE",
+    REJECT_NO_LOCAL: "Local non trouvé pour le site",
+}
+
+# Diagnostic : nombre maximal d'exemples distincts conservés par cassette et par code de rejet
+DIAGNOSTIC_SAMPLE_SIZE = 3
+
+# Contrôle d'intégrité (--validate) : contrôles -> libellé, par table dans l'ordre de lecture,
+# et nombre maximal d'exemples conservés par contrôle
+INTEGRITY_CHECKS = {
+    'duplicate_cassette': "t_cassette : cs_code en double",
+    'duplicate_cable': "t_cable : cb_code en double",
+    'duplicate_site_node': "t_site : nœud (st_nd_code) rattaché à plusieurs sites",
+    'cable_pe_site': "t_cable → t_site : nœud PE du câble sans site",
+    'duplicate_local': "t_local : lc_code en double",
+    'duplicate_site_sro': "t_local : site avec plusieurs locaux SRO",
+    'local_site': "t_local → t_site : site du local (lc_st_code) absent",
+    'site_sro_local': "t_site → t_local : site de nœud PE sans local SRO",
+    'duplicate_fibre': "t_fibre : fo_code en double",
+    'fibre_cable': "t_fibre → t_cable : câble de la fibre (fo_cb_code) absent",
+    'position_cassette': "t_position → t_cassette : cassette (ps_cs_code) absente",
+    'position_fibre': "t_position → t_fibre : fibre (ps_1, ps_2) absente",
+}
+INTEGRITY_SAMPLE_SIZE = 5
+
+# Fichiers requis dans l'export ZIP
+REQUIRED_FILES = [
+    't_cassette.csv',
+    't_position.csv',
+    't_fibre.csv',
+    't_cable.csv',
+    't_site.csv',
+    't_local.csv'
+]
+
+# Colonnes lues dans t_position.csv et colonnes du fichier de résultats
+POSITION_COLUMNS = ('ps_cs_code', 'ps_1', 'ps_2')
+RESULT_FIELDNAMES = [
+    'Cassette FTTE', 'Fibre Transport', 'Cable Transport',
+    'Fibre Distribution', 'Cable Distribution',
+    'Noeud PE', 'Site', 'Local PM', 'Etiquette PM'
+]
+
+# Connexion produite par l'API (FtteAnalysis) : un champ par colonne du fichier de résultats
+Connection = namedtuple('Connection', (
+    'cassette', 'fibre_transport', 'cable_transport', 'fibre_distribution', 'cable_distribution',
+    'pe_node', 'site', 'local_pm', 'pm_label'
+))
+
+# Cache des index : version du format (à incrémenter si la structure des index change)
+INDEX_CACHE_VERSION = 2
+DEFAULT_CACHE_SIZE_MB = 4096
+
+# Extensions des entrées du cache : index (.idx) et instantanés de l'analyse différentielle (.snap)
+CACHE_SUFFIXES = ('.idx', '.snap')
+
+# Magasin des fichiers décompressés (--member-store) : taille maximale par défaut, fichiers
+# extraits (évincés comme les entrées du cache, les moins récemment utilisés d'abord)
+DEFAULT_MEMBER_STORE_MB = 8192
+MEMBER_STORE_SUFFIXES = ('.csv',)
+
+# Mode parallèle : taille des blocs de t_position.csv envoyés aux processus
+POSITION_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Formats du fichier de résultats et extension correspondante
+OUTPUT_FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'parquet': '.parquet',
+    'arrow': '.arrows',
+    'sqlite': '.sqlite',
+    'bundle': '.bundle',
+}
+
+# Sorties par colonnes : taille des lots et colonnes encodées par dictionnaire
+# (Cable Transport, Cable Distribution, Noeud PE, Site, Local PM, Etiquette PM)
+OUTPUT_BATCH_ROWS = 65536
+DICTIONARY_COLUMNS = (2, 4, 5, 6, 7, 8)
+
+# Bundle des pages web (répertoire, un fichier par PM) : version du format et nombre
+# de lignes accumulées en mémoire avant déversement dans les fichiers temporaires
+BUNDLE_VERSION = 1
+BUNDLE_SPILL_ROWS = 262144
+
+# Intervalle minimal (secondes) entre deux lignes de progression du traitement des positions
+PROGRESS_INTERVAL = 5.0
+
+# Pipeline du traitement séquentiel : blocs en attente dans chaque file (lecture anticipée
+# de t_position.csv, écriture des résultats) et lignes de résultat par bloc écrit
+PIPELINE_DEPTH = 4
+PIPELINE_WRITE_ROWS = 8192
+
+# Suivi des chemins (--trace) : nombre maximal d'épissures suivies au-delà de la
+# cassette FTTE (garde contre les boucles)
+DEFAULT_MAX_HOPS = 16
+
+# Moteurs d'exécution : dictionnaires en mémoire (défaut) ou base SQLite temporaire,
+# dont le cache de pages (MB) est borné et qui déborde sur disque au-delà
+ENGINES = ('dict', 'sql')
+SQL_CACHE_MB = 512
+
+# Jointure partitionnée (--memory-limit) : taille estimée d'une entrée de l'index des
+# fibres (dict ou CompactFibreIndex), part du budget mémoire réservée à l'index d'une
+# partition et nombre de lignes écrites par lot dans les fichiers temporaires
+FIBRE_ENTRY_BYTES = 100
+COMPACT_FIBRE_ENTRY_BYTES = 16
+MEMORY_INDEX_SHARE = 0.5
+SPILL_BATCH_ROWS = 1024
+
+# Détection du format de chaque fichier CSV : taille du début de fichier examiné
+# (en-tête et premières lignes) et délimiteurs reconnus, par ordre de préférence
+# (le premier présent dans l'en-tête est retenu)
+SNIFF_SIZE = 64 * 1024
+DELIMITERS = (';', ',', '\t', '|')
+
+# Colonnes sans lesquelles un fichier ne peut pas être exploité ; leur absence après
+# détection du délimiteur est une erreur (MissingColumnsError) et non un index vide
+REQUIRED_COLUMNS = {
+    't_cassette.csv': ('cs_code', 'cs_type'),
+    't_position.csv': ('ps_cs_code', 'ps_1', 'ps_2'),
+    't_fibre.csv': ('fo_code', 'fo_cb_code'),
+    't_cable.csv': ('cb_code', 'cb_typelog'),
+    't_site.csv': ('st_nd_code', 'st_code'),
+    't_local.csv': ('lc_code', 'lc_typelog', 'lc_st_code'),
+}
+
+
+# Séquences non UTF-8 relues en latin-1 par le décodage en cours dans chaque thread
+# (comptées dans le MemberFormat du fichier par MemberFormat.decode)
+_decode_fallbacks = threading.local()
+
+
+def _latin1_fallback(error):
+    """Décode en latin-1 les octets invalides en UTF-8 (fichiers exportés en latin-1/cp1252)"""
+    _decode_fallbacks.count += 1
+    return error.object[error.start:error.end].decode('latin-1'), error.end
+
+
+codecs.register_error('ftte_latin1', _latin1_fallback)
+
+
+def clean_header(header):
+    """Normalise les noms de colonnes (BOM et espaces) et retourne nom -> index"""
+    positions = {}
+    for index, name in enumerate(header):
+        if name:
+            # En cas de doublon, la dernière colonne l'emporte (comme csv.DictReader)
+            positions[name.strip().replace('\ufeff', '')] = index
+    return positions
+
+
+def project_rows(reader, header, columns, strip=False, defaults=None):
     """
-    Analyse les fibres FTTE dans un fichier ZIP
-    Version 4 : recherche du nœud PE dans cb_nd1 ou cb_nd2
+    Projette chaque ligne CSV sur les colonnes demandées et produit des tuples
+    Les index sont calculés une seule fois à partir de l'en-tête.
+    Une ligne trop courte donne None ('' avec strip=True) pour les valeurs manquantes,
+    une colonne absente de l'en-tête donne defaults[colonne] (None par défaut)
     """
-    print(f"Démarrage de l'analyse du fichier: {zip_path}")
-    start_time = time.time()
+    defaults = defaults or {}
+    positions = clean_header(header)
+    missing = len(header)
+    indexes = [positions.get(name, missing) for name in columns]
+    absent = [(i, defaults.get(name)) for i, name in enumerate(columns) if indexes[i] == missing]
+    width = max(indexes) + 1
+    if len(indexes) == 1:
+        index = indexes[0]
+        getter = lambda row: (row[index],)
+    else:
+        getter = itemgetter(*indexes)
+    
+    if not strip and not absent:
+        # Chemin rapide : tuples produits directement par itemgetter
+        for row in reader:
+            if len(row) < width:
+                # Ligne vide ignorée, ligne courte complétée (comme csv.DictReader)
+                if not row:
+                    continue
+                row = row + [None] * (width - len(row))
+            yield getter(row)
+        return
+    
+    for row in reader:
+        if len(row) < width:
+            if not row:
+                continue
+            row = row + [None] * (width - len(row))
+        if strip:
+            values = [v.strip() if v else '' for v in getter(row)]
+        else:
+            values = list(getter(row))
+        for i, value in absent:
+            values[i] = value
+        yield tuple(values)
+
+
+def iter_line_blocks(raw, block_size=STREAM_CHUNK_SIZE, initial=b''):
+    """
+    Découpe un flux binaire en blocs d'environ block_size octets terminés par une fin de ligne
+    initial : octets déjà lus en tête du flux (début de fichier examiné par sniff_member)
+    """
+    tail = initial
+    while True:
+        data = raw.read(block_size)
+        if not data:
+            if tail:
+                yield tail
+            return
+        
+        data = tail + data
+        cut = data.rfind(b'\n') + 1
+        if not cut:
+            tail = data
+            continue
+        yield data[:cut]
+        tail = data[cut:]
+
+
+def whole_record_blocks(blocks):
+    """
+    Regroupe les blocs de lignes consécutifs tant qu'un champ entre guillemets reste
+    ouvert (nombre impair de guillemets, même règle que PositionPrefilter) : chaque
+    bloc produit commence et se termine hors guillemets et s'analyse seul (mode parallèle)
+    """
+    pending = []
+    in_quotes = False
+    for block in blocks:
+        pending.append(block)
+        if block.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            yield pending[0] if len(pending) == 1 else b''.join(pending)
+            pending = []
+    if pending:
+        yield b''.join(pending)
+
+
+class MemberFormat:
+    """
+    Format d'un fichier CSV du ZIP, détecté une fois sur le début du fichier
+    encoding : 'utf-8' (les séquences invalides plus loin sont relues en latin-1, sauf
+    en mode strict) ou 'latin-1' si le début du fichier n'est pas de l'UTF-8 valide
+    bom : le fichier commence par un BOM UTF-8 (retiré avant l'en-tête)
+    strict : mode strict (--strict-encoding), une séquence invalide lève UnicodeDecodeError
+    fallbacks : séquences non UTF-8 relues en latin-1 lors de la lecture
+    """
+    __slots__ = ('encoding', 'bom', 'delimiter', 'strict', 'fallbacks')
+
+    def __init__(self, encoding, bom, delimiter, strict=False):
+        self.encoding = encoding
+        self.bom = bom
+        self.delimiter = delimiter
+        self.strict = strict
+        self.fallbacks = 0
+    
+    def decode(self, data):
+        try:
+            return data.decode(self.encoding)
+        except UnicodeDecodeError:
+            if self.strict:
+                raise
+        # Bloc non décodable : relu avec le repli latin-1, dont les séquences sont comptées
+        _decode_fallbacks.count = 0
+        text = data.decode(self.encoding, 'ftte_latin1')
+        self.fallbacks += _decode_fallbacks.count
+        return text
+    
+    def describe(self):
+        """Format enregistré dans le rapport --profile"""
+        return {'encoding': self.encoding, 'bom': self.bom, 'delimiter': self.delimiter,
+                'fallbacks': self.fallbacks}
+
+
+class MemberDecodeError(ValueError):
+    """Séquence d'octets invalide dans l'encodage d'un fichier CSV (mode strict)"""
+
+    def __init__(self, file_name, message, line=None):
+        super().__init__(file_name, message, line)
+        self.file_name = file_name
+        self.message = message
+        self.line = line
+
+    def __str__(self):
+        where = f"Fichier {self.file_name}" + (f", ligne {self.line:,}" if self.line else '')
+        return f"{where} : {self.message}"
+
+
+def choose_delimiter(header_line):
+    """
+    Premier délimiteur de DELIMITERS présent dans la ligne d'en-tête (',' si aucun) :
+    ';' l'emporte dès qu'il apparaît, même si des noms de colonnes contiennent des virgules
+    """
+    for delimiter in DELIMITERS:
+        if delimiter in header_line:
+            return delimiter
+    return ','
+
+
+class MissingColumnsError(ValueError):
+    """Colonnes indispensables absentes de l'en-tête d'un fichier CSV (délimiteur ou export incorrect)"""
+
+    def __init__(self, file_name, columns):
+        super().__init__(file_name, columns)
+        self.file_name = file_name
+        self.columns = columns
+
+    def __str__(self):
+        return f"Fichier {self.file_name} : colonne(s) absente(s) de l'en-tête : {', '.join(self.columns)}"
+
+
+def sniff_member(raw, file_name, strict=False):
+    """
+    Détecte le format d'un fichier CSV ouvert en binaire sur ses SNIFF_SIZE premiers
+    octets : BOM, encodage (UTF-8 si ce début est valide, sinon latin-1) et délimiteur
+    (d'après l'en-tête). Le choix est fait une fois pour tout le fichier.
+    strict : mode strict de décodage du fichier (--strict-encoding)
+    Retourne (MemberFormat, en-tête, octets lus après la ligne d'en-tête)
+    Lève EmptyMemberError si le fichier est vide, MissingColumnsError s'il manque une
+    colonne de REQUIRED_COLUMNS
+    """
+    prefix = raw.read(SNIFF_SIZE)
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        raise MemberDecodeError(file_name, "encodage UTF-16 non pris en charge")
+    bom = prefix.startswith(codecs.BOM_UTF8)
+    if bom:
+        prefix = prefix[len(codecs.BOM_UTF8):]
+    
+    end = prefix.find(b'\n')
+    while end < 0:
+        # En-tête plus long que l'échantillon
+        data = raw.read(SNIFF_SIZE)
+        if not data:
+            end = len(prefix) - 1
+            break
+        start = len(prefix)
+        prefix += data
+        end = prefix.find(b'\n', start)
+    if not prefix:
+        raise EmptyMemberError(file_name)
+    
+    try:
+        # Décodeur incrémental : une séquence coupée en fin d'échantillon n'est pas une erreur
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        encoding = 'utf-8'
+    except UnicodeDecodeError:
+        encoding = 'latin-1'
+    
+    header_line = prefix[:end + 1].decode(encoding, 'ftte_latin1')
+    delimiter = choose_delimiter(header_line)
+    header = next(csv.reader([header_line], delimiter=delimiter), [])
+    positions = clean_header(header)
+    missing = [name for name in REQUIRED_COLUMNS.get(file_name, ()) if name not in positions]
+    if missing:
+        raise MissingColumnsError(file_name, missing)
+    return MemberFormat(encoding, bom, delimiter, strict), header, prefix[end + 1:]
+
+
+def check_encoding(blocks, member_format, file_name):
+    """
+    Mode strict : vérifie que chaque bloc de lignes est décodable dans l'encodage du
+    fichier et lève MemberDecodeError en indiquant la ligne de la première séquence
+    invalide (l'en-tête est la ligne 1)
+    """
+    line = 2
+    for block in blocks:
+        if not block.isascii():
+            try:
+                block.decode(member_format.encoding)
+            except UnicodeDecodeError as e:
+                bad = block[e.start:e.end].hex(' ')
+                offset = e.start - block.rfind(b'\n', 0, e.start)
+                raise MemberDecodeError(
+                    file_name, f"octets invalides en {member_format.encoding} ({bad}) "
+                    f"à l'octet {offset} de la ligne", line + block.count(b'\n', 0, e.start)) from None
+        line += block.count(b'\n')
+        yield block
+
+
+def read_member_blocks(raw, file_name, block_size=STREAM_CHUNK_SIZE, strict=False):
+    """
+    Détecte le format d'un fichier CSV ouvert en binaire (sniff_member) et découpe la
+    suite du fichier en blocs de lignes (vérifiés en mode strict)
+    Retourne (MemberFormat, en-tête, itérateur de blocs)
+    """
+    member_format, header, rest = sniff_member(raw, file_name, strict)
+    blocks = iter_line_blocks(raw, block_size, rest)
+    if strict:
+        blocks = check_encoding(blocks, member_format, file_name)
+    return member_format, header, blocks
+
+
+class PositionPrefilter:
+    """
+    Préfiltre de t_position.csv sur les lignes brutes (octets), avant tout décodage
+    Seul le champ ps_cs_code est extrait (découpage sur le délimiteur) et comparé aux
+    cassettes FTTE ; les autres lignes sont comptées puis écartées sans passer par le
+    parseur CSV. Les lignes contenant des guillemets (champ pouvant contenir le
+    délimiteur ou un saut de ligne) sont toujours confiées au parseur CSV.
+    """
+
+    def __init__(self, cassettes_ftte, header, member_format):
+        self.cassettes_ftte = cassettes_ftte
+        self.cs_index = clean_header(header).get('ps_cs_code')
+        self.decode = member_format.decode
+        self.delimiter = member_format.delimiter.encode(member_format.encoding)
+        self.keys = {code.encode('utf-8', 'surrogatepass') for code in cassettes_ftte if code is not None}
+        self.skipped = 0
+        self.in_quotes = False
+
+    def lines(self, blocks):
+        """
+        Produit, décodées, les lignes à analyser à partir de blocs terminés par une fin
+        de ligne ; les lignes écartées sont comptées dans skipped
+        """
+        if self.cs_index is None:
+            # Colonne ps_cs_code absente : aucun filtrage possible
+            for block in blocks:
+                yield from self.decode(block).splitlines(keepends=True)
+            return
+        
+        split_fields = methodcaller('split', self.delimiter, self.cs_index + 1)
+        get_code = itemgetter(self.cs_index)
+        is_ftte = self.keys.__contains__
+        
+        for block in blocks:
+            if not self.in_quotes and b'"' not in block and block.isascii():
+                # Chemin rapide (boucles en C) : bloc ASCII sans guillemets ni ligne vide
+                lines = block.splitlines()
+                if b'' not in lines:
+                    try:
+                        flags = list(map(is_ftte, map(get_code, map(split_fields, lines))))
+                    except IndexError:
+                        # Ligne courte : traitement ligne à ligne
+                        pass
+                    else:
+                        kept = list(compress(lines, flags))
+                        self.skipped += len(lines) - len(kept)
+                        for line in kept:
+                            yield line.decode('ascii')
+                        continue
+            
+            yield from self._filter_lines(block.splitlines(keepends=True))
+
+    def _filter_lines(self, lines):
+        """Filtrage ligne à ligne (guillemets, caractères non ASCII, lignes vides ou courtes)"""
+        index = self.cs_index
+        maxsplit = index + 1
+        delimiter = self.delimiter
+        keys = self.keys
+        cassettes_ftte = self.cassettes_ftte
+        decode = self.decode
+        skipped = 0
+        
+        try:
+            for line in lines:
+                if self.in_quotes or b'"' in line:
+                    # Un nombre impair de guillemets ouvre ou ferme un champ sur plusieurs lignes
+                    if line.count(b'"') % 2:
+                        self.in_quotes = not self.in_quotes
+                    yield decode(line)
+                    continue
+                
+                if line[:1] in (b'\n', b'\r'):
+                    # Ligne vide, ignorée comme par le parseur CSV
+                    continue
+                
+                fields = line.split(delimiter, maxsplit)
+                if len(fields) <= index:
+                    # Ligne courte : confiée au parseur CSV
+                    yield decode(line)
+                    continue
+                
+                code = fields[index]
+                if len(fields) == maxsplit:
+                    code = code.rstrip(b'\r\n')
+                if code in keys or (not code.isascii()
+                                    and decode(code) in cassettes_ftte):
+                    yield decode(line)
+                else:
+                    skipped += 1
+        finally:
+            self.skipped += skipped
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Lecture anticipée d'un fichier du ZIP dans un thread : le bloc suivant est
+    décompressé (zlib libère le GIL) pendant l'analyse du bloc courant. La file est
+    bornée à depth blocs : le thread attend que le lecteur avance (contre-pression),
+    la mémoire reste limitée à quelques blocs.
+    """
+
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE, depth=PIPELINE_DEPTH):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.blocks = queue.Queue(depth)
+        self.stopped = threading.Event()
+        self.chunk = b''
+        self.offset = 0
+        self.eof = False
+        self.thread = threading.Thread(target=self._run, name='ftte-prefetch', daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        try:
+            while True:
+                data = self.f.read(self.chunk_size)
+                if not self._put(data) or not data:
+                    return
+        except Exception as e:
+            self._put(e)
+    
+    def _put(self, item):
+        """Ajoute un bloc à la file ; False si la lecture a été interrompue"""
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def readable(self):
+        return True
+    
+    def read(self, size=-1):
+        if self.offset >= len(self.chunk):
+            if self.eof:
+                return b''
+            item = self.blocks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self.eof = True
+                return b''
+            self.chunk = item
+            self.offset = 0
+        
+        if self.offset == 0 and (size < 0 or size >= len(self.chunk)):
+            # Bloc entier : rendu sans copie
+            self.offset = len(self.chunk)
+            return self.chunk
+        end = len(self.chunk) if size < 0 else self.offset + size
+        data = self.chunk[self.offset:end]
+        self.offset += len(data)
+        return data
+    
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+    
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        super().close()
+
+
+class ExportZip(zipfile.ZipFile):
+    """
+    Archive de l'export ouverte avec les options de lecture de l'analyse qui l'utilise :
+    strict_encoding (--strict-encoding), verbose (messages de chargement affichés) et
+    member_store (MemberStore dans lequel les fichiers sont lus, None : lecture dans le ZIP)
+    Les chargements lisent ces options sur l'archive qu'ils reçoivent (export_option) :
+    deux analyses d'un même processus gardent chacune les leurs. Un zipfile.ZipFile
+    ordinaire est lu avec les valeurs par défaut de la classe.
+    """
+    strict_encoding = False
+    verbose = True
+    member_store = None
+
+    def __init__(self, file, strict_encoding=False, verbose=True, member_store=None):
+        super().__init__(file, 'r')
+        self.strict_encoding = strict_encoding
+        self.verbose = verbose
+        self.member_store = member_store
+
+
+def export_option(zip_file, name):
+    """Option de lecture name de l'archive (valeur par défaut pour un zipfile.ZipFile)"""
+    return getattr(zip_file, name, getattr(ExportZip, name))
+
+
+def echo(zip_file, *args):
+    """Affiche un message de chargement, sauf si l'archive est lue en mode silencieux"""
+    if export_option(zip_file, 'verbose'):
+        print(*args)
+
+
+def open_member(zip_file, file_name):
+    """
+    Ouvre un fichier de l'export en binaire : copie projetée du magasin de l'archive
+    (ExportZip.member_store), ou flux décompressé du ZIP
+    """
+    member_store = export_option(zip_file, 'member_store')
+    if member_store is not None:
+        return member_store.open(zip_file, file_name)
+    return zip_file.open(file_name)
+
+
+class MappedReader(io.RawIOBase):
+    """Lecture séquentielle d'un fichier projeté en mémoire (mmap partagé, aucune copie du fichier)"""
+
+    def __init__(self, mapping):
+        super().__init__()
+        self.mapping = mapping
+        self.pos = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def read(self, size=-1):
+        end = len(self.mapping) if size is None or size < 0 else min(self.pos + size, len(self.mapping))
+        data = self.mapping[self.pos:end]
+        self.pos = end
+        return data
+    
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+    
+    def tell(self):
+        return self.pos
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: len(self.mapping)}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+
+class MappedLines:
+    """Lignes décodées d'un fichier projeté à partir de l'octet start ; pos : début de la ligne suivante"""
+
+    def __init__(self, mapping, start, decode):
+        self.mapping = mapping
+        self.pos = start
+        self.decode = decode
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        mapping = self.mapping
+        start = self.pos
+        if start >= len(mapping):
+            raise StopIteration
+        end = mapping.find(b'\n', start) + 1 or len(mapping)
+        self.pos = end
+        return self.decode(mapping[start:end])
+
+
+class MappedTable:
+    """
+    Fichier CSV décompressé du magasin, dont les lignes sont repérées par leur
+    position (octet) : les index ne gardent que cette position et les champs
+    d'affichage sont relus à la demande (field). La projection mémoire est rouverte
+    à la première lecture après un passage par pickle (cache, processus de chargement).
+    """
+
+    def __init__(self, path, file_name, strict=False):
+        self.path = path
+        self.file_name = file_name
+        self._mapping = None
+        with closing(MappedReader(self.mapping)) as raw:
+            self.member_format, self.header, rest = sniff_member(raw, file_name, strict)
+            self.data_start = raw.tell() - len(rest)
+        self.positions = clean_header(self.header)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_mapping'] = None
+        return state
+    
+    @property
+    def mapping(self):
+        if self._mapping is None:
+            with open(self.path, 'rb') as f:
+                self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mapping
+    
+    def field(self, offset, column):
+        """
+        Valeur (espaces retirés) de la colonne column dans la ligne commençant à l'octet
+        offset ; None si la colonne est absente de l'en-tête
+        """
+        index = self.positions.get(column)
+        if index is None:
+            return None
+        row = next(csv.reader(MappedLines(self.mapping, offset, self.member_format.decode),
+                              delimiter=self.member_format.delimiter), [])
+        value = row[index] if index < len(row) else None
+        return value.strip() if value else ''
+
+
+def mapped_records(table, columns, strip=False, defaults=None, verbose=True):
+    """
+    Lit les lignes d'un MappedTable comme open_csv_member (mêmes colonnes, mêmes valeurs
+    par défaut) en donnant aussi leur position dans le fichier
+    verbose : avertissement des séquences relues en latin-1 (voir record_member_read)
+    Retourne un itérateur de (octet de début de ligne, tuple des valeurs de columns)
+    Lève MemberDecodeError en mode strict
+    """
+    defaults = defaults or {}
+    member_format = table.member_format
+    positions = table.positions
+    missing = len(table.header)
+    indexes = [positions.get(name, missing) for name in columns]
+    absent = [(i, defaults.get(name)) for i, name in enumerate(columns) if indexes[i] == missing]
+    width = max(indexes) + 1
+    getter = itemgetter(*indexes) if len(indexes) > 1 else (lambda row: (row[indexes[0]],))
+    
+    lines = MappedLines(table.mapping, table.data_start, member_format.decode)
+    reader = csv.reader(lines, delimiter=member_format.delimiter)
+    start = lines.pos
+    try:
+        for row in reader:
+            offset = start
+            start = lines.pos
+            if len(row) < width:
+                if not row:
+                    continue
+                row = row + [None] * (width - len(row))
+            if strip:
+                values = [v.strip() if v else '' for v in getter(row)]
+            else:
+                values = list(getter(row))
+            for i, value in absent:
+                values[i] = value
+            yield offset, tuple(values)
+    except UnicodeDecodeError as e:
+        raise MemberDecodeError(table.file_name, f"octets invalides en {member_format.encoding} "
+                                f"({e.object[e.start:e.end].hex(' ')})", reader.line_num + 2) from None
+    record_member_read(table.file_name, reader.line_num + 1, len(table.mapping), member_format, verbose)
+
+
+class MemberStore:
+    """
+    Magasin des fichiers CSV de l'export décompressés une fois (--member-store DIR)
+    Chaque fichier est extrait dans DIR sous un nom tiré de son CRC et de sa taille
+    (<crc>_<taille>_<fichier>, écriture atomique) : une relance sur le même export, ou
+    une autre analyse du même hôte, le relit sans décompression. Les fichiers sont
+    projetés en mémoire (mmap en lecture seule) : les processus qui analysent le même
+    export partagent les pages du cache système au lieu d'en garder chacun une copie.
+    Comme le cache des index, le magasin est borné à max_size_mb : après chaque extraction,
+    les fichiers les moins récemment utilisés (date de modification, mise à jour à chaque
+    accès) sont supprimés, sauf ceux de l'export en cours (relus à la demande par les
+    index des câbles et des locaux, y compris dans les processus de traitement).
+    """
+
+    def __init__(self, directory, max_size_mb=DEFAULT_MEMBER_STORE_MB):
+        self.directory = directory
+        self.max_size_mb = max_size_mb
+        self.mappings = {}
+        self.extracted = []
+        os.makedirs(directory, exist_ok=True)
+    
+    def __getstate__(self):
+        # Processus de chargement : projections rouvertes à la demande
+        return {'directory': self.directory, 'max_size_mb': self.max_size_mb, 'mappings': {}, 'extracted': []}
+    
+    def member_path(self, info):
+        """Chemin dans le magasin du fichier décrit par info (ZipInfo)"""
+        return os.path.join(self.directory, f"{info.CRC:08x}_{info.file_size}_{info.filename}")
+    
+    def path(self, zip_file, file_name):
+        """Chemin du fichier décompressé, extrait du ZIP s'il n'est pas encore dans le magasin"""
+        info = zip_file.getinfo(file_name)
+        path = self.member_path(info)
+        if os.path.exists(path) and os.path.getsize(path) == info.file_size:
+            # Fichier récemment utilisé : la date de modification sert à l'éviction LRU
+            os.utime(path)
+            return path
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with zip_file.open(file_name) as src, open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, STREAM_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.extracted.append(file_name)
+        echo(zip_file, f"   → {file_name} décompressé dans le magasin ({info.file_size / 1024 / 1024:.1f} MB)")
+        keep = {self.member_path(member) for member in zip_file.infolist()}
+        for evicted in evict_cache(self.directory, self.max_size_mb, keep, MEMBER_STORE_SUFFIXES):
+            echo(zip_file, f"   → Magasin: fichier évincé {os.path.basename(evicted)}")
+        return path
+    
+    def open(self, zip_file, file_name):
+        """Lecteur binaire du fichier décompressé (projection partagée entre les lectures)"""
+        path = self.path(zip_file, file_name)
+        mapping = self.mappings.get(path)
+        if mapping is None:
+            if not os.path.getsize(path):
+                return io.BytesIO()
+            with open(path, 'rb') as f:
+                mapping = self.mappings[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return MappedReader(mapping)
+    
+    def table(self, zip_file, file_name):
+        """MappedTable du fichier (lignes repérées par position) ; EmptyMemberError s'il est vide"""
+        path = self.path(zip_file, file_name)
+        if not os.path.getsize(path):
+            raise EmptyMemberError(file_name)
+        return MappedTable(path, file_name, export_option(zip_file, 'strict_encoding'))
+    
+    def close(self):
+        for mapping in self.mappings.values():
+            mapping.close()
+        self.mappings.clear()
+
+
+@contextmanager
+def open_position_member(zip_file, cassettes_ftte, progress=None, prefetch=False):
+    """
+    Ouvre t_position.csv en streaming avec le préfiltre des cassettes FTTE
+    Retourne (itérateur de tuples POSITION_COLUMNS des lignes retenues, préfiltre) ;
+    le nombre de positions écartées est disponible dans prefilter.skipped
+    progress : ProgressReporter alimenté à chaque bloc décompressé
+    prefetch : décompression dans un thread de lecture anticipée (PrefetchReader)
+    """
+    with open_member(zip_file, 't_position.csv') as raw:
+        with closing(PrefetchReader(raw)) if prefetch else nullcontext(raw) as source:
+            member_format, header, blocks = read_member_blocks(
+                source, 't_position.csv', strict=export_option(zip_file, 'strict_encoding'))
+            prefilter = PositionPrefilter(cassettes_ftte, header, member_format)
+            if progress is not None:
+                blocks = progress.track(blocks)
+            reader = csv.reader(prefilter.lines(blocks), delimiter=member_format.delimiter)
+            yield project_rows(reader, header, POSITION_COLUMNS), prefilter
+        record_member_read('t_position.csv', prefilter.skipped + reader.line_num, member_position(raw),
+                           member_format, export_option(zip_file, 'verbose'))
+
+
+class ProgressReporter:
+    """
+    Progression d'une lecture en streaming, calculée sur les octets décompressés et les
+    lignes lues (et non sur les résultats trouvés) ; une ligne au plus toutes les
+    PROGRESS_INTERVAL secondes
+    """
+
+    def __init__(self, total_bytes, label='positions lues', interval=PROGRESS_INTERVAL):
+        self.total_bytes = total_bytes
+        self.label = label
+        self.interval = interval
+        self.bytes = 0
+        self.rows = 0
+        self.start = time.time()
+        self.next_report = self.start + interval
+
+    def update(self, nbytes, nrows):
+        """Comptabilise un bloc traité"""
+        self.bytes += nbytes
+        self.rows += nrows
+        now = time.time()
+        if now >= self.next_report:
+            self.next_report = now + self.interval
+            self.report(now)
+
+    def track(self, blocks):
+        """Itère sur des blocs de lignes en les comptabilisant"""
+        for block in blocks:
+            yield block
+            self.update(len(block), block.count(b'\n'))
+
+    def report(self, now):
+        elapsed = max(now - self.start, 1e-9)
+        percent = 100 * self.bytes / self.total_bytes if self.total_bytes else 100
+        print(f"   → {self.rows:,} {self.label} ({percent:.0f} %, {self.rows / elapsed:,.0f} lignes/s, "
+              f"{self.bytes / elapsed / 1024 / 1024:.1f} MB/s)")
+
+
+class Cable:
+    """Câble de l'export (enregistrement partagé par toutes ses fibres)"""
+    __slots__ = ('cb_code', 'cb_typelog', 'cb_etiquet', 'cb_nd1', 'cb_nd2', 'pe_node',
+                 'pm_status', 'pm', 'cable_id')
+
+    def __init__(self, cb_code, cb_typelog, cb_etiquet, cb_nd1, cb_nd2, pe_node):
+        self.cb_code = cb_code
+        self.cb_typelog = cb_typelog
+        self.cb_etiquet = cb_etiquet
+        self.cb_nd1 = cb_nd1
+        self.cb_nd2 = cb_nd2
+        self.pe_node = pe_node
+        self.pm_status = None
+        self.pm = None
+        self.cable_id = None
+
+
+class MappedCable(Cable):
+    """
+    Câble lu dans le magasin (--member-store) : l'étiquette n'est pas gardée dans
+    l'index mais relue dans t_cable.csv (position de la ligne) pour les seuls câbles
+    des connexions écrites, à la première demande
+    """
+    __slots__ = ('table', 'offset', 'label')
+    FIELDS = ('cb_code', 'cb_typelog', 'cb_nd1', 'cb_nd2', 'pe_node', 'pm_status', 'pm', 'cable_id',
+              'table', 'offset', 'label')
+
+    def __init__(self, table, offset, cb_code, cb_typelog, cb_nd1, cb_nd2, pe_node):
+        self.table = table
+        self.offset = offset
+        self.label = None
+        self.cb_code = cb_code
+        self.cb_typelog = cb_typelog
+        self.cb_nd1 = cb_nd1
+        self.cb_nd2 = cb_nd2
+        self.pe_node = pe_node
+        self.pm_status = None
+        self.pm = None
+        self.cable_id = None
+    
+    @property
+    def cb_etiquet(self):
+        label = self.label
+        if label is None:
+            label = self.table.field(self.offset, 'cb_etiquet')
+            label = self.label = label if label is not None else self.cb_code
+        return label
+    
+    def __getstate__(self):
+        # L'étiquette n'est pas relue pour être enregistrée (cache, processus de chargement)
+        return tuple(getattr(self, name) for name in self.FIELDS)
+    
+    def __setstate__(self, state):
+        for name, value in zip(self.FIELDS, state):
+            setattr(self, name, value)
+
+
+class MappedLocal(dict):
+    """
+    Local SRO lu dans le magasin (--member-store) : lc_etiquet est relu dans
+    t_local.csv à la première demande (local d'un câble rattaché à un PM)
+    """
+
+    def __init__(self, table, offset, lc_code):
+        super().__init__(lc_code=lc_code)
+        self.table = table
+        self.offset = offset
+    
+    def __missing__(self, key):
+        if key != 'lc_etiquet':
+            raise KeyError(key)
+        value = self[key] = self.table.field(self.offset, 'lc_etiquet')
+        return value
+
+
+def fibre_hash(fibre_code):
+    """Empreinte 64 bits stable d'un code fibre (jamais 0, valeur réservée aux cases vides)"""
+    digest = hashlib.blake2b(fibre_code.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class CompactFibreIndex:
+    """
+    Index fibre -> câble compact pour les exports nationaux
+    Les codes câble sont remplacés par un identifiant entier (position dans cables),
+    les codes fibre par leur empreinte 64 bits : table de hachage à adressage ouvert
+    sur deux tableaux array('Q') et array('I'), environ 16 octets par fibre au lieu
+    d'une centaine pour un dict de chaînes.
+    Même interface que le dict utilisé par défaut (get, in, len, affectation).
+    Une collision d'empreintes entre deux codes fibre (probabilité ~n²/2^65) les confondrait.
+    """
+    __slots__ = ('cables', '_keys', '_values', '_capacity', '_size')
+
+    # Taux de remplissage visé à la création et maximal avant agrandissement
+    TARGET_LOAD = 0.75
+    MAX_LOAD = 0.85
+
+    def __init__(self, cables, expected=0):
+        self.cables = list(cables.values())
+        for cable_id, cable in enumerate(self.cables):
+            cable.cable_id = cable_id
+        self._allocate(max(1024, int(expected / self.TARGET_LOAD) + 1))
+        self._size = 0
+
+    def _allocate(self, capacity):
+        self._keys = array('Q', bytes(8 * capacity))
+        self._values = array('I', bytes(4 * capacity))
+        self._capacity = capacity
+
+    def _slot(self, key):
+        """Case de la clé, ou première case vide de sa séquence de sondage"""
+        keys = self._keys
+        capacity = self._capacity
+        slot = key % capacity
+        while True:
+            current = keys[slot]
+            if current == key or not current:
+                return slot
+            slot += 1
+            if slot == capacity:
+                slot = 0
+
+    def __setitem__(self, fibre_code, cable):
+        if fibre_code is None:
+            return
+        key = fibre_hash(fibre_code)
+        slot = self._slot(key)
+        if not self._keys[slot]:
+            if self._size + 1 > self._capacity * self.MAX_LOAD:
+                self._grow()
+                slot = self._slot(key)
+            self._keys[slot] = key
+            self._size += 1
+        self._values[slot] = cable.cable_id
+
+    def _grow(self):
+        """Agrandit la table de 50 % (estimation initiale du nombre de fibres dépassée)"""
+        keys, values = self._keys, self._values
+        self._allocate(self._capacity * 3 // 2)
+        for key, value in zip(keys, values):
+            if key:
+                slot = self._slot(key)
+                self._keys[slot] = key
+                self._values[slot] = value
+
+    def get(self, fibre_code, default=None):
+        if fibre_code is None:
+            return default
+        slot = self._slot(fibre_hash(fibre_code))
+        if not self._keys[slot]:
+            return default
+        return self.cables[self._values[slot]]
+
+    def __contains__(self, fibre_code):
+        return self.get(fibre_code) is not None
+
+    def __len__(self):
+        return self._size
+
+
+def estimate_rows(zip_file, file_name, sample_size=256 * 1024):
+    """Estime le nombre de lignes d'un fichier du ZIP à partir d'un échantillon de son début"""
+    file_size = zip_file.getinfo(file_name).file_size
+    with open_member(zip_file, file_name) as f:
+        sample = f.read(sample_size)
+    if not sample:
+        return 0
+    return int(file_size * sample.count(b'\n') / len(sample)) + 1
+
+
+class EmptyMemberError(Exception):
+    """Fichier CSV vide dans le ZIP"""
+
+    def __init__(self, file_name):
+        super().__init__(file_name)
+        self.file_name = file_name
+
+    def __str__(self):
+        return f"Fichier {self.file_name} vide"
+
+
+class AnalysisError(Exception):
+    """
+    Analyse impossible : fichier manquant dans l'export, aucune cassette FTTE, options
+    incompatibles avec le mode d'exécution
+    """
+
+
+def check_compatible(mode, options):
+    """
+    Lève AnalysisError si des options demandées ne s'appliquent pas au mode d'exécution
+    (plutôt que de les ignorer et de produire autre chose que ce qui a été demandé)
+    options : couples (option de la ligne de commande, option demandée)
+    """
+    conflicts = [name for name, requested in options if requested]
+    if conflicts:
+        raise AnalysisError(f"{mode} : {', '.join(conflicts)} non pris en charge")
+
+
+@contextmanager
+def open_csv_member(zip_file, file_name, columns, strip=False, defaults=None):
+    """
+    Ouvre un fichier CSV du ZIP en streaming
+    Le contenu est décompressé et décodé par blocs, les lignes sont lues une à une :
+    la mémoire utilisée ne dépend pas de la taille du fichier. L'encodage et le
+    délimiteur sont détectés une fois sur le début du fichier (sniff_member).
+    Retourne un itérateur de tuples (une valeur par colonne de columns)
+    Lève EmptyMemberError si le fichier est vide, MemberDecodeError en mode strict
+    """
+    with open_member(zip_file, file_name) as f:
+        member_format, header, blocks = read_member_blocks(
+            f, file_name, strict=export_option(zip_file, 'strict_encoding'))
+        # Blocs de lignes complètes décodés d'un coup, relus ligne à ligne (StringIO ne
+        # coupe que sur \n, \r et \r\n, comme le parseur CSV)
+        decode = member_format.decode
+        lines = itertools.chain.from_iterable(io.StringIO(decode(block), newline='') for block in blocks)
+        reader = csv.reader(lines, delimiter=member_format.delimiter)
+        yield project_rows(reader, header, columns, strip, defaults)
+        record_member_read(file_name, reader.line_num, member_position(f), member_format,
+                           export_option(zip_file, 'verbose'))
+
+
+# Lectures de fichiers du ZIP dans le processus courant : (fichier, lignes, octets décompressés,
+# format détecté). Consommées par measure_stage pour le rapport --profile
+_member_reads = []
+
+
+def record_member_read(file_name, rows, nbytes, member_format=None, verbose=True):
+    """
+    Enregistre la lecture complète d'un fichier du ZIP
+    verbose : avertit des séquences non UTF-8 relues en latin-1
+    """
+    _member_reads.append((file_name, rows, nbytes, member_format))
+    if verbose and member_format is not None and member_format.fallbacks:
+        print(f"   ⚠️  {file_name} : {member_format.fallbacks:,} séquence(s) non UTF-8 relue(s) en latin-1 "
+              f"(--strict-encoding pour localiser la première)")
+
+
+def member_position(f):
+    """Nombre d'octets décompressés lus dans un fichier du ZIP"""
+    try:
+        return f.tell()
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb(who='self'):
+    """Pic de mémoire résidente (MB) du processus ou de ses processus enfants terminés"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    target = resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN
+    peak = resource.getrusage(target).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en KB sous Linux
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+def cpu_time():
+    """Temps CPU du processus et de ses processus enfants terminés"""
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+@contextmanager
+def measure_stage(name, process='main'):
+    """
+    Mesure une étape exécutée dans le processus courant : temps réel, temps CPU,
+    lignes lues, octets décompressés et format détecté (fichiers du ZIP lus pendant
+    l'étape) et pic RSS.
+    Produit le dictionnaire des mesures, complété à la sortie ; rows_kept est
+    renseigné par l'appelant
+    """
+    mark = len(_member_reads)
+    cpu_start = cpu_time()
+    start = time.time()
+    metrics = {'stage': name, 'process': process}
+    yield metrics
+    reads = _member_reads[mark:]
+    del _member_reads[mark:]
+    metrics.update(
+        wall_s=round(time.time() - start, 4),
+        cpu_s=round(cpu_time() - cpu_start, 4),
+        members=[file_name for file_name, _, _, _ in reads],
+        formats={file_name: member_format.describe()
+                 for file_name, _, _, member_format in reads if member_format is not None},
+        rows_read=sum(rows for _, rows, _, _ in reads),
+        rows_kept=metrics.get('rows_kept'),
+        bytes_decompressed=sum(nbytes or 0 for _, _, nbytes, _ in reads),
+        peak_rss_mb=peak_rss_mb()
+    )
+
+
+class TimedOutput:
+    """
+    Fichier de sortie dont les écritures sont chronométrées (étape output du rapport
+    --profile) ; le formatage CSV reste compté dans l'étape positions
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def write(self, data):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        written = self.f.write(data)
+        self.wall += time.perf_counter() - start
+        self.cpu += time.thread_time() - cpu_start
+        return written
+
+
+def choose_fibre_plan(zip_file, plan='auto'):
+    """
+    Choisit le plan d'indexation des fibres
+    En mode auto, la décision se base sur les tailles décompressées lues dans
+    le répertoire central du ZIP (aucune décompression nécessaire)
+    """
+    if plan != 'auto':
+        return plan
+    
+    fibre_size = zip_file.getinfo('t_fibre.csv').file_size
+    return 'semijoin' if fibre_size >= SEMIJOIN_MIN_FIBRE_SIZE else 'direct'
+
+
+def load_cassettes(zip_file):
+    """
+    Charge les cassettes FTTE (type 'E' sans code BP)
+    Retourne (ensemble des codes cassette FTTE, nombre de lignes lues)
+    """
+    cassettes_ftte = set()
+    with open_csv_member(zip_file, 't_cassette.csv', ('cs_code', 'cs_type', 'cs_bp_code'),
+                         defaults={'cs_code': '', 'cs_bp_code': ''}) as reader:
+        row_count = 0
+        for cs_code, cs_type, cs_bp_code in reader:
+            row_count += 1
+            if cs_type == 'E' and not (cs_bp_code or '').strip():
+                cassettes_ftte.add(cs_code)
+    
+    return cassettes_ftte, row_count
+
+
+def cable_pe_node(cb_nd1, cb_nd2):
+    """Nœud PE d'un câble : cb_nd1 s'il commence par 'PE', sinon cb_nd2, sinon None"""
+    if cb_nd1.startswith('PE'):
+        return cb_nd1
+    if cb_nd2.startswith('PE'):
+        return cb_nd2
+    return None
+
+
+def load_cables(zip_file):
+    """
+    Charge les câbles (étiquettes, types et nœuds) et identifie leur nœud PE
+    Retourne (code câble -> câble, nombre de câbles avec nœud PE)
+    """
+    cables = {}
+    member_store = export_option(zip_file, 'member_store')
+    if member_store is not None:
+        # Magasin : l'étiquette reste dans t_cable.csv, seule la position de la ligne est gardée
+        table = member_store.table(zip_file, 't_cable.csv')
+        records = mapped_records(table, ('cb_code', 'cb_typelog', 'cb_nd1', 'cb_nd2'), strip=True,
+                                 defaults={'cb_nd1': '', 'cb_nd2': ''},
+                                 verbose=export_option(zip_file, 'verbose'))
+        for offset, (cb_code, cb_typelog, cb_nd1, cb_nd2) in records:
+            pe_node = cable_pe_node(cb_nd1, cb_nd2)
+            cables[cb_code] = MappedCable(table, offset, cb_code, cb_typelog, cb_nd1, cb_nd2, pe_node)
+        return cables, sum(1 for cable in cables.values() if cable.pe_node is not None)
+    
+    cable_columns = ('cb_code', 'cb_typelog', 'cb_etiquet', 'cb_nd1', 'cb_nd2')
+    with open_csv_member(zip_file, 't_cable.csv', cable_columns, strip=True,
+                         defaults={'cb_nd1': '', 'cb_nd2': ''}) as reader:
+        pe_count = 0
+        for cb_code, cb_typelog, cb_etiquet, cb_nd1, cb_nd2 in reader:
+            # Identifier le nœud PE
+            pe_node = cable_pe_node(cb_nd1, cb_nd2)
+            if pe_node is not None:
+                pe_count += 1
+            
+            cables[cb_code] = Cable(cb_code, cb_typelog,
+                                    cb_etiquet if cb_etiquet is not None else cb_code,
+                                    cb_nd1, cb_nd2, pe_node)
+    
+    return cables, pe_count
+
+
+def load_fibres(zip_file, cables, referenced_fibres=None, compact=False):
+    """
+    Crée l'index fibre -> câble pour les fibres dont le câble existe
+    Avec referenced_fibres (plan semijoin), seules ces fibres sont indexées
+    Avec compact=True, l'index est un CompactFibreIndex au lieu d'un dict
+    """
+    if compact:
+        # Plan semijoin : le nombre de fibres référencées borne la taille de l'index
+        expected = len(referenced_fibres) if referenced_fibres is not None else estimate_rows(zip_file, 't_fibre.csv')
+        fibre_to_cable = CompactFibreIndex(cables, expected)
+    else:
+        fibre_to_cable = {}
+    with open_csv_member(zip_file, 't_fibre.csv', ('fo_code', 'fo_cb_code')) as reader:
+        fibre_count = 0
+        for fibre_code, cable_code in reader:
+            if referenced_fibres is not None and fibre_code not in referenced_fibres:
+                continue
+            
+            # La fibre pointe directement sur l'enregistrement (partagé) de son câble
+            cable = cables.get(cable_code)
+            if cable is not None:
+                fibre_to_cable[fibre_code] = cable
+                fibre_count += 1
+                
+                if fibre_count % 500000 == 0:
+                    echo(zip_file, f"   → {fibre_count:,} fibres indexées...")
+    
+    return fibre_to_cable
+
+
+def load_sites(zip_file):
+    """
+    Charge les relations nœud -> site
+    Retourne (nœud -> site, nombre de nœuds PE)
+    """
+    noeud_to_site = {}
+    with open_csv_member(zip_file, 't_site.csv', ('st_nd_code', 'st_code'), strip=True) as reader:
+        pe_sites = 0
+        for nd_code, st_code in reader:
+            if nd_code and st_code:
+                noeud_to_site[nd_code] = st_code
+                if nd_code.startswith('PE'):
+                    pe_sites += 1
+    
+    return noeud_to_site, pe_sites
+
+
+def load_locals(zip_file):
+    """Charge les locaux SRO (site -> code et étiquette du local)"""
+    site_to_local = {}
+    member_store = export_option(zip_file, 'member_store')
+    if member_store is not None:
+        # Magasin : l'étiquette du local est relue dans t_local.csv à la demande
+        table = member_store.table(zip_file, 't_local.csv')
+        records = mapped_records(table, ('lc_typelog', 'lc_st_code', 'lc_code'), strip=True,
+                                 verbose=export_option(zip_file, 'verbose'))
+        for offset, (lc_typelog, st_code, lc_code) in records:
+            if lc_typelog == 'SRO' and st_code:
+                site_to_local[st_code] = MappedLocal(table, offset, lc_code)
+        return site_to_local
+    
+    local_columns = ('lc_typelog', 'lc_st_code', 'lc_code', 'lc_etiquet')
+    with open_csv_member(zip_file, 't_local.csv', local_columns, strip=True) as reader:
+        for lc_typelog, st_code, lc_code, lc_etiquet in reader:
+            if lc_typelog == 'SRO':
+                if st_code:
+                    site_to_local[st_code] = {
+                        'lc_code': lc_code,
+                        'lc_etiquet': lc_etiquet
+                    }
+    
+    return site_to_local
+
+
+def collect_ftte_fibres(zip_file, cassettes_ftte):
+    """
+    Première passe sur t_position.csv : collecte les fibres (ps_1, ps_2)
+    des positions situées sur une cassette FTTE
+    Retourne l'ensemble des codes fibre référencés
+    """
+    referenced = set()
+    with open_position_member(zip_file, cassettes_ftte) as (rows, _):
+        for cassette_code, fibre1, fibre2 in rows:
+            if cassette_code in cassettes_ftte:
+                referenced.add(fibre1)
+                referenced.add(fibre2)
+    return referenced
+
+
+# Tables chargées indépendamment (processus séparés en mode parallèle)
+TABLE_LOADERS = {
+    'cassettes': load_cassettes,
+    'cables': load_cables,
+    'sites': load_sites,
+    'locals': load_locals,
+}
+
+# Graphe de dépendances du chargement (pour le calcul du chemin critique)
+TABLE_DEPENDENCIES = {
+    'cassettes': (),
+    'cables': (),
+    'sites': (),
+    'locals': (),
+    'ftte_fibres': ('cassettes',),
+    'fibres': ('cables', 'ftte_fibres'),
+}
+
+TABLE_TITLES = {
+    'cassettes': "📋 Chargement des cassettes FTTE...",
+    'cables': "🔌 Chargement des câbles...",
+    'ftte_fibres': "🔎 Collecte des fibres des positions FTTE (plan semijoin)...",
+    'fibres': "🔍 Création de l'index des fibres...",
+    'sites': "🏢 Chargement des sites...",
+    'locals': "🏢 Chargement des locaux SRO...",
+}
+
+
+def _load_table_task(zip_path, name, strict_encoding=False, verbose=True, member_store=None):
+    """
+    Charge une table dans un processus séparé, avec son propre ExportZip (mêmes options
+    de lecture et même magasin que l'archive du processus principal)
+    """
+    with measure_stage(name, 'pool') as metrics:
+        with ExportZip(zip_path, strict_encoding, verbose, member_store) as zip_file:
+            result = TABLE_LOADERS[name](zip_file)
+    return result, metrics
+
+
+def critical_path(timings):
+    """Durée du plus long chemin du graphe de chargement et tables qui le composent"""
+    finish = {}
+    for name in TABLE_DEPENDENCIES:
+        if name not in timings:
+            continue
+        deps = [finish[dep] for dep in TABLE_DEPENDENCIES[name] if dep in finish]
+        duration, path = max(deps, default=(0.0, ()))
+        finish[name] = (duration + timings[name], path + (name,))
+    return max(finish.values(), default=(0.0, ()))
+
+
+def load_reference_tables(zip_file, zip_path, fibre_plan='auto', workers=1, compact=False, stages=None):
+    """
+    Charge les tables de référence et construit les index de l'analyse
+    Avec workers > 1, cassettes, câbles, sites et locaux sont chargés en parallèle
+    dans un pool de processus ; la collecte semijoin et l'index des fibres (le plus
+    volumineux) sont construits dans le processus principal dès que leurs dépendances
+    sont prêtes, pour éviter de transférer l'index entre processus.
+    stages : liste complétée par les mesures de chaque étape (voir measure_stage)
+    fibre_plan 'partition' : l'index des fibres n'est pas construit (jointure partitionnée)
+    Retourne le dictionnaire des index, ou None si l'analyse ne peut pas continuer
+    """
+    timings = {}
+    load_start = time.time()
+    fibre_plan = choose_fibre_plan(zip_file, fibre_plan)
+    
+    def report(name, result):
+        """Affiche le résumé d'une table chargée"""
+        if name == 'cassettes':
+            cassettes_ftte, row_count = result
+            echo(zip_file, f"   → {row_count} lignes traitées")
+            echo(zip_file, f"   → {len(cassettes_ftte)} cassettes FTTE trouvées")
+        elif name == 'cables':
+            cables, pe_count = result
+            echo(zip_file, f"   → {len(cables)} câbles chargés")
+            echo(zip_file, f"   → {pe_count} câbles avec nœud PE identifié")
+        elif name == 'ftte_fibres':
+            echo(zip_file, f"   → {len(result):,} fibres référencées par les cassettes FTTE")
+        elif name == 'fibres':
+            echo(zip_file, f"   → Total: {len(result):,} fibres indexées")
+        elif name == 'sites':
+            noeud_to_site, pe_sites = result
+            echo(zip_file, f"   → {len(noeud_to_site)} relations nœud->site chargées")
+            echo(zip_file, f"   → dont {pe_sites} nœuds PE")
+        elif name == 'locals':
+            echo(zip_file, f"   → {len(result)} locaux SRO chargés")
+        echo(zip_file, f"   ⏱️  {timings[name]:.2f} s")
+    
+    def finish(name, result, metrics):
+        """Enregistre les mesures d'une table chargée et affiche son résumé"""
+        metrics['rows_kept'] = len(result[0] if isinstance(result, tuple) else result)
+        timings[name] = metrics['wall_s']
+        if stages is not None:
+            stages.append(metrics)
+        report(name, result)
+        return result
+    
+    def run_local(name, func, *args):
+        """Exécute une étape dans le processus principal"""
+        echo(zip_file, f"\n{TABLE_TITLES[name]}")
+        with measure_stage(name) as metrics:
+            result = func(zip_file, *args)
+        return finish(name, result, metrics)
+    
+    pool = None
+    futures = {}
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(TABLE_LOADERS)))
+        futures = {name: pool.submit(_load_table_task, zip_path, name, export_option(zip_file, 'strict_encoding'),
+                                     export_option(zip_file, 'verbose'), export_option(zip_file, 'member_store'))
+                   for name in TABLE_LOADERS}
+    
+    def get(name):
+        """Résultat d'une table : attendu dans le pool, ou chargé localement"""
+        if name in futures:
+            result, metrics = futures[name].result()
+            echo(zip_file, f"\n{TABLE_TITLES[name]}")
+            return finish(name, result, metrics)
+        return run_local(name, TABLE_LOADERS[name])
+    
+    try:
+        cassettes_ftte, _ = get('cassettes')
+        if not cassettes_ftte:
+            return None
+        
+        cables, _ = get('cables')
+        
+        referenced_fibres = None
+        fibre_to_cable = None
+        if fibre_plan == 'semijoin':
+            referenced_fibres = run_local('ftte_fibres', collect_ftte_fibres, cassettes_ftte)
+        if fibre_plan != 'partition':
+            fibre_to_cable = run_local('fibres', load_fibres, cables, referenced_fibres, compact)
+        referenced_fibres = None
+        
+        noeud_to_site, _ = get('sites')
+        site_to_local = get('locals')
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    
+    # Résolution câble -> PM, calculée une fois par câble et non par position
+    resolved_count = resolve_cable_pm(cables, noeud_to_site, site_to_local)
+    echo(zip_file, f"   → {resolved_count} câbles rattachés à un PM")
+    
+    path_time, path = critical_path(timings)
+    echo(zip_file, f"\n⏱️  Chargement des tables: {time.time() - load_start:.2f} s "
+          f"(chemin critique {path_time:.2f} s : {' → '.join(path)})")
+    
+    return {
+        'cassettes_ftte': cassettes_ftte,
+        'cables': cables,
+        'fibre_to_cable': fibre_to_cable,
+        'noeud_to_site': noeud_to_site,
+        'site_to_local': site_to_local,
+    }
+
+
+def resolve_cable_pm(cables, noeud_to_site, site_to_local):
+    """
+    Résout une seule fois chaque câble vers son PM : nœud PE -> site -> local SRO
+    Renseigne pour chaque câble pm_status (PM_RESOLVED ou REJECT_*) et pm
+    (tuple nœud PE, site, code local, étiquette local ; None en cas de rejet)
+    Retourne le nombre de câbles rattachés à un PM
+    """
+    resolved = 0
+    for cable in cables.values():
+        cable.pm = None
+        pe_node = cable.pe_node
+        if not pe_node:
+            cable.pm_status = REJECT_NO_PE
+            continue
+        
+        site_code = noeud_to_site.get(pe_node)
+        if not site_code:
+            cable.pm_status = REJECT_NO_SITE
+            continue
+        
+        local_info = site_to_local.get(site_code)
+        if not local_info:
+            cable.pm_status = REJECT_NO_LOCAL
+            continue
+        
+        cable.pm_status = PM_RESOLVED
+        cable.pm = (pe_node, site_code, local_info['lc_code'], local_info['lc_etiquet'])
+        resolved += 1
+    return resolved
+
+
+def index_cache_key(zip_file):
+    """
+    Clé de cache d'un export : CRC et tailles des fichiers CSV lus dans le répertoire
+    central du ZIP (aucune décompression), indépendante du nom et de la date du ZIP
+    """
+    digest = hashlib.sha256(f"ftte-index-v{INDEX_CACHE_VERSION}".encode())
+    for file_name in REQUIRED_FILES:
+        info = zip_file.getinfo(file_name)
+        digest.update(f"|{file_name}:{info.CRC:08x}:{info.file_size}".encode())
+    return digest.hexdigest()
+
+
+def index_cache_suffix(fibre_plan, compact=False, mapped=False):
+    """
+    Extension de l'entrée des index dans le cache : les index construits dépendent du
+    plan des fibres (semijoin : fibres des cassettes FTTE seulement), de --compact et
+    du magasin (positions des lignes au lieu des étiquettes), une entrée par combinaison
+    """
+    parts = [fibre_plan] + (['compact'] if compact else []) + (['mapped'] if mapped else [])
+    return '.' + '.'.join(parts) + '.idx'
+
+
+def load_cached_indexes(cache_dir, key, suffix='.idx', verbose=True):
+    """
+    Charge les index (ou l'entrée d'extension suffix) depuis le cache, ou None si absents ou illisibles
+    verbose : avertit d'une entrée illisible
+    """
+    path = os.path.join(cache_dir, f"{key}{suffix}")
+    try:
+        with open(path, 'rb') as f:
+            version, indexes = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        if verbose:
+            print(f"   ⚠️  Cache illisible ignoré ({e})")
+        return None
+    
+    if version != INDEX_CACHE_VERSION:
+        return None
+    
+    # Entrée récemment utilisée : la date de modification sert à l'éviction LRU
+    os.utime(path)
+    return indexes
+
+
+def store_cached_indexes(cache_dir, key, indexes, max_size_mb=DEFAULT_CACHE_SIZE_MB, suffix='.idx',
+                         verbose=True):
+    """
+    Enregistre les index (ou l'entrée d'extension suffix) dans le cache (écriture
+    atomique) puis évince les entrées les moins récemment utilisées au-delà de max_size_mb
+    verbose : affiche les échecs d'écriture et les entrées évincées
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}{suffix}")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            # Les références partagées (fibre -> enregistrement câble) sont conservées par pickle
+            pickle.dump((INDEX_CACHE_VERSION, indexes), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        if verbose:
+            print(f"   ⚠️  Écriture du cache impossible ({e})")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    
+    for evicted in evict_cache(cache_dir, max_size_mb, keep=(path,)):
+        if verbose:
+            print(f"   → Cache: entrée évincée {os.path.basename(evicted)}")
+
+
+def evict_cache(cache_dir, max_size_mb, keep=(), suffixes=CACHE_SUFFIXES):
+    """
+    Supprime les entrées les moins récemment utilisées (fichiers d'extension suffixes,
+    sauf ceux de keep) tant que le répertoire dépasse max_size_mb
+    Retourne les chemins supprimés
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(suffixes):
+            path = os.path.join(cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, path in sorted(entries):
+        if total <= max_size_mb * 1024 * 1024:
+            break
+        if path in keep:
+            continue
+        os.remove(path)
+        total -= size
+        evicted.append(path)
+    return evicted
+
+
+class CsvOutput:
+    """
+    Sortie CSV (';'), éventuellement compressée (gzip ou zstd)
+    writerow est directement celui du csv.writer : aucun surcoût par ligne
+    """
+    csv_blocks = True
+    overlapped = False
+
+    def __init__(self, path, compression=None, profile=False):
+        if compression == 'gzip':
+            self.file = gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+        elif compression == 'zstd':
+            self.file = open_zstd_text(path)
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.stream = TimedOutput(self.file) if profile else self.file
+        self.writerow = csv.writer(self.stream, delimiter=';').writerow
+        self.writerow(RESULT_FIELDNAMES)
+
+    def write_block(self, block):
+        """Ajoute un bloc de lignes déjà formatées en CSV (mode parallèle)"""
+        self.stream.write(block)
+
+    def timings(self):
+        """Temps réel et CPU passés dans les écritures (mesurés avec profile)"""
+        if isinstance(self.stream, TimedOutput):
+            return self.stream.wall, self.stream.cpu
+        return 0.0, 0.0
+
+    def close(self):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        self.file.close()
+        if isinstance(self.stream, TimedOutput):
+            self.stream.wall += time.perf_counter() - start
+            self.stream.cpu += time.thread_time() - cpu_start
+
+
+def open_zstd_text(path):
+    """Fichier texte compressé zstd (module compression.zstd de Python 3.14, sinon zstandard)"""
+    try:
+        from compression import zstd
+    except ImportError:
+        import zstandard
+        raw = open(path, 'wb')
+        stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    return zstd.open(path, 'wt', encoding='utf-8', newline='')
+
+
+class RowBuffer(list):
+    """Liste de lignes utilisable comme writer (blocs renvoyés par les processus de traitement)"""
+    writerow = list.append
+
+
+class ThreadedOutput:
+    """
+    Sortie des résultats dans un thread d'écriture
+    Les lignes sont regroupées par blocs de block_rows (CSV déjà formaté, ou lignes
+    pour les sorties par colonnes) transmis au thread par une file bornée à depth blocs :
+    encodage, compression et écritures se font pendant le traitement des positions
+    suivantes, et le traitement attend si l'écriture prend du retard (contre-pression).
+    """
+    overlapped = True
+
+    def __init__(self, output, depth=PIPELINE_DEPTH, block_rows=PIPELINE_WRITE_ROWS):
+        self.output = output
+        self.csv_blocks = output.csv_blocks
+        self.block_rows = block_rows
+        self.blocks = queue.Queue(depth)
+        self.error = None
+        self.new_block()
+        self.thread = threading.Thread(target=self._run, name='ftte-writer', daemon=True)
+        self.thread.start()
+    
+    def new_block(self):
+        self.count = 0
+        if self.csv_blocks:
+            self.block = io.StringIO(newline='')
+            self.append = csv.writer(self.block, delimiter=';').writerow
+        else:
+            self.block = RowBuffer()
+            self.append = self.block.append
+    
+    def writerow(self, row):
+        self.append(row)
+        self.count += 1
+        if self.count >= self.block_rows:
+            self.send()
+    
+    def send(self):
+        """Transmet le bloc en cours au thread d'écriture"""
+        if self.error is not None:
+            raise self.error
+        if self.count:
+            self.blocks.put(self.block.getvalue() if self.csv_blocks else self.block)
+            self.new_block()
+    
+    def _run(self):
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                return
+            if self.error is None:
+                try:
+                    self.output.write_block(block)
+                except Exception as e:
+                    # Signalée au prochain bloc ; la file continue d'être vidée
+                    self.error = e
+    
+    def timings(self):
+        return self.output.timings()
+    
+    def close(self):
+        try:
+            self.send()
+        finally:
+            self.blocks.put(None)
+            self.thread.join()
+            self.output.close()
+        if self.error is not None:
+            raise self.error
+
+
+class ColumnarOutput:
+    """
+    Sortie par lots de colonnes (Parquet, Arrow, SQLite)
+    Les lignes sont accumulées puis transposées en colonnes par lots de
+    OUTPUT_BATCH_ROWS ; les colonnes très répétées (DICTIONARY_COLUMNS : câbles,
+    nœud PE, site, local et étiquette PM) sont encodées par dictionnaire.
+    Avec shared_dictionaries, flush remplace leurs valeurs par leur code dans un
+    dictionnaire par colonne partagé par tous les lots (dictionary_values) ; sinon
+    les colonnes sont transmises telles quelles et encodées par la sous-classe.
+    Les sous-classes implémentent write_batch(columns) et finish()
+    """
+    csv_blocks = False
+    overlapped = False
+    shared_dictionaries = True
+
+    def __init__(self, profile=False):
+        self.rows = []
+        self.dictionaries = ({index: {} for index in DICTIONARY_COLUMNS}
+                             if self.shared_dictionaries else {})
+        self.values = {index: [] for index in self.dictionaries}
+        self.profile = profile
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def writerow(self, row):
+        rows = self.rows
+        rows.append(row)
+        if len(rows) >= OUTPUT_BATCH_ROWS:
+            self.flush()
+
+    def write_block(self, rows):
+        """Ajoute un bloc de lignes (mode parallèle)"""
+        self.rows.extend(rows)
+        if len(self.rows) >= OUTPUT_BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        columns = [list(column) for column in zip(*self.rows)]
+        self.rows = []
+        for index, dictionary in self.dictionaries.items():
+            # Codes entiers : indice de la valeur dans son dictionnaire (ordre d'apparition) ;
+            # seules les valeurs nouvelles du lot sont ajoutées, le coût ne dépend que du lot
+            column = columns[index]
+            new_values = [value for value in dict.fromkeys(column) if value not in dictionary]
+            for value in new_values:
+                dictionary[value] = len(dictionary)
+            self.values[index].extend(new_values)
+            columns[index] = array('I', map(dictionary.__getitem__, column))
+        self.write_batch(columns)
+        if self.profile:
+            self.wall += time.perf_counter() - start
+            self.cpu += time.thread_time() - cpu_start
+
+    def dictionary_values(self, index):
+        """Valeurs du dictionnaire d'une colonne, dans l'ordre de leurs codes (liste partagée)"""
+        return self.values[index]
+
+    def timings(self):
+        return self.wall, self.cpu
+
+    def close(self):
+        self.flush()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        self.finish()
+        if self.profile:
+            self.wall += time.perf_counter() - start
+            self.cpu += time.thread_time() - cpu_start
+
+
+class ArrowOutput(ColumnarOutput):
+    """
+    Sortie Parquet ou flux Arrow IPC (pyarrow), colonnes répétées en type dictionnaire
+    Chaque lot est encodé par pyarrow (dictionary_encode) avec son propre dictionnaire,
+    construit une seule fois à partir des valeurs du lot : le coût d'un lot ne dépend
+    pas du nombre de valeurs déjà écrites. Parquet écrit de toute façon un dictionnaire
+    par groupe de lignes ; le flux Arrow IPC transmet le dictionnaire de chaque lot
+    (remplacement de dictionnaire, admis par le format flux).
+    """
+    shared_dictionaries = False
+
+    def __init__(self, path, output_format, profile=False):
+        super().__init__(profile)
+        import pyarrow
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([
+            (name, pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+             if index in DICTIONARY_COLUMNS else pyarrow.string())
+            for index, name in enumerate(RESULT_FIELDNAMES)
+        ])
+        if output_format == 'parquet':
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_stream(path, self.schema)
+        self.output_format = output_format
+
+    def write_batch(self, columns):
+        pa = self.pa
+        arrays = []
+        for index, column in enumerate(columns):
+            array = pa.array(column, pa.string())
+            arrays.append(array.dictionary_encode() if index in DICTIONARY_COLUMNS else array)
+        batch = pa.record_batch(arrays, schema=self.schema)
+        if self.output_format == 'parquet':
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def finish(self):
+        self.writer.close()
+
+
+class SqliteOutput(ColumnarOutput):
+    """
+    Sortie SQLite : table resultats (colonnes répétées remplacées par l'identifiant
+    de leur valeur dans la table valeurs) et vue ftte_results avec les colonnes du CSV
+    """
+
+    def __init__(self, path, profile=False):
+        super().__init__(profile)
+        if os.path.exists(path):
+            os.remove(path)
+        self.connection = sqlite3.connect(path)
+        self.stored = {index: 0 for index in DICTIONARY_COLUMNS}
+        columns = ', '.join(
+            f'c{index} INTEGER' if index in DICTIONARY_COLUMNS else f'c{index} TEXT'
+            for index in range(len(RESULT_FIELDNAMES)))
+        selected = ', '.join(
+            f'v{index}.valeur AS "{name}"' if index in DICTIONARY_COLUMNS else f'r.c{index} AS "{name}"'
+            for index, name in enumerate(RESULT_FIELDNAMES))
+        joins = ' '.join(
+            f'LEFT JOIN valeurs v{index} ON v{index}.colonne = {index} AND v{index}.code = r.c{index}'
+            for index in DICTIONARY_COLUMNS)
+        self.connection.executescript(f"""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE valeurs (colonne INTEGER, code INTEGER, valeur TEXT, PRIMARY KEY (colonne, code));
+            CREATE TABLE resultats (id INTEGER PRIMARY KEY, {columns});
+            CREATE VIEW ftte_results AS SELECT {selected} FROM resultats r {joins} ORDER BY r.id;
+        """)
+        self.insert = (f"INSERT INTO resultats ({', '.join(f'c{i}' for i in range(len(RESULT_FIELDNAMES)))}) "
+                       f"VALUES ({', '.join('?' * len(RESULT_FIELDNAMES))})")
+
+    def write_batch(self, columns):
+        # Nouvelles valeurs des dictionnaires depuis le lot précédent
+        for index in DICTIONARY_COLUMNS:
+            values = self.dictionary_values(index)
+            new_values = values[self.stored[index]:]
+            self.connection.executemany(
+                "INSERT INTO valeurs VALUES (?, ?, ?)",
+                ((index, code, value) for code, value in enumerate(new_values, self.stored[index])))
+            self.stored[index] = len(values)
+        self.connection.executemany(self.insert, zip(*columns))
+
+    def finish(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class BundleOutput:
+    """
+    Bundle des résultats pour les pages web (répertoire) : les connexions sont
+    réparties en un fichier par PM (shards/NNNNN.json.gz, colonnes répétées encodées
+    par dictionnaire), manifest.json décrit l'analyse et chaque PM (sites, nombre de
+    connexions, fichier) et index.json.gz donne, pour chaque cassette, câble, nœud PE
+    et site, les PM où il apparaît. La page charge le manifeste puis seulement les
+    PM ouverts ; aucune jointure n'est faite dans le navigateur.
+    Les lignes sont accumulées par PM et déversées dans des fichiers temporaires
+    au-delà de BUNDLE_SPILL_ROWS lignes (mémoire bornée) ; les fichiers d'un PM sont
+    écrits à la fermeture.
+    """
+    csv_blocks = False
+    overlapped = False
+
+    # Index de recherche (noms de ftte_server.py) : nom dans index.json.gz -> colonnes des résultats
+    LOOKUP_COLUMNS = {'cassette': (0,), 'cable': (2, 4), 'pe': (5,), 'site': (6,)}
+
+    def __init__(self, path, profile=False):
+        if os.path.isdir(path):
+            if os.listdir(path) and not os.path.exists(os.path.join(path, 'manifest.json')):
+                raise ValueError(f"Le répertoire {path} existe et n'est pas un bundle")
+            shutil.rmtree(path)
+        self.path = path
+        self.spill_dir = os.path.join(path, '.spill')
+        os.makedirs(os.path.join(path, 'shards'))
+        os.makedirs(self.spill_dir)
+        self.shards = {}
+        self.buffers = []
+        self.counts = []
+        self.labels = []
+        self.sites = []
+        self.cassettes = []
+        self.lookups = {name: defaultdict(set) for name in self.LOOKUP_COLUMNS}
+        self.buffered = 0
+        self.profile = profile
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def writerow(self, row):
+        shard = self.shards.get(row[7])
+        if shard is None:
+            shard = self.shards[row[7]] = len(self.buffers)
+            self.buffers.append([])
+            self.counts.append(0)
+            self.labels.append(row[8])
+            self.sites.append(set())
+            self.cassettes.append(set())
+        self.buffers[shard].append(row)
+        self.buffered += 1
+        if self.buffered >= BUNDLE_SPILL_ROWS:
+            self.spill()
+
+    def write_block(self, rows):
+        """Ajoute un bloc de lignes (mode parallèle)"""
+        for row in rows:
+            self.writerow(row)
+
+    def _index(self, shard, rows):
+        """Compteurs et index de recherche d'un lot de lignes d'un PM"""
+        self.counts[shard] += len(rows)
+        self.sites[shard].update(row[6] for row in rows)
+        self.cassettes[shard].update(row[0] for row in rows)
+        for name, columns in self.LOOKUP_COLUMNS.items():
+            lookup = self.lookups[name]
+            for index in columns:
+                for value in {row[index] for row in rows}:
+                    lookup[value].add(shard)
+
+    def spill(self):
+        """Déverse les lignes accumulées dans les fichiers temporaires de chaque PM"""
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        for shard, rows in enumerate(self.buffers):
+            if rows:
+                self._index(shard, rows)
+                with open(os.path.join(self.spill_dir, f"{shard}.spill"), 'ab') as f:
+                    pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self.buffers[shard] = []
+        self.buffered = 0
+        if self.profile:
+            self.wall += time.perf_counter() - start
+            self.cpu += time.thread_time() - cpu_start
+
+    def shard_rows(self, shard):
+        """Lignes d'un PM : lots déversés puis lignes en mémoire"""
+        path = os.path.join(self.spill_dir, f"{shard}.spill")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        yield from pickle.load(f)
+                    except EOFError:
+                        break
+        yield from self.buffers[shard]
+
+    def write_shard(self, shard, pm):
+        """Écrit le fichier d'un PM ; retourne son chemin relatif"""
+        dictionaries = {index: {} for index in DICTIONARY_COLUMNS}
+        rows = []
+        for row in self.shard_rows(shard):
+            row = list(row)
+            for index, dictionary in dictionaries.items():
+                row[index] = dictionary.setdefault(row[index], len(dictionary))
+            rows.append(row)
+        file_name = f"shards/{shard + 1:05d}.json.gz"
+        document = {
+            'pm': pm, 'label': self.labels[shard], 'columns': RESULT_FIELDNAMES,
+            'dictionaries': {str(index): list(dictionary) for index, dictionary in dictionaries.items()},
+            'rows': rows
+        }
+        write_json_gz(os.path.join(self.path, file_name), document)
+        return file_name
+
+    def timings(self):
+        return self.wall, self.cpu
+
+    def close(self):
+        self.spill()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        shards = []
+        for pm, shard in self.shards.items():
+            file_name = self.write_shard(shard, pm)
+            shards.append({
+                'id': shard, 'pm': pm, 'label': self.labels[shard],
+                'sites': sorted(self.sites[shard]), 'rows': self.counts[shard],
+                'cassettes': len(self.cassettes[shard]), 'file': file_name,
+                'bytes': os.path.getsize(os.path.join(self.path, file_name))
+            })
+        shutil.rmtree(self.spill_dir)
+        
+        write_json_gz(os.path.join(self.path, 'index.json.gz'), {
+            name: {value: sorted(shards_of) for value, shards_of in lookup.items() if value is not None}
+            for name, lookup in self.lookups.items()
+        })
+        shards.sort(key=lambda shard: (shard['label'] or '', shard['pm']))
+        manifest = {
+            'format': 'ftte-bundle', 'version': BUNDLE_VERSION,
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'columns': RESULT_FIELDNAMES, 'results': sum(self.counts),
+            'index': 'index.json.gz', 'shards': shards
+        }
+        with open(os.path.join(self.path, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        if self.profile:
+            self.wall += time.perf_counter() - start
+            self.cpu += time.thread_time() - cpu_start
+
+
+def write_json_gz(path, document):
+    """Écrit un document JSON compressé gzip (compact, UTF-8)"""
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(document, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def update_bundle_manifest(path, **fields):
+    """Complète le manifeste d'un bundle (export analysé, compteurs de l'analyse)"""
+    manifest_path = os.path.join(path, 'manifest.json')
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest.update(fields)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+def output_size(path):
+    """Taille (octets) du fichier de résultats, ou du répertoire d'un bundle"""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(directory, name))
+                   for directory, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def missing_output_dependency(output_format):
+    """Message d'erreur si le module nécessaire au format de sortie est absent, sinon None"""
+    try:
+        if output_format in ('parquet', 'arrow'):
+            import pyarrow
+        elif output_format == 'csv.zst':
+            try:
+                from compression import zstd
+            except ImportError:
+                import zstandard
+    except ImportError as e:
+        return f"format {output_format} indisponible (module {e.name} non installé)"
+    return None
+
+
+def output_stem(output_file):
+    """Chemin du fichier de résultats sans l'extension de son format (rapports associés)"""
+    for extension in sorted(OUTPUT_FORMATS.values(), key=len, reverse=True):
+        if output_file.endswith(extension):
+            return output_file[:-len(extension)]
+    return os.path.splitext(output_file)[0]
+
+
+def open_output(path, output_format='csv', profile=False, threaded=False):
+    """
+    Ouvre la sortie des résultats au format demandé (voir OUTPUT_FORMATS)
+    threaded : écritures dans un thread dédié (ThreadedOutput)
+    """
+    if threaded:
+        return ThreadedOutput(open_output(path, output_format, profile))
+    if output_format == 'csv':
+        return CsvOutput(path, profile=profile)
+    if output_format == 'csv.gz':
+        return CsvOutput(path, 'gzip', profile)
+    if output_format == 'csv.zst':
+        return CsvOutput(path, 'zstd', profile)
+    if output_format in ('parquet', 'arrow'):
+        return ArrowOutput(path, output_format, profile)
+    if output_format == 'sqlite':
+        return SqliteOutput(path, profile)
+    if output_format == 'bundle':
+        return BundleOutput(path, profile)
+    raise ValueError(f"Format de sortie inconnu: {output_format}")
+
+
+def classify_position(fibre1, fibre2, fibre_to_cable):
+    """
+    Classe une position d'une cassette FTTE d'après l'index fibre -> câble : règle
+    unique de la jointure (join_positions, diagnostic, analyse différentielle, serveur)
+    Retourne (statut, fibre_tr, cable_tr, fibre_di, cable_di) : statut PM_RESOLVED
+    (PM dans cable_di.pm) ou code de rejet (REJECT_REASONS). Pour les rejets fibre
+    non trouvée et pas TR-DI, fibres et câbles (None si absent) sont dans l'ordre
+    ps_1, ps_2
+    """
+    cable1 = fibre_to_cable.get(fibre1)
+    if cable1 is None:
+        return REJECT_FIBRE1_NOT_FOUND, fibre1, None, fibre2, None
+    cable2 = fibre_to_cable.get(fibre2)
+    if cable2 is None:
+        return REJECT_FIBRE2_NOT_FOUND, fibre1, cable1, fibre2, None
+    
+    # Identifier TR et DI, puis le PM du câble DI (nœud PE -> site -> local SRO, déjà résolu)
+    if cable1.cb_typelog == 'TR' and cable2.cb_typelog == 'DI':
+        return cable2.pm_status, fibre1, cable1, fibre2, cable2
+    if cable1.cb_typelog == 'DI' and cable2.cb_typelog == 'TR':
+        return cable1.pm_status, fibre2, cable2, fibre1, cable1
+    return REJECT_NOT_TR_DI, fibre1, cable1, fibre2, cable2
+
+
+def connection_row(cassette_code, fibre_tr, cable_tr, fibre_di, cable_di):
+    """Ligne de résultat d'une position classée PM_RESOLVED (voir classify_position)"""
+    pe_node, site_code, lc_code, lc_etiquet = cable_di.pm
+    return (cassette_code, fibre_tr, cable_tr.cb_etiquet, fibre_di, cable_di.cb_etiquet,
+            pe_node, site_code, lc_code, lc_etiquet)
+
+
+def join_positions(rows, cassettes_ftte, fibre_to_cable, writer):
+    """
+    Joint les positions (ps_cs_code, ps_1, ps_2) avec les index et écrit les résultats
+    (classify_position)
+    Retourne les compteurs : positions, results, no_pe, no_site, no_local
+    """
+    positions_processed = 0
+    # Compteurs par statut (PM_RESOLVED : connexions écrites)
+    status_counts = [0] * (len(REJECT_REASONS) + 1)
+    writerow = writer.writerow
+    
+    for cassette_code, fibre1, fibre2 in rows:
+        positions_processed += 1
+        
+        # Vérifier si c'est une cassette FTTE
+        if cassette_code not in cassettes_ftte:
+            continue
+        
+        status, fibre_tr, cable_tr, fibre_di, cable_di = classify_position(fibre1, fibre2, fibre_to_cable)
+        status_counts[status] += 1
+        if status == PM_RESOLVED:
+            # Ligne de connection_row, construite sans appel supplémentaire par connexion
+            pe_node, site_code, lc_code, lc_etiquet = cable_di.pm
+            writerow((cassette_code, fibre_tr, cable_tr.cb_etiquet, fibre_di, cable_di.cb_etiquet,
+                      pe_node, site_code, lc_code, lc_etiquet))
+    
+    return {
+        'positions': positions_processed,
+        'results': status_counts[PM_RESOLVED],
+        'no_pe': status_counts[REJECT_NO_PE],
+        'no_site': status_counts[REJECT_NO_SITE],
+        'no_local': status_counts[REJECT_NO_LOCAL]
+    }
+
+
+class SpliceIndex:
+    """
+    Index d'adjacence des fibres construit à partir de toutes les lignes de
+    t_position.csv (une ligne = une épissure entre ps_1 et ps_2), pour suivre un
+    chemin au-delà de la cassette FTTE (TR→TR→DI, DI→DI...)
+    Les fibres sont numérotées ; une fibre a au plus deux voisines (ses deux
+    extrémités) rangées dans deux tableaux array('i'), les voisines supplémentaires
+    dans un dict. Les fins de chemin déjà parcourues sont mémorisées par arête
+    orientée (fibre précédente, fibre courante), une mémoire par type de fibre cherchée
+    (memo de trace) : un tronc partagé n'est suivi qu'une fois.
+    """
+    __slots__ = ('ids', 'codes', 'first', 'second', 'extra')
+
+    def __init__(self):
+        self.ids = {}
+        self.codes = []
+        self.first = array('i')
+        self.second = array('i')
+        self.extra = {}
+    
+    def add(self, fibre1, fibre2):
+        """Enregistre l'épissure entre deux fibres (numérotées à leur première apparition)"""
+        ids = self.ids
+        id1 = ids.setdefault(fibre1, len(ids))
+        id2 = ids.setdefault(fibre2, len(ids))
+        if id1 == id2:
+            return
+        first = self.first
+        if len(first) < len(ids):
+            first.extend((-1, -1)[:len(ids) - len(first)])
+            self.second.extend((-1, -1)[:len(ids) - len(self.second)])
+        if first[id1] < 0:
+            first[id1] = id2
+        else:
+            self._link(id1, id2)
+        if first[id2] < 0:
+            first[id2] = id1
+        else:
+            self._link(id2, id1)
+    
+    def _link(self, fibre_id, other):
+        """Deuxième voisine ou suivantes (la première est renseignée par add)"""
+        if self.first[fibre_id] == other or self.second[fibre_id] == other:
+            # Épissure en double
+            return
+        if self.second[fibre_id] < 0:
+            self.second[fibre_id] = other
+        elif other not in self.extra.setdefault(fibre_id, []):
+            self.extra[fibre_id].append(other)
+    
+    def finish(self):
+        """Termine la construction : codes des fibres dans l'ordre de leur numéro"""
+        self.codes = list(self.ids)
+    
+    def next_fibre(self, fibre_id, previous):
+        """Voisine de fibre_id autre que previous, ou -1 (impasse ou embranchement)"""
+        if fibre_id in self.extra:
+            return -1
+        first = self.first[fibre_id]
+        second = self.second[fibre_id]
+        if first == previous:
+            return second
+        if second == previous or second < 0:
+            return first
+        return -1
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def trace(self, start, previous, is_target, max_hops, memo):
+        """
+        Suit les épissures à partir de la fibre start, atteinte depuis la fibre previous,
+        jusqu'à la première fibre pour laquelle is_target(code fibre) est vrai
+        memo : fins de chemin déjà parcourues pour ce is_target (dict partagé entre les appels)
+        Retourne (code de cette fibre, nombre de sauts), ou (None, 0) en cas d'impasse,
+        d'embranchement, de boucle ou au-delà de max_hops sauts
+        """
+        ids = self.ids
+        current = ids.get(start)
+        previous = ids.get(previous)
+        if current is None or previous is None:
+            return None, 0
+        codes = self.codes
+        size = len(codes)
+        path = []
+        seen = set()
+        result = -1
+        distance = 0
+        definitive = True
+        
+        for depth in range(max_hops + 1):
+            key = previous * size + current
+            known = memo.get(key)
+            if known is not None:
+                result, distance = known
+                if result >= 0 and depth + distance > max_hops:
+                    # Fin de chemin connue mais trop lointaine depuis ce départ
+                    result, definitive = -1, False
+                break
+            if is_target(codes[current]):
+                result = current
+                break
+            if key in seen:
+                # Boucle : aucune fibre cible sur ce chemin
+                break
+            seen.add(key)
+            path.append(key)
+            following = self.next_fibre(current, previous)
+            if following < 0:
+                break
+            previous, current = current, following
+        else:
+            definitive = False
+        
+        if definitive:
+            end = len(path) + distance
+            for depth, key in enumerate(path):
+                memo[key] = (result, end - depth) if result >= 0 else (-1, 0)
+        if result < 0:
+            return None, 0
+        return codes[result], len(path) + distance
+
+
+def load_splices(zip_file, fibre_to_cable):
+    """
+    Construit l'index des épissures (SpliceIndex) à partir de toutes les lignes de
+    t_position.csv ; seules les fibres dont le câble est connu sont indexées
+    """
+    splices = SpliceIndex()
+    add = splices.add
+    with open_csv_member(zip_file, 't_position.csv', ('ps_1', 'ps_2')) as reader:
+        for fibre1, fibre2 in reader:
+            if fibre1 in fibre_to_cable and fibre2 in fibre_to_cable:
+                add(fibre1, fibre2)
+    splices.finish()
+    return splices
+
+
+def join_positions_traced(rows, cassettes_ftte, fibre_to_cable, splices, writer, max_hops=DEFAULT_MAX_HOPS):
+    """
+    Jointure avec suivi des chemins (--trace) : comme join_positions, mais quand la
+    fibre opposée à la fibre TR de la cassette FTTE n'est pas une fibre DI avec nœud
+    PE (autre fibre TR, DI sans nœud PE...), ses épissures sont suivies (SpliceIndex)
+    jusqu'à la première fibre DI avec nœud PE, qui devient la fibre de distribution.
+    Une position DI→DI (aucune fibre TR sur la cassette) est essayée dans les deux sens :
+    la fibre de transport est la première fibre TR derrière l'une des fibres DI, la
+    fibre de distribution est cherchée derrière l'autre.
+    Une position est comptée dans no_pe quand sa fibre de transport est trouvée et que
+    le côté distribution, une fibre DI sans nœud PE, ne mène à aucune fibre DI avec
+    nœud PE ; les autres positions sans chemin ne sont pas comptées (comme les positions
+    sans fibre TR ou DI de join_positions).
+    Retourne les compteurs : positions, results, no_pe, no_site, no_local et traced
+    (connexions obtenues après au moins une épissure intermédiaire)
+    """
+    results_count = 0
+    positions_processed = 0
+    no_pe_count = 0
+    no_site_count = 0
+    no_local_count = 0
+    traced_count = 0
     
-    try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_file:
-            # Vérifier les fichiers requis
-            required_files = [
-                't_cassette.csv',
-                't_position.csv',
-                't_fibre.csv',
-                't_cable.csv',
-                't_site.csv',
-                't_local.csv'
-            ]
-            
-            for file_name in required_files:
-                if file_name not in zip_file.namelist():
-                    print(f"❌ Erreur: Fichier manquant: {file_name}")
-                    return
-            
-            print("✅ Tous les fichiers requis sont présents")
-            
-            # 1. Charger les cassettes FTTE
-            print("\n📋 Chargement des cassettes FTTE...")
-            cassettes_ftte = set()
-            with zip_file.open('t_cassette.csv') as f:
-                content = f.read()
-                # Essayer différents encodages
-                for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                    try:
-                        decoded = content.decode(encoding)
-                        break
-                    except:
-                        continue
-                
-                lines = decoded.splitlines()
-                if not lines:
-                    print("❌ Fichier t_cassette.csv vide")
-                    return
-                
-                # Détecter le délimiteur
-                first_line = lines[0]
-                delimiter = ';' if ';' in first_line else ','
-                
-                reader = csv.DictReader(lines, delimiter=delimiter)
-                
-                row_count = 0
-                for row in reader:
-                    row_count += 1
-                    # Nettoyer les clés
-                    clean_row = {k.strip().replace('\ufeff', ''): v for k, v in row.items() if k}
-                    
-                    if clean_row.get('cs_type') == 'E' and not clean_row.get('cs_bp_code', '').strip():
-                        cassettes_ftte.add(clean_row.get('cs_code', ''))
-                
-                print(f"   → {row_count} lignes traitées")
-            
-            print(f"   → {len(cassettes_ftte)} cassettes FTTE trouvées")
-            
-            if not cassettes_ftte:
-                print("❌ Aucune cassette FTTE trouvée")
-                return
-            
-            # 2. Charger les câbles (pour les étiquettes, types et nœuds)
-            print("\n🔌 Chargement des câbles...")
-            cables = {}
-            with zip_file.open('t_cable.csv') as f:
-                content = f.read()
-                for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                    try:
-                        decoded = content.decode(encoding)
-                        break
-                    except:
-                        continue
-                
-                lines = decoded.splitlines()
-                delimiter = ';' if ';' in lines[0] else ','
-                reader = csv.DictReader(lines, delimiter=delimiter)
-                
-                pe_count = 0
-                for row in reader:
-                    clean_row = {k.strip().replace('\ufeff', ''): v.strip() if v else '' 
-                                for k, v in row.items() if k}
-                    
-                    cb_code = clean_row.get('cb_code')
-                    cb_nd1 = clean_row.get('cb_nd1', '')
-                    cb_nd2 = clean_row.get('cb_nd2', '')
-                    
-                    # Identifier le nœud PE
-                    pe_node = None
-                    if cb_nd1.startswith('PE'):
-                        pe_node = cb_nd1
-                        pe_count += 1
-                    elif cb_nd2.startswith('PE'):
-                        pe_node = cb_nd2
-                        pe_count += 1
-                    
-                    cables[cb_code] = {
-                        'cb_typelog': clean_row.get('cb_typelog'),
-                        'cb_etiquet': clean_row.get('cb_etiquet', cb_code),
-                        'cb_nd1': cb_nd1,
-                        'cb_nd2': cb_nd2,
-                        'pe_node': pe_node
-                    }
-                    
-            print(f"   → {len(cables)} câbles chargés")
-            print(f"   → {pe_count} câbles avec nœud PE identifié")
-            
-            # 3. Créer un index des fibres
-            print("\n🔍 Création de l'index des fibres...")
-            fibre_to_cable = {}
-            
-            with zip_file.open('t_fibre.csv') as f:
-                content = f.read()
-                for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                    try:
-                        decoded = content.decode(encoding)
-                        break
-                    except:
-                        continue
-                
-                lines = decoded.splitlines()
-                delimiter = ';' if ';' in lines[0] else ','
-                reader = csv.DictReader(lines, delimiter=delimiter)
-                
-                fibre_count = 0
-                for row in reader:
-                    clean_row = {k.strip().replace('\ufeff', ''): v for k, v in row.items() if k}
-                    fibre_code = clean_row.get('fo_code')
-                    cable_code = clean_row.get('fo_cb_code')
-                    
-                    if cable_code in cables:
-                        fibre_to_cable[fibre_code] = cable_code
-                        fibre_count += 1
-                    
-                    if fibre_count % 500000 == 0 and fibre_count > 0:
-                        print(f"   → {fibre_count:,} fibres indexées...")
-            
-            print(f"   → Total: {len(fibre_to_cable):,} fibres indexées")
-            
-            # 4. Charger les sites (nœud -> site)
-            print("\n🏢 Chargement des sites...")
-            noeud_to_site = {}
-            with zip_file.open('t_site.csv') as f:
-                content = f.read()
-                for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                    try:
-                        decoded = content.decode(encoding)
-                        break
-                    except:
-                        continue
-                
-                lines = decoded.splitlines()
-                delimiter = ';' if ';' in lines[0] else ','
-                reader = csv.DictReader(lines, delimiter=delimiter)
-                
-                pe_sites = 0
-                for row in reader:
-                    clean_row = {k.strip().replace('\ufeff', ''): v.strip() if v else '' 
-                                for k, v in row.items() if k}
-                    nd_code = clean_row.get('st_nd_code')
-                    st_code = clean_row.get('st_code')
-                    if nd_code and st_code:
-                        noeud_to_site[nd_code] = st_code
-                        if nd_code.startswith('PE'):
-                            pe_sites += 1
+    def is_target(fibre_code):
+        """Fibre d'un câble DI avec nœud PE"""
+        cable = fibre_to_cable.get(fibre_code)
+        return cable is not None and cable.cb_typelog == 'DI' and cable.pm_status != REJECT_NO_PE
+    
+    def is_transport(fibre_code):
+        """Fibre d'un câble TR"""
+        cable = fibre_to_cable.get(fibre_code)
+        return cable is not None and cable.cb_typelog == 'TR'
+    
+    # Fins de chemin mémorisées, une mémoire par type de fibre cherchée
+    memo_di = {}
+    memo_tr = {}
+    
+    for cassette_code, fibre1, fibre2 in rows:
+        positions_processed += 1
+        
+        if cassette_code not in cassettes_ftte:
+            continue
+        
+        cable1 = fibre_to_cable.get(fibre1)
+        cable2 = fibre_to_cable.get(fibre2)
+        if cable1 is None or cable2 is None:
+            continue
+        
+        # Orientations possibles (côté transport, côté distribution) : fibre TR d'un côté,
+        # chemin à suivre de l'autre ; DI→DI : les deux sens
+        typelog1 = cable1.cb_typelog
+        typelog2 = cable2.cb_typelog
+        if typelog1 == 'TR' and typelog2 != 'TR':
+            orientations = ((fibre1, cable1, fibre2, cable2),)
+        elif typelog2 == 'TR' and typelog1 != 'TR':
+            orientations = ((fibre2, cable2, fibre1, cable1),)
+        elif typelog1 == typelog2 and typelog1 in ('TR', 'DI'):
+            orientations = ((fibre1, cable1, fibre2, cable2), (fibre2, cable2, fibre1, cable1))
+        else:
+            continue
+        
+        fibre_di = None
+        no_pe = False
+        for fibre_a, cable_a, fibre_b, cable_b in orientations:
+            # Côté transport : la fibre TR, ou la première fibre TR derrière une fibre DI
+            tr_hops = 0
+            if cable_a.cb_typelog == 'TR':
+                fibre_tr, cable_tr = fibre_a, cable_a
+            else:
+                fibre_tr, tr_hops = splices.trace(fibre_a, fibre_b, is_transport, max_hops, memo_tr)
+                if fibre_tr is None:
+                    continue
+                cable_tr = fibre_to_cable.get(fibre_tr)
             
-            print(f"   → {len(noeud_to_site)} relations nœud->site chargées")
-            print(f"   → dont {pe_sites} nœuds PE")
+            # Côté distribution : fibre DI avec nœud PE, au besoin après des épissures
+            if cable_b.cb_typelog == 'DI' and cable_b.pm_status != REJECT_NO_PE:
+                fibre_di, cable_di, hops = fibre_b, cable_b, tr_hops
+                break
+            fibre_di, hops = splices.trace(fibre_b, fibre_a, is_target, max_hops, memo_di)
+            if fibre_di is not None:
+                cable_di = fibre_to_cable.get(fibre_di)
+                hops += tr_hops
+                break
+            if cable_b.cb_typelog == 'DI':
+                # Câble DI sans nœud PE et aucun chemin vers un nœud PE
+                no_pe = True
+        
+        if fibre_di is None:
+            if no_pe:
+                no_pe_count += 1
+            continue
+        
+        pm_status = cable_di.pm_status
+        if pm_status:
+            if pm_status == REJECT_NO_SITE:
+                no_site_count += 1
+            else:
+                no_local_count += 1
+            continue
+        
+        pe_node, site_code, lc_code, lc_etiquet = cable_di.pm
+        writer.writerow((
+            cassette_code, fibre_tr, cable_tr.cb_etiquet,
+            fibre_di, cable_di.cb_etiquet,
+            pe_node, site_code, lc_code, lc_etiquet
+        ))
+        results_count += 1
+        if hops:
+            traced_count += 1
+    
+    return {
+        'positions': positions_processed,
+        'results': results_count,
+        'no_pe': no_pe_count,
+        'no_site': no_site_count,
+        'no_local': no_local_count,
+        'traced': traced_count
+    }
+
+
+class RejectionDiagnostics:
+    """
+    Diagnostic des rejets par cassette FTTE, en mémoire bornée
+    - counters : cassette -> compteurs de taille fixe (indice 0 : positions vues,
+      puis un compteur par code de rejet)
+    - samples : (cassette, code) -> au plus DIAGNOSTIC_SAMPLE_SIZE exemples distincts
+    - pm_cassettes : code du local PM -> cassettes FTTE qui y sont rattachées
+    """
+
+    def __init__(self, noeud_to_site, sample_size=DIAGNOSTIC_SAMPLE_SIZE):
+        self.noeud_to_site = noeud_to_site
+        self.sample_size = sample_size
+        self.counters = {}
+        self.samples = {}
+        self.pm_cassettes = defaultdict(set)
+
+    def __getstate__(self):
+        # L'index nœud -> site n'est pas renvoyé par les processus de traitement
+        state = self.__dict__.copy()
+        state['noeud_to_site'] = None
+        return state
+
+    def seen(self, cassette_code):
+        """Compteurs de la cassette, la position courante comptée comme vue"""
+        counters = self.counters.get(cassette_code)
+        if counters is None:
+            counters = self.counters[cassette_code] = array('Q', bytes(8 * (len(REJECT_REASONS) + 1)))
+        counters[0] += 1
+        return counters
+
+    def reject(self, counters, cassette_code, code, fibre1, fibre2, cable1, cable2):
+        """Compte un rejet et conserve un exemple tant que l'échantillon n'est pas plein"""
+        counters[code] += 1
+        key = (cassette_code, code)
+        sample = self.samples.get(key)
+        if sample is None:
+            sample = self.samples[key] = []
+        elif len(sample) >= self.sample_size:
+            return
+        
+        if code == REJECT_FIBRE1_NOT_FOUND:
+            example = f"Fibre1 {fibre1} non trouvée"
+        elif code == REJECT_FIBRE2_NOT_FOUND:
+            example = f"Fibre2 {fibre2} non trouvée"
+        elif code == REJECT_NOT_TR_DI:
+            example = f"Pas TR-DI: {cable1.cb_typelog}-{cable2.cb_typelog} ({fibre1}, {fibre2})"
+        elif code == REJECT_NO_PE:
+            example = f"Pas de PE dans câble DI {cable2.cb_etiquet}"
+        elif code == REJECT_NO_SITE:
+            example = f"Site non trouvé pour PE {cable2.pe_node}"
+        else:
+            example = f"Local non trouvé pour site {self.noeud_to_site.get(cable2.pe_node)}"
+        if example not in sample:
+            sample.append(example)
+
+    def merge(self, other):
+        """Ajoute le diagnostic d'un autre bloc de positions"""
+        for cassette_code, counters in other.counters.items():
+            own = self.counters.get(cassette_code)
+            if own is None:
+                self.counters[cassette_code] = counters
+                continue
+            for i, value in enumerate(counters):
+                own[i] += value
+        for key, examples in other.samples.items():
+            sample = self.samples.setdefault(key, [])
+            for example in examples:
+                if len(sample) >= self.sample_size:
+                    break
+                if example not in sample:
+                    sample.append(example)
+        for pm_code, cassettes in other.pm_cassettes.items():
+            self.pm_cassettes[pm_code] |= cassettes
+
+    def write_report(self, report_file, positions_count, cassettes_count):
+        """Écrit le rapport texte des rejets (format du rapport de l'analyseur debug)"""
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write("=== RAPPORT DEBUG CASSETTES FTTE ===\n\n")
             
-            # 5. Charger les locaux SRO
-            print("\n🏢 Chargement des locaux SRO...")
-            site_to_local = {}
-            with zip_file.open('t_local.csv') as f:
-                content = f.read()
-                for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                    try:
-                        decoded = content.decode(encoding)
-                        break
-                    except:
-                        continue
-                
-                lines = decoded.splitlines()
-                delimiter = ';' if ';' in lines[0] else ','
-                reader = csv.DictReader(lines, delimiter=delimiter)
-                
-                for row in reader:
-                    clean_row = {k.strip().replace('\ufeff', ''): v.strip() if v else '' 
-                                for k, v in row.items() if k}
-                    if clean_row.get('lc_typelog') == 'SRO':
-                        st_code = clean_row.get('lc_st_code')
-                        if st_code:
-                            site_to_local[st_code] = {
-                                'lc_code': clean_row.get('lc_code'),
-                                'lc_etiquet': clean_row.get('lc_etiquet')
-                            }
+            # PM avec plusieurs cassettes
+            f.write("PM AVEC PLUSIEURS CASSETTES:\n")
+            for pm, cassettes in self.pm_cassettes.items():
+                if len(cassettes) > 1:
+                    f.write(f"PM {pm}: {len(cassettes)} cassettes - {', '.join(sorted(cassettes))}\n")
             
-            print(f"   → {len(site_to_local)} locaux SRO chargés")
+            f.write("\n\nCASSETTES REJETÉES ET RAISONS:\n")
+            totals = array('Q', bytes(8 * (len(REJECT_REASONS) + 1)))
+            for cassette, counters in self.counters.items():
+                for i, value in enumerate(counters):
+                    totals[i] += value
+                if not any(counters[1:]):
+                    continue
+                f.write(f"\nCassette {cassette} (vue {counters[0]} fois):\n")
+                for code, label in REJECT_REASONS.items():
+                    if counters[code]:
+                        examples = self.samples.get((cassette, code), [])
+                        f.write(f"  - {label}: {counters[code]} ({'; '.join(examples)})\n")
             
-            # 6. Traiter les positions et écrire les résultats
-            print("\n⚙️  Traitement des positions...")
-            output_file = f"ftte_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            results_count = 0
-            positions_processed = 0
-            no_pe_count = 0
-            no_site_count = 0
-            no_local_count = 0
+            f.write("\n\nREJETS PAR RAISON:\n")
+            for code, label in REJECT_REASONS.items():
+                f.write(f"{label}: {totals[code]}\n")
             
-            with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    'Cassette FTTE', 'Fibre Transport', 'Cable Transport',
-                    'Fibre Distribution', 'Cable Distribution', 
-                    'Noeud PE', 'Site', 'Local PM', 'Etiquette PM'
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=';')
-                writer.writeheader()
-                
-                with zip_file.open('t_position.csv') as f:
-                    content = f.read()
-                    for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                        try:
-                            decoded = content.decode(encoding)
-                            break
-                        except:
-                            continue
-                    
-                    lines = decoded.splitlines()
-                    delimiter = ';' if ';' in lines[0] else ','
-                    reader = csv.DictReader(lines, delimiter=delimiter)
-                    
-                    for row in reader:
-                        positions_processed += 1
-                        clean_row = {k.strip().replace('\ufeff', ''): v for k, v in row.items() if k}
-                        
-                        # Vérifier si c'est une cassette FTTE
-                        if clean_row.get('ps_cs_code') not in cassettes_ftte:
-                            continue
-                        
-                        # Récupérer les fibres
-                        fibre1 = clean_row.get('ps_1')
-                        fibre2 = clean_row.get('ps_2')
-                        
-                        if fibre1 not in fibre_to_cable or fibre2 not in fibre_to_cable:
-                            continue
-                        
-                        # Récupérer les câbles
-                        cable1_code = fibre_to_cable[fibre1]
-                        cable2_code = fibre_to_cable[fibre2]
-                        cable1 = cables[cable1_code]
-                        cable2 = cables[cable2_code]
-                        
-                        # Identifier TR et DI
-                        if cable1['cb_typelog'] == 'TR' and cable2['cb_typelog'] == 'DI':
-                            cable_tr = cable1
-                            cable_di = cable2
-                            fibre_tr = fibre1
-                            fibre_di = fibre2
-                        elif cable1['cb_typelog'] == 'DI' and cable2['cb_typelog'] == 'TR':
-                            cable_tr = cable2
-                            cable_di = cable1
-                            fibre_tr = fibre2
-                            fibre_di = fibre1
-                        else:
-                            continue
-                        
-                        # Récupérer le nœud PE du câble DI
-                        pe_node = cable_di.get('pe_node')
-                        if not pe_node:
-                            no_pe_count += 1
-                            continue
-                        
-                        # Récupérer le site via le nœud PE
-                        site_code = noeud_to_site.get(pe_node)
-                        if not site_code:
-                            no_site_count += 1
-                            continue
-                        
-                        # Récupérer le local SRO via le site
-                        local_info = site_to_local.get(site_code)
-                        if not local_info:
-                            no_local_count += 1
-                            continue
-                        
-                        # Écrire le résultat
-                        writer.writerow({
-                            'Cassette FTTE': clean_row['ps_cs_code'],
-                            'Fibre Transport': fibre_tr,
-                            'Cable Transport': cable_tr['cb_etiquet'],
-                            'Fibre Distribution': fibre_di,
-                            'Cable Distribution': cable_di['cb_etiquet'],
-                            'Noeud PE': pe_node,
-                            'Site': site_code,
-                            'Local PM': local_info['lc_code'],
-                            'Etiquette PM': local_info['lc_etiquet']
-                        })
-                        results_count += 1
-                        
-                        if positions_processed % 100000 == 0:
-                            print(f"   → {positions_processed:,} positions traitées, {results_count:,} résultats trouvés...")
+            f.write("\n\nSTATISTIQUES:\n")
+            f.write(f"Total positions traitées: {positions_count}\n")
+            f.write(f"Total cassettes FTTE: {cassettes_count}\n")
+            f.write(f"Cassettes avec positions: {len(self.counters)}\n")
+            f.write(f"PM distincts trouvés: {len(self.pm_cassettes)}\n")
+
+
+def join_positions_diagnostics(rows, cassettes_ftte, fibre_to_cable, writer, diagnostics):
+    """
+    Variante de join_positions qui alimente un RejectionDiagnostics
+    (boucle séparée : join_positions reste sans surcoût hors diagnostic)
+    Retourne les mêmes compteurs que join_positions
+    """
+    positions_processed = 0
+    status_counts = [0] * (len(REJECT_REASONS) + 1)
+    seen = diagnostics.seen
+    reject = diagnostics.reject
+    pm_cassettes = diagnostics.pm_cassettes
+    
+    for cassette_code, fibre1, fibre2 in rows:
+        positions_processed += 1
+        
+        if cassette_code not in cassettes_ftte:
+            continue
+        counters = seen(cassette_code)
+        
+        status, fibre_tr, cable_tr, fibre_di, cable_di = classify_position(fibre1, fibre2, fibre_to_cable)
+        status_counts[status] += 1
+        if status != PM_RESOLVED:
+            reject(counters, cassette_code, status, fibre_tr, fibre_di, cable_tr, cable_di)
+            continue
+        
+        row = connection_row(cassette_code, fibre_tr, cable_tr, fibre_di, cable_di)
+        pm_cassettes[row[7]].add(cassette_code)
+        writer.writerow(row)
+    
+    return {
+        'positions': positions_processed,
+        'results': status_counts[PM_RESOLVED],
+        'no_pe': status_counts[REJECT_NO_PE],
+        'no_site': status_counts[REJECT_NO_SITE],
+        'no_local': status_counts[REJECT_NO_LOCAL]
+    }
+
+
+class IntegrityLimitReached(Exception):
+    """Seuil d'erreurs du contrôle d'intégrité dépassé (arrêt anticipé)"""
+
+
+class IntegrityReport:
+    """
+    Résultat du contrôle d'intégrité d'un export (validate_export)
+    - rows : table -> lignes lues
+    - checked / errors : contrôle (INTEGRITY_CHECKS) -> références (ou clés) contrôlées,
+      références cassées (ou clés en double)
+    - samples : contrôle -> au plus sample_size exemples
+    - stopped : table en cours quand le seuil max_errors a été dépassé (None sinon)
+    """
+
+    def __init__(self, max_errors=None, sample_size=INTEGRITY_SAMPLE_SIZE):
+        self.max_errors = max_errors
+        self.sample_size = sample_size
+        self.rows = {}
+        self.checked = dict.fromkeys(INTEGRITY_CHECKS, 0)
+        self.errors = dict.fromkeys(INTEGRITY_CHECKS, 0)
+        self.samples = {name: [] for name in INTEGRITY_CHECKS}
+        self.total_errors = 0
+        self.stopped = None
+    
+    def error(self, name, example):
+        """Compte une erreur ; lève IntegrityLimitReached au-delà de max_errors"""
+        self.errors[name] += 1
+        sample = self.samples[name]
+        if len(sample) < self.sample_size:
+            sample.append(example)
+        self.total_errors += 1
+        if self.max_errors is not None and self.total_errors > self.max_errors:
+            raise IntegrityLimitReached()
+    
+    @property
+    def failed(self):
+        return self.stopped is not None
+    
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'checks': {name: {'checked': self.checked[name], 'errors': self.errors[name],
+                              'samples': self.samples[name]} for name in INTEGRITY_CHECKS},
+            'total_errors': self.total_errors,
+            'stopped': self.stopped,
+        }
+    
+    def print_summary(self):
+        print("\n📊 Contrôle d'intégrité:")
+        for table, rows in self.rows.items():
+            print(f"   - {table}: {rows:,} lignes")
+        for name, label in INTEGRITY_CHECKS.items():
+            if not self.checked[name] and not self.errors[name]:
+                continue
+            marker = '❌' if self.errors[name] else '✅'
+            print(f"   {marker} {label}: {self.errors[name]:,} / {self.checked[name]:,}")
+            for example in self.samples[name]:
+                print(f"      · {example}")
+
+
+def tap_rows(rows, report, table, keys=None, column=0, check=None, reference=None):
+    """
+    Transmet les lignes d'une table en les comptant (report.rows) et en ajoutant leur
+    valeur de la colonne column à keys ; avec check, une valeur déjà présente est une
+    erreur de ce contrôle. reference : (colonne, clés existantes, contrôle, libellé de la
+    ligne) vérifié pour chaque valeur renseignée de la colonne
+    """
+    rows_count = report.rows
+    rows_count[table] = 0
+    for row in rows:
+        rows_count[table] += 1
+        key = row[column]
+        if check is not None:
+            report.checked[check] += 1
+            if key in keys:
+                report.error(check, key)
+        if keys is not None:
+            keys.add(key)
+        if reference is not None:
+            ref_column, ref_keys, ref_check, label = reference
+            value = row[ref_column]
+            if value:
+                report.checked[ref_check] += 1
+                if value not in ref_keys:
+                    report.error(ref_check, f"{label} {key} -> {value}")
+        yield row
+
+
+def validate_export(zip_file, max_errors=None, sample_size=INTEGRITY_SAMPLE_SIZE):
+    """
+    Contrôle d'intégrité référentielle d'un export, sans jointure
+    Chaque table est lue une seule fois, dans l'ordre des dépendances (cassettes, câbles,
+    sites, locaux, fibres, positions), avec les lectures du moteur SQL (open_table_member :
+    mêmes colonnes, mêmes espaces retirés) et ses filtres de lignes (nœud PE des câbles,
+    relations nœud -> site, locaux SRO) : une référence cassée ici est une position ou
+    un câble écarté par l'analyse. Les clés en double sont relevées sur toutes les lignes
+    lues (tap_rows).
+    Avec max_errors, le contrôle s'arrête dès que le nombre d'erreurs le dépasse, sans lire
+    les tables suivantes (t_position.csv, la plus volumineuse, est lue en dernier).
+    Retourne un IntegrityReport
+    """
+    report = IntegrityReport(max_errors, sample_size)
+    table = None
+    try:
+        # Cassettes (dont les cassettes FTTE de load_cassettes)
+        table = 't_cassette.csv'
+        cassettes = set()
+        with open_table_member(zip_file, 'cassettes') as reader:
+            rows = tap_rows(reader, report, table, cassettes, 0, 'duplicate_cassette')
+            ftte_count = sum(1 for _ in sql_cassette_rows(rows))
+        echo(zip_file, f"   → {table}: {len(cassettes):,} cassettes, dont {ftte_count:,} FTTE")
+        
+        # Câbles : nœud PE identifié comme dans load_cables
+        table = 't_cable.csv'
+        cables = set()
+        pe_cables = defaultdict(list)
+        with open_table_member(zip_file, 'cables') as reader:
+            rows = tap_rows(reader, report, table, cables, 0, 'duplicate_cable')
+            for cb_code, _, _, pe_node in sql_cable_rows(rows):
+                if pe_node is not None:
+                    pe_cables[pe_node].append(cb_code)
+        echo(zip_file, f"   → {table}: {len(cables):,} câbles, {len(pe_cables):,} nœuds PE")
+        
+        # Sites : relations nœud -> site de load_sites
+        table = 't_site.csv'
+        site_codes = set()
+        noeud_to_site = {}
+        with open_table_member(zip_file, 'sites') as reader:
+            for nd_code, st_code in sql_site_rows(tap_rows(reader, report, table, site_codes, 1)):
+                report.checked['duplicate_site_node'] += 1
+                if nd_code in noeud_to_site:
+                    report.error('duplicate_site_node', f"{nd_code} ({noeud_to_site[nd_code]}, {st_code})")
+                noeud_to_site[nd_code] = st_code
+        site_codes.discard('')
+        for pe_node, cable_codes in pe_cables.items():
+            report.checked['cable_pe_site'] += len(cable_codes)
+            if pe_node not in noeud_to_site:
+                for cb_code in cable_codes:
+                    report.error('cable_pe_site', f"câble {cb_code} -> {pe_node}")
+        echo(zip_file, f"   → {table}: {len(site_codes):,} sites, {len(noeud_to_site):,} nœuds")
+        
+        # Locaux : locaux SRO de load_locals (site -> local)
+        table = 't_local.csv'
+        locals_seen = set()
+        sro_sites = {}
+        with open_table_member(zip_file, 'locals') as reader:
+            rows = tap_rows(reader, report, table, locals_seen, 2, 'duplicate_local',
+                            reference=(1, site_codes, 'local_site', 'local'))
+            for st_code, lc_code, _ in sql_local_rows(rows):
+                report.checked['duplicate_site_sro'] += 1
+                if st_code in sro_sites:
+                    report.error('duplicate_site_sro', f"{st_code} ({sro_sites[st_code]}, {lc_code})")
+                sro_sites[st_code] = lc_code
+        for pe_node in pe_cables:
+            site_code = noeud_to_site.get(pe_node)
+            if site_code is None:
+                continue
+            report.checked['site_sro_local'] += 1
+            if site_code not in sro_sites:
+                report.error('site_sro_local', f"site {site_code} (nœud {pe_node})")
+        echo(zip_file, f"   → {table}: {len(locals_seen):,} locaux, {len(sro_sites):,} sites avec local SRO")
+        del noeud_to_site, site_codes, sro_sites, locals_seen, pe_cables
+        
+        # Fibres : clés de l'index fibre -> câble de load_fibres
+        table = 't_fibre.csv'
+        fibres = set()
+        with open_table_member(zip_file, 'fibres') as reader:
+            rows = tap_rows(reader, report, table, fibres, 0, 'duplicate_fibre')
+            for fibre_code, cable_code in sql_fibre_rows(rows):
+                report.checked['fibre_cable'] += 1
+                if cable_code not in cables:
+                    report.error('fibre_cable', f"fibre {fibre_code} -> {cable_code}")
+        echo(zip_file, f"   → {table}: {len(fibres):,} fibres")
+        del cables
+        
+        # Positions : cassette et fibres de chaque position (colonnes de la jointure)
+        table = 't_position.csv'
+        error = report.error
+        row_count = with_cassette = references = 0
+        with open_csv_member(zip_file, table, POSITION_COLUMNS) as reader:
+            for cassette_code, fibre1, fibre2 in reader:
+                row_count += 1
+                if cassette_code:
+                    with_cassette += 1
+                    if cassette_code not in cassettes:
+                        error('position_cassette', f"cassette {cassette_code} ({fibre1}, {fibre2})")
+                if fibre1:
+                    references += 1
+                    if fibre1 not in fibres:
+                        error('position_fibre', f"fibre {fibre1} (cassette {cassette_code})")
+                if fibre2:
+                    references += 1
+                    if fibre2 not in fibres:
+                        error('position_fibre', f"fibre {fibre2} (cassette {cassette_code})")
+        report.rows[table] = row_count
+        report.checked['position_cassette'] = with_cassette
+        report.checked['position_fibre'] = references
+        echo(zip_file, f"   → {table}: {row_count:,} positions")
+    except IntegrityLimitReached:
+        report.stopped = table
+    return report
+
+
+def parallel_supported():
+    """Le mode parallèle repose sur fork (index hérités sans copie ni sérialisation)"""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def pipeline_supported():
+    """Le pipeline n'apporte rien sur un seul cœur (les threads ne feraient que s'alterner)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return cpus > 1
+
+
+# Index partagés avec les processus de traitement, hérités par fork (lecture seule)
+_worker_state = None
+
+
+def _join_position_block(block):
+    """Traite un bloc de lignes de t_position.csv dans un processus de traitement"""
+    header, delimiter, prefilter, fibre_to_cable, noeud_to_site, csv_blocks = _worker_state
+    skipped = prefilter.skipped
+    lines = prefilter.lines([block])
+    rows = project_rows(csv.reader(lines, delimiter=delimiter), header, POSITION_COLUMNS)
+    if csv_blocks:
+        output = io.StringIO(newline='')
+        writer = csv.writer(output, delimiter=';')
+    else:
+        # Sortie par colonnes : les lignes sont renvoyées telles quelles
+        output = writer = RowBuffer()
+    diagnostics = None
+    if noeud_to_site is None:
+        stats = join_positions(rows, prefilter.cassettes_ftte, fibre_to_cable, writer)
+    else:
+        diagnostics = RejectionDiagnostics(noeud_to_site)
+        stats = join_positions_diagnostics(rows, prefilter.cassettes_ftte, fibre_to_cable,
+                                           writer, diagnostics)
+    stats['positions'] += prefilter.skipped - skipped
+    return output.getvalue() if csv_blocks else output, stats, diagnostics
+
+
+def process_positions_parallel(zip_file, cassettes_ftte, fibre_to_cable, output, workers,
+                               diagnostics=None, progress=None):
+    """
+    Traite t_position.csv sur plusieurs cœurs
+    Le processus principal décompresse le fichier et le découpe en blocs de lignes
+    (whole_record_blocks : jamais au milieu d'un champ entre guillemets) ;
+    chaque processus (fork) joint son bloc avec les index hérités et renvoie sa sortie
+    partielle. Les sorties sont écrites dans l'ordre des blocs (résultat identique au
+    mode séquentiel) et les compteurs sont additionnés.
+    La décompression (un flux deflate ne se découpe pas) et l'envoi des blocs aux
+    processus restent dans le processus principal : au-delà de quelques processus,
+    le gain est borné par ce débit sur un seul cœur.
+    output : sortie des résultats (voir open_output)
+    diagnostics : RejectionDiagnostics complété par les diagnostics de chaque bloc
+    progress : ProgressReporter alimenté à chaque bloc traité
+    Retourne les compteurs
+    """
+    global _worker_state
+    
+    with open_member(zip_file, 't_position.csv') as raw:
+        member_format, header, blocks = read_member_blocks(raw, 't_position.csv', POSITION_BLOCK_SIZE,
+                                                           export_option(zip_file, 'strict_encoding'))
+        # Un champ sur plusieurs lignes n'est jamais partagé entre deux processus
+        blocks = whole_record_blocks(blocks)
+        
+        stats = dict.fromkeys(('positions', 'results', 'no_pe', 'no_site', 'no_local'), 0)
+        
+        def merge(job):
+            block_size, result = job
+            block, block_stats, block_diagnostics = result.get()
+            output.write_block(block)
+            for key, value in block_stats.items():
+                stats[key] += value
+            if block_diagnostics is not None:
+                diagnostics.merge(block_diagnostics)
+            if progress is not None:
+                progress.update(block_size, block_stats['positions'])
+        
+        prefilter = PositionPrefilter(cassettes_ftte, header, member_format)
+        noeud_to_site = diagnostics.noeud_to_site if diagnostics is not None else None
+        _worker_state = (header, member_format.delimiter, prefilter, fibre_to_cable, noeud_to_site,
+                         output.csv_blocks)
+        try:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                # Fenêtre bornée de blocs en cours : la mémoire ne dépend pas de la taille du fichier
+                pending = deque()
+                for block in blocks:
+                    pending.append((len(block), pool.apply_async(_join_position_block, (block,))))
+                    if len(pending) >= 2 * workers:
+                        merge(pending.popleft())
+                while pending:
+                    merge(pending.popleft())
+        finally:
+            _worker_state = None
+        record_member_read('t_position.csv', stats['positions'], member_position(raw), member_format,
+                           export_option(zip_file, 'verbose'))
+    
+    return stats
+
+
+def estimate_fibre_index_mb(zip_file, compact=False):
+    """Taille estimée (MB) de l'index de toutes les fibres, d'après le nombre de lignes de t_fibre.csv"""
+    entry_bytes = COMPACT_FIBRE_ENTRY_BYTES if compact else FIBRE_ENTRY_BYTES
+    return estimate_rows(zip_file, 't_fibre.csv') * entry_bytes / 1024 / 1024
+
+
+def partition_count(index_mb, memory_limit_mb):
+    """
+    Nombre de partitions de la jointure partitionnée pour que l'index des fibres d'une
+    partition tienne dans la part du budget mémoire qui lui est réservée (avec une marge
+    pour les partitions plus chargées) ; None si l'index complet tient dans le budget
+    """
+    budget_mb = memory_limit_mb * MEMORY_INDEX_SHARE
+    if index_mb <= budget_mb:
+        return None
+    return max(2, math.ceil(2 * index_mb / budget_mb))
+
+
+class SpillPartitions:
+    """
+    Fichiers temporaires d'une jointure partitionnée, un par partition
+    Les lignes sont accumulées par partition et écrites par lots (pickle) : la mémoire
+    utilisée est bornée par le nombre de partitions × SPILL_BATCH_ROWS lignes
+    """
+
+    def __init__(self, directory, name, count):
+        self.paths = [os.path.join(directory, f"{name}_{partition}.spill") for partition in range(count)]
+        self.files = [open(path, 'wb') for path in self.paths]
+        self.buffers = [[] for _ in range(count)]
+    
+    def add(self, partition, row):
+        buffer = self.buffers[partition]
+        buffer.append(row)
+        if len(buffer) >= SPILL_BATCH_ROWS:
+            pickle.dump(buffer, self.files[partition], protocol=pickle.HIGHEST_PROTOCOL)
+            buffer.clear()
+    
+    def close(self):
+        """Écrit les lots incomplets et ferme les fichiers (à appeler avant read)"""
+        for buffer, f in zip(self.buffers, self.files):
+            if buffer:
+                pickle.dump(buffer, f, protocol=pickle.HIGHEST_PROTOCOL)
+                buffer.clear()
+            f.close()
+    
+    def read(self, partition):
+        """Lignes d'une partition, dans l'ordre d'écriture"""
+        with open(self.paths[partition], 'rb') as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                yield from batch
+
+
+class PartitionResults(list):
+    """Lignes de résultat d'une partition, étiquetées par le numéro de la position en cours"""
+    position = None
+
+    def writerow(self, row):
+        self.append((self.position, row))
+
+
+def join_positions_partitioned(zip_file, cassettes_ftte, cables, writer, partitions,
+                               spill_dir=None, progress=None):
+    """
+    Jointure partitionnée (Grace) des positions FTTE avec l'index des fibres, pour les
+    exports dont l'index ne tient pas en mémoire (--memory-limit)
+    1. Les fibres dont le câble existe et les positions FTTE (numérotées) sont réparties
+       par empreinte du code fibre dans des fichiers temporaires (positions : selon ps_1)
+    2. Passe 1, partition par partition : l'index des fibres de la partition donne le
+       câble de ps_1, et les positions sont réparties à nouveau selon ps_2
+    3. Passe 2 : l'index de la partition donne le câble de ps_2, join_positions calcule
+       connexions et rejets, triés par numéro de position
+    4. Les résultats des partitions sont fusionnés dans l'ordre de t_position.csv
+    Seuls les index d'une partition sont en mémoire à un instant donné ; le résultat
+    est identique à join_positions
+    Retourne les compteurs : positions, results, no_pe, no_site, no_local
+    """
+    stats = dict.fromkeys(('positions', 'results', 'no_pe', 'no_site', 'no_local'), 0)
+    
+    with tempfile.TemporaryDirectory(prefix='ftte_spill_', dir=spill_dir) as directory:
+        # 1. Répartition des fibres et des positions FTTE
+        fibres = SpillPartitions(directory, 'fibres', partitions)
+        with open_csv_member(zip_file, 't_fibre.csv', ('fo_code', 'fo_cb_code')) as reader:
+            for fibre_code, cable_code in reader:
+                if cable_code in cables:
+                    fibres.add(hash(fibre_code) % partitions, (fibre_code, cable_code))
+        fibres.close()
+        
+        positions = SpillPartitions(directory, 'positions', partitions)
+        with open_position_member(zip_file, cassettes_ftte, progress) as (rows, prefilter):
+            row_count = 0
+            for cassette_code, fibre1, fibre2 in rows:
+                row_count += 1
+                if cassette_code in cassettes_ftte:
+                    positions.add(hash(fibre1) % partitions, (row_count, cassette_code, fibre1, fibre2))
+        positions.close()
+        stats['positions'] = row_count + prefilter.skipped
+        
+        # 2. Passe 1 : câble de ps_1
+        resolved = SpillPartitions(directory, 'resolues', partitions)
+        for partition in range(partitions):
+            fibre_to_code = dict(fibres.read(partition))
+            for number, cassette_code, fibre1, fibre2 in positions.read(partition):
+                cable_code = fibre_to_code.get(fibre1)
+                if cable_code is not None:
+                    resolved.add(hash(fibre2) % partitions,
+                                 (number, cassette_code, fibre1, fibre2, cable_code))
+            os.remove(positions.paths[partition])
+        resolved.close()
+        fibre_to_code = None
+        
+        # 3. Passe 2 : câble de ps_2, jointure et tri de chaque partition
+        results = SpillPartitions(directory, 'resultats', partitions)
+        for partition in range(partitions):
+            rows = sorted(resolved.read(partition))
+            fibre_to_cable = {fibre_code: cables[cable_code]
+                              for fibre_code, cable_code in fibres.read(partition)}
+            for _, _, fibre1, _, cable_code in rows:
+                # La fibre ps_1 a le même câble quelle que soit sa partition
+                fibre_to_cable[fibre1] = cables[cable_code]
+            partition_results = PartitionResults()
             
-            # Résumé final
-            elapsed_time = time.time() - start_time
-            print(f"\n✅ Analyse terminée en {elapsed_time:.2f} secondes")
-            print(f"\n📊 Résultats:")
-            print(f"   - Positions traitées: {positions_processed:,}")
-            print(f"   - Connexions FTTE trouvées: {results_count:,}")
-            print(f"   - Rejets - Pas de nœud PE: {no_pe_count:,}")
-            print(f"   - Rejets - Site non trouvé: {no_site_count:,}")
-            print(f"   - Rejets - Local non trouvé: {no_local_count:,}")
-            print(f"   - Fichier de sortie: {output_file}")
-            if os.path.exists(output_file):
-                print(f"   - Taille du fichier: {os.path.getsize(output_file) / 1024 / 1024:.2f} MB")
+            def numbered_rows():
+                for number, cassette_code, fibre1, fibre2, _ in rows:
+                    partition_results.position = number
+                    yield cassette_code, fibre1, fibre2
             
+            partition_stats = join_positions(numbered_rows(), cassettes_ftte, fibre_to_cable, partition_results)
+            for key in ('results', 'no_pe', 'no_site', 'no_local'):
+                stats[key] += partition_stats[key]
+            for row in partition_results:
+                results.add(partition, row)
+            os.remove(resolved.paths[partition])
+        results.close()
+        rows = fibre_to_cable = partition_results = None
+        
+        # 4. Fusion dans l'ordre des positions
+        writerow = writer.writerow
+        for _, row in heapq.merge(*(results.read(partition) for partition in range(partitions)),
+                                  key=itemgetter(0)):
+            writerow(row)
+    
+    return stats
+
+
+# Moteur SQL : schéma de la base SQLite temporaire (une table par fichier, colonnes utiles)
+SQL_SCHEMA = """
+    CREATE TABLE cassette (cs_code TEXT PRIMARY KEY) WITHOUT ROWID;
+    CREATE TABLE cable (cb_code TEXT PRIMARY KEY, cb_typelog TEXT, cb_etiquet TEXT, pe_node TEXT) WITHOUT ROWID;
+    CREATE TABLE fibre (fo_code TEXT PRIMARY KEY, fo_cb_code TEXT) WITHOUT ROWID;
+    CREATE TABLE fibre_brute (fo_code TEXT, fo_cb_code TEXT);
+    CREATE TABLE site (st_nd_code TEXT PRIMARY KEY, st_code TEXT) WITHOUT ROWID;
+    CREATE TABLE local (lc_st_code TEXT PRIMARY KEY, lc_code TEXT, lc_etiquet TEXT) WITHOUT ROWID;
+    CREATE TABLE position (id INTEGER PRIMARY KEY, ps_cs_code TEXT, ps_1 TEXT, ps_2 TEXT);
+"""
+
+# Insertions : les doublons remplacent la ligne précédente (la dernière l'emporte, comme
+# les dictionnaires du moteur par défaut). Les fibres sont d'abord ajoutées telles quelles
+# puis indexées en une requête : une fibre n'est retenue que si son câble existe
+SQL_INSERTS = {
+    'cassettes': "INSERT OR IGNORE INTO cassette VALUES (?)",
+    'cables': "INSERT OR REPLACE INTO cable VALUES (?, ?, ?, ?)",
+    'fibres': "INSERT INTO fibre_brute VALUES (?, ?)",
+    'sites': "INSERT OR REPLACE INTO site VALUES (?, ?)",
+    'locals': "INSERT OR REPLACE INTO local VALUES (?, ?, ?)",
+    'positions': "INSERT INTO position (ps_cs_code, ps_1, ps_2) VALUES (?, ?, ?)",
+}
+
+SQL_INDEX_FIBRES = """
+    INSERT OR REPLACE INTO fibre
+    SELECT b.fo_code, c.cb_code FROM fibre_brute b JOIN cable c ON c.cb_code = b.fo_cb_code
+    ORDER BY b.rowid
+"""
+
+# Jointure cassette -> position -> fibres -> câbles TR/DI -> nœud PE -> site -> local SRO,
+# dans l'ordre de t_position.csv ; site et local absents (LEFT JOIN) donnent les rejets
+SQL_JOIN_QUERY = """
+    WITH paires AS (
+        SELECT p.id, p.ps_cs_code AS cassette,
+               CASE WHEN c1.cb_typelog = 'TR' THEN p.ps_1 ELSE p.ps_2 END AS fibre_tr,
+               CASE WHEN c1.cb_typelog = 'TR' THEN c1.cb_etiquet ELSE c2.cb_etiquet END AS cable_tr,
+               CASE WHEN c1.cb_typelog = 'TR' THEN p.ps_2 ELSE p.ps_1 END AS fibre_di,
+               CASE WHEN c1.cb_typelog = 'TR' THEN c2.cb_etiquet ELSE c1.cb_etiquet END AS cable_di,
+               CASE WHEN c1.cb_typelog = 'TR' THEN c2.pe_node ELSE c1.pe_node END AS pe_node
+        FROM position p
+        JOIN cassette k ON k.cs_code = p.ps_cs_code
+        JOIN fibre f1 ON f1.fo_code = p.ps_1
+        JOIN fibre f2 ON f2.fo_code = p.ps_2
+        JOIN cable c1 ON c1.cb_code = f1.fo_cb_code
+        JOIN cable c2 ON c2.cb_code = f2.fo_cb_code
+        WHERE (c1.cb_typelog = 'TR' AND c2.cb_typelog = 'DI')
+           OR (c1.cb_typelog = 'DI' AND c2.cb_typelog = 'TR')
+    )
+    SELECT cassette, fibre_tr, cable_tr, fibre_di, cable_di, pe_node,
+           s.st_code, l.lc_code, l.lc_etiquet, l.lc_st_code
+    FROM paires
+    LEFT JOIN site s ON s.st_nd_code = paires.pe_node
+    LEFT JOIN local l ON l.lc_st_code = s.st_code
+    ORDER BY paires.id
+"""
+
+
+def sql_cassette_rows(reader):
+    """Cassettes FTTE (type 'E' sans code BP), même règle que load_cassettes"""
+    for cs_code, cs_type, cs_bp_code in reader:
+        if cs_type == 'E' and not (cs_bp_code or '').strip() and cs_code is not None:
+            yield (cs_code,)
+
+
+def sql_cable_rows(reader):
+    """Câbles avec leur nœud PE (cb_nd1 puis cb_nd2), même règle que load_cables"""
+    for cb_code, cb_typelog, cb_etiquet, cb_nd1, cb_nd2 in reader:
+        yield cb_code, cb_typelog, cb_etiquet if cb_etiquet is not None else cb_code, cable_pe_node(cb_nd1, cb_nd2)
+
+
+def sql_fibre_rows(reader, referenced_fibres=None):
+    """Fibres (plan semijoin : seulement les fibres référencées par les positions FTTE)"""
+    for fibre_code, cable_code in reader:
+        if fibre_code is not None and (referenced_fibres is None or fibre_code in referenced_fibres):
+            yield fibre_code, cable_code
+
+
+def sql_site_rows(reader):
+    """Relations nœud -> site renseignées"""
+    for nd_code, st_code in reader:
+        if nd_code and st_code:
+            yield nd_code, st_code
+
+
+def sql_local_rows(reader):
+    """Locaux SRO rattachés à un site"""
+    for lc_typelog, st_code, lc_code, lc_etiquet in reader:
+        if lc_typelog == 'SRO' and st_code:
+            yield st_code, lc_code, lc_etiquet
+
+
+# Tables du moteur SQL : fichier, colonnes lues, valeurs par défaut, strip, lignes insérées
+SQL_TABLES = {
+    'cassettes': ('t_cassette.csv', ('cs_code', 'cs_type', 'cs_bp_code'),
+                  {'cs_code': '', 'cs_bp_code': ''}, False, sql_cassette_rows),
+    'cables': ('t_cable.csv', ('cb_code', 'cb_typelog', 'cb_etiquet', 'cb_nd1', 'cb_nd2'),
+               {'cb_nd1': '', 'cb_nd2': ''}, True, sql_cable_rows),
+    'fibres': ('t_fibre.csv', ('fo_code', 'fo_cb_code'), None, False, sql_fibre_rows),
+    'sites': ('t_site.csv', ('st_nd_code', 'st_code'), None, True, sql_site_rows),
+    'locals': ('t_local.csv', ('lc_typelog', 'lc_st_code', 'lc_code', 'lc_etiquet'), None, True, sql_local_rows),
+}
+
+
+
+def open_table_member(zip_file, name):
+    """
+    Ouvre le fichier d'une table de SQL_TABLES avec ses colonnes, valeurs par défaut et
+    espaces retirés (lectures du moteur SQL et du contrôle d'intégrité)
+    """
+    file_name, columns, defaults, strip, _ = SQL_TABLES[name]
+    return open_csv_member(zip_file, file_name, columns, strip, defaults)
+
+
+SQL_TABLE_NAMES = {
+    'cassettes': 'cassette',
+    'cables': 'cable',
+    'fibres': 'fibre',
+    'sites': 'site',
+    'locals': 'local',
+}
+
+
+class SqlDatabase:
+    """
+    Moteur SQL : les fichiers du ZIP sont chargés en streaming (colonnes utiles
+    seulement) dans une base SQLite temporaire et la jointure est une requête SQL
+    indexée. Le cache de pages est borné à cache_mb : au-delà, SQLite travaille sur
+    le fichier de la base (sql_dir, répertoire temporaire par défaut), la mémoire ne
+    dépend donc pas de la taille de l'export. La base est supprimée à la fermeture.
+    """
+
+    def __init__(self, sql_dir=None, cache_mb=SQL_CACHE_MB):
+        fd, self.path = tempfile.mkstemp(prefix='ftte_sql_', suffix='.sqlite', dir=sql_dir)
+        os.close(fd)
+        self.positions_skipped = None
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(f"""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            PRAGMA locking_mode = EXCLUSIVE;
+            PRAGMA temp_store = FILE;
+            PRAGMA cache_size = -{cache_mb * 1024};
+            {SQL_SCHEMA}
+        """)
+    
+    def count(self, table):
+        """Nombre de lignes d'une table"""
+        return self.connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    
+    def load_positions(self, zip_file, cassettes_ftte, progress=None):
+        """Charge les positions des cassettes FTTE (préfiltre sur les octets bruts)"""
+        with open_position_member(zip_file, cassettes_ftte, progress) as (rows, prefilter):
+            self.connection.executemany(SQL_INSERTS['positions'], rows)
+        self.connection.commit()
+        self.positions_skipped = prefilter.skipped
+    
+    def load_table(self, zip_file, name, stages, *args):
+        """Charge une table (voir SQL_TABLES) et retourne le nombre de lignes retenues"""
+        rows = SQL_TABLES[name][-1]
+        echo(zip_file, f"\n{TABLE_TITLES[name]}")
+        with measure_stage(name) as metrics:
+            with open_table_member(zip_file, name) as reader:
+                self.connection.executemany(SQL_INSERTS[name], rows(reader, *args))
+            if name == 'fibres':
+                self.connection.execute(SQL_INDEX_FIBRES)
+                self.connection.execute("DELETE FROM fibre_brute")
+            self.connection.commit()
+            metrics['rows_kept'] = self.count(SQL_TABLE_NAMES[name])
+        if stages is not None:
+            stages.append(metrics)
+        echo(zip_file, f"   → {metrics['rows_read']:,} lignes lues, {metrics['rows_kept']:,} retenues "
+              f"({metrics['wall_s']:.2f} s)")
+        return metrics['rows_kept']
+    
+    def load_tables(self, zip_file, fibre_plan='auto', stages=None):
+        """
+        Charge cassettes, câbles, fibres, sites et locaux (les câbles avant les fibres,
+        qui ne sont retenues que si leur câble existe). Avec le plan semijoin, les
+        positions FTTE sont chargées d'abord et seules leurs fibres sont ajoutées.
+        stages : liste complétée par les mesures de chaque table (voir measure_stage)
+        Retourne l'ensemble des cassettes FTTE, ou None si aucune n'est trouvée
+        """
+        load_start = time.time()
+        fibre_plan = choose_fibre_plan(zip_file, fibre_plan)
+        if not self.load_table(zip_file, 'cassettes', stages):
+            return None
+        cassettes_ftte = {code for code, in self.connection.execute("SELECT cs_code FROM cassette")}
+        self.load_table(zip_file, 'cables', stages)
+        
+        referenced_fibres = None
+        if fibre_plan == 'semijoin':
+            echo(zip_file, f"\n{TABLE_TITLES['ftte_fibres']}")
+            with measure_stage('ftte_fibres') as metrics:
+                self.load_positions(zip_file, cassettes_ftte)
+                referenced_fibres = {code for code, in self.connection.execute(
+                    "SELECT ps_1 FROM position UNION SELECT ps_2 FROM position")}
+                metrics['rows_kept'] = len(referenced_fibres)
+            if stages is not None:
+                stages.append(metrics)
+            echo(zip_file, f"   → {len(referenced_fibres):,} fibres référencées par les cassettes FTTE")
+        self.load_table(zip_file, 'fibres', stages, referenced_fibres)
+        referenced_fibres = None
+        
+        self.load_table(zip_file, 'sites', stages)
+        self.load_table(zip_file, 'locals', stages)
+        echo(zip_file, f"\n⏱️  Chargement des tables (SQL): {time.time() - load_start:.2f} s")
+        return cassettes_ftte
+    
+    def join_positions(self, zip_file, cassettes_ftte, writer, progress=None):
+        """
+        Exécute la jointure (après le chargement des positions FTTE, si le plan
+        semijoin ne l'a pas déjà fait) et écrit les résultats dans l'ordre de t_position.csv
+        Retourne les compteurs : positions, results, no_pe, no_site, no_local
+        """
+        if self.positions_skipped is None:
+            self.load_positions(zip_file, cassettes_ftte, progress)
+        
+        results_count = 0
+        no_pe_count = 0
+        no_site_count = 0
+        no_local_count = 0
+        writerow = writer.writerow
+        for row in self.connection.execute(SQL_JOIN_QUERY):
+            if row[5] is None:
+                no_pe_count += 1
+            elif row[6] is None:
+                no_site_count += 1
+            elif row[9] is None:
+                no_local_count += 1
+            else:
+                writerow(row[:9])
+                results_count += 1
+        
+        return {
+            'positions': self.count('position') + self.positions_skipped,
+            'results': results_count,
+            'no_pe': no_pe_count,
+            'no_site': no_site_count,
+            'no_local': no_local_count
+        }
+    
+    def close(self):
+        self.connection.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class AnalysisStats:
+    """Compteurs d'une analyse (voir FtteAnalysis), complétés à la fin de la jointure"""
+    __slots__ = ('positions', 'results', 'no_pe', 'no_site', 'no_local', 'traced')
+
+    def __init__(self, counters=None):
+        counters = counters or {}
+        for name in self.__slots__:
+            setattr(self, name, counters.get(name, 0))
+    
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    def __repr__(self):
+        values = ', '.join(f"{name}={getattr(self, name)}" for name in self.__slots__)
+        return f"AnalysisStats({values})"
+
+
+class RowWriter:
+    """Adapte un writer (méthode writerow) à l'interface des sorties de open_output"""
+    csv_blocks = False
+
+    def __init__(self, writer):
+        self.writerow = writer.writerow
+    
+    def write_block(self, rows):
+        """Bloc de lignes renvoyé par un processus de traitement (mode parallèle)"""
+        for row in rows:
+            self.writerow(row)
+
+
+class ConnectionQueue:
+    """
+    Writer d'une jointure exécutée dans un thread (FtteAnalysis.connections) : les
+    lignes sont transmises au consommateur par blocs de block_rows, dans une file
+    bornée à depth blocs (la jointure attend si le consommateur prend du retard)
+    """
+    csv_blocks = False
+
+    def __init__(self, depth=PIPELINE_DEPTH, block_rows=PIPELINE_WRITE_ROWS):
+        self.blocks = queue.Queue(depth)
+        self.block_rows = block_rows
+        self.block = []
+        self.stopped = threading.Event()
+    
+    def writerow(self, row):
+        block = self.block
+        block.append(row)
+        if len(block) >= self.block_rows:
+            self.block = []
+            self.write_block(block)
+    
+    def write_block(self, rows):
+        if not self.put(rows):
+            # Le consommateur a abandonné le parcours : la jointure est interrompue
+            raise ConnectionQueue.Stopped()
+    
+    def put(self, item):
+        """Ajoute un bloc à la file ; False si le parcours a été abandonné"""
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def flush(self):
+        if self.block:
+            self.write_block(self.block)
+            self.block = []
+    
+    class Stopped(Exception):
+        """Parcours des connexions abandonné par le consommateur"""
+
+
+class FtteAnalysis:
+    """
+    Analyse FTTE utilisable depuis Python, sans fichier intermédiaire
+    L'export (chemin ou fichier ouvert en binaire) est ouvert et les index construits
+    dès la création ; la jointure s'exécute ensuite au choix :
+    - en parcourant connections() (ou l'analyse elle-même) : générateur de Connection,
+      dans l'ordre de t_position.csv
+    - avec run(writer) : chaque connexion est écrite par writer.writerow (csv.writer,
+      sortie de open_output...)
+    Les compteurs sont disponibles dans stats à la fin de la jointure.
+    Les options sont celles de process_ftte_analysis ; verbose affiche le déroulement
+    du chargement (silencieux par défaut). Avec trace, les chemins sont suivis au-delà
+    de la cassette FTTE (voir join_positions_traced). Avec member_store (répertoire),
+    les fichiers de l'export sont lus dans le magasin MemberStore (member_store_size_mb au plus).
+    Lève AnalysisError si l'export est incomplet ou sans cassette FTTE, ou si des options
+    sont incompatibles entre elles, EmptyMemberError ou MemberDecodeError pour un fichier
+    vide ou mal encodé
+    
+        with FtteAnalysis('export.zip') as analysis:
+            for connection in analysis:
+                ...
+            print(analysis.stats.results)
+    """
+
+    def __init__(self, source, fibre_plan='auto', workers=1, compact=False, cache_dir=None,
+                 cache_size_mb=DEFAULT_CACHE_SIZE_MB, diagnostics=False, engine='dict', sql_dir=None,
+                 sql_cache_mb=SQL_CACHE_MB, memory_limit_mb=None, spill_dir=None, pipeline=True,
+                 strict_encoding=False, trace=False, max_hops=DEFAULT_MAX_HOPS, member_store=None,
+                 member_store_size_mb=DEFAULT_MEMBER_STORE_MB, verbose=False, stages=None):
+        self.fibre_plan = fibre_plan
+        self.workers = workers
+        self.compact = compact
+        self.cache_dir = cache_dir
+        self.engine = engine
+        self.spill_dir = spill_dir
+        self.pipeline = pipeline and pipeline_supported()
+        self.verbose = verbose
+        self.stages = stages if stages is not None else []
+        self.stats = None
+        self.rejections = None
+        self.database = None
+        self.indexes = None
+        self.partitions = None
+        self.trace = trace
+        self.max_hops = max_hops
+        self.splices = None
+        
+        self.member_store = MemberStore(member_store, member_store_size_mb) if member_store else None
+        self.zip_file = ExportZip(source, strict_encoding, verbose, self.member_store)
+        try:
+            self._load(cache_size_mb, diagnostics, sql_dir, sql_cache_mb, memory_limit_mb)
+        except BaseException:
+            self.close()
+            raise
+    
+    def echo(self, *args):
+        """Affiche un message du déroulement de l'analyse (verbose)"""
+        if self.verbose:
+            print(*args)
+    
+    def _load(self, cache_size_mb, diagnostics, sql_dir, sql_cache_mb, memory_limit_mb):
+        """Vérifie l'export et construit les index du moteur choisi"""
+        zip_file = self.zip_file
+        zip_path = zip_file.filename
+        for file_name in REQUIRED_FILES:
+            if file_name not in zip_file.namelist():
+                raise AnalysisError(f"Erreur: Fichier manquant: {file_name}")
+        
+        self.echo("✅ Tous les fichiers requis sont présents")
+        # Les processus de chargement rouvrent l'export par son chemin
+        check_compatible("Export ouvert depuis un fichier",
+                         (('--workers', zip_path is None and self.workers > 1),))
+        
+        if self.trace:
+            # Les fibres intermédiaires des chemins doivent toutes être indexées
+            check_compatible("Suivi des chemins", (
+                ('--engine sql', self.engine == 'sql'), ('--plan semijoin', self.fibre_plan == 'semijoin'),
+                ('--memory-limit', memory_limit_mb), ('--cache-dir', self.cache_dir),
+                ('--diagnostics', diagnostics)))
+            self.fibre_plan = 'direct'
+        
+        # 1 à 5. Charger les tables de référence et construire les index
+        if self.engine == 'sql':
+            check_compatible("Moteur SQL", (('--cache-dir', self.cache_dir), ('--compact', self.compact),
+                                            ('--diagnostics', diagnostics), ('--workers', self.workers > 1)))
+            self.database = SqlDatabase(sql_dir, sql_cache_mb)
+            self.echo(f"   → Base SQL temporaire: {self.database.path}")
+            self.cassettes_ftte = self.database.load_tables(zip_file, self.fibre_plan, self.stages)
+            if self.cassettes_ftte is None:
+                raise AnalysisError("Aucune cassette FTTE trouvée")
+            return
+        
+        if memory_limit_mb:
+            index_mb = estimate_fibre_index_mb(zip_file, self.compact)
+            self.partitions = partition_count(index_mb, memory_limit_mb)
+        if self.partitions:
+            check_compatible(f"Jointure partitionnée (index des fibres estimé à {index_mb:,.0f} MB, "
+                             f"au-delà du budget de {memory_limit_mb:,} MB)",
+                             (('--cache-dir', self.cache_dir), ('--diagnostics', diagnostics),
+                              ('--workers', self.workers > 1)))
+            self.echo(f"\n💾 Index des fibres estimé à {index_mb:,.0f} MB, au-delà du budget de "
+                  f"{memory_limit_mb:,} MB : jointure partitionnée ({self.partitions} partitions)")
+            self.fibre_plan = 'partition'
+        
+        indexes = None
+        if self.cache_dir:
+            fibre_plan = choose_fibre_plan(zip_file, self.fibre_plan)
+            cache_suffix = index_cache_suffix(fibre_plan, self.compact, self.member_store is not None)
+            with measure_stage('cache') as metrics:
+                cache_key = index_cache_key(zip_file)
+                indexes = load_cached_indexes(self.cache_dir, cache_key, cache_suffix, self.verbose)
+                if indexes is not None and self.member_store is not None:
+                    # Étiquettes relues dans le magasin : fichiers réextraits s'ils ont été purgés
+                    self.member_store.path(zip_file, 't_cable.csv')
+                    self.member_store.path(zip_file, 't_local.csv')
+            if indexes is not None:
+                self.stages.append(metrics)
+                self.echo(f"\n♻️  Index chargés depuis le cache en {metrics['wall_s']:.2f} s")
+        
+        if indexes is None:
+            indexes = load_reference_tables(zip_file, zip_path, self.fibre_plan, self.workers,
+                                            self.compact, self.stages)
+            if indexes is None:
+                raise AnalysisError("Aucune cassette FTTE trouvée")
+            if self.cache_dir:
+                store_cached_indexes(self.cache_dir, cache_key, indexes, cache_size_mb, cache_suffix,
+                                     self.verbose)
+        
+        self.indexes = indexes
+        self.cassettes_ftte = indexes['cassettes_ftte']
+        if diagnostics:
+            self.rejections = RejectionDiagnostics(indexes['noeud_to_site'])
+        
+        if self.trace:
+            self.echo("\n🔗 Index des épissures (toutes les positions)...")
+            with measure_stage('splices') as metrics:
+                self.splices = load_splices(zip_file, indexes['fibre_to_cable'])
+                metrics['rows_kept'] = len(self.splices)
+            self.stages.append(metrics)
+            self.echo(f"   → {len(self.splices):,} fibres épissurées indexées")
+            self.echo(f"   ⏱️  {metrics['wall_s']:.2f} s")
+    
+    @property
+    def parallel_join(self):
+        """Jointure répartie sur plusieurs processus (process_positions_parallel)"""
+        return self.workers > 1 and self.splices is None
+    
+    def run(self, writer, progress=False):
+        """
+        Exécute la jointure et écrit chaque connexion (tuple dans l'ordre de
+        RESULT_FIELDNAMES) avec writer.writerow, dans l'ordre de t_position.csv
+        progress : affiche la progression de la lecture de t_position.csv
+        Retourne les compteurs (AnalysisStats)
+        """
+        zip_file = self.zip_file
+        cassettes_ftte = self.cassettes_ftte
+        if not hasattr(writer, 'write_block'):
+            writer = RowWriter(writer)
+        if progress:
+            progress = ProgressReporter(zip_file.getinfo('t_position.csv').file_size)
+        else:
+            progress = None
+        
+        if self.workers > 1 and not parallel_supported():
+            self.echo("   ⚠️  Mode parallèle indisponible sur ce système (fork), traitement séquentiel")
+            self.workers = 1
+        
+        if self.database is not None:
+            stats = self.database.join_positions(zip_file, cassettes_ftte, writer, progress)
+        elif self.partitions:
+            stats = join_positions_partitioned(zip_file, cassettes_ftte, self.indexes['cables'], writer,
+                                               self.partitions, self.spill_dir, progress)
+        elif self.splices is not None:
+            with open_position_member(zip_file, cassettes_ftte, progress, self.pipeline) as (rows, prefilter):
+                stats = join_positions_traced(rows, cassettes_ftte, self.indexes['fibre_to_cable'],
+                                              self.splices, writer, self.max_hops)
+            stats['positions'] += prefilter.skipped
+        elif self.workers > 1:
+            self.echo(f"   → {self.workers} processus de traitement")
+            stats = process_positions_parallel(zip_file, cassettes_ftte, self.indexes['fibre_to_cable'],
+                                               writer, self.workers, self.rejections, progress)
+        else:
+            fibre_to_cable = self.indexes['fibre_to_cable']
+            with open_position_member(zip_file, cassettes_ftte, progress, self.pipeline) as (rows, prefilter):
+                if self.rejections is None:
+                    stats = join_positions(rows, cassettes_ftte, fibre_to_cable, writer)
+                else:
+                    stats = join_positions_diagnostics(rows, cassettes_ftte, fibre_to_cable,
+                                                       writer, self.rejections)
+            # Positions écartées par le préfiltre, sans analyse CSV
+            stats['positions'] += prefilter.skipped
+        
+        self.stats = AnalysisStats(stats)
+        return self.stats
+    
+    def connections(self):
+        """
+        Générateur des connexions (Connection) dans l'ordre de t_position.csv
+        La jointure s'exécute dans un thread qui transmet les connexions par blocs ; un
+        parcours abandonné interrompt la jointure
+        """
+        connection_queue = ConnectionQueue()
+        
+        def produce():
+            try:
+                self.run(connection_queue)
+                connection_queue.flush()
+                connection_queue.put(None)
+            except ConnectionQueue.Stopped:
+                pass
+            except BaseException as e:
+                connection_queue.put(e)
+        
+        thread = threading.Thread(target=produce, name='ftte-join', daemon=True)
+        thread.start()
+        make = Connection._make
+        try:
+            while True:
+                block = connection_queue.blocks.get()
+                if block is None:
+                    return
+                if isinstance(block, BaseException):
+                    raise block
+                yield from map(make, block)
+        finally:
+            connection_queue.stopped.set()
+            thread.join()
+    
+    __iter__ = connections
+    
+    def classify_positions(self):
+        """
+        Générateur des positions des cassettes FTTE classées par classify_position, dans
+        l'ordre de t_position.csv, rejets compris : tuples (ps_cs_code, ps_1, ps_2,
+        statut, fibre_tr, cable_tr, fibre_di, cable_di). Les compteurs sont disponibles
+        dans stats à la fin du parcours, comme après run().
+        Lève AnalysisError avec le moteur SQL, la jointure partitionnée ou le suivi des
+        chemins (pas d'index des fibres en mémoire à consulter position par position)
+        """
+        check_compatible("Classement des positions", (
+            ('--engine sql', self.database is not None), ('--memory-limit', self.partitions),
+            ('--trace', self.trace)))
+        return self._classified_positions()
+    
+    def _classified_positions(self):
+        cassettes_ftte = self.cassettes_ftte
+        fibre_to_cable = self.indexes['fibre_to_cable']
+        positions_processed = 0
+        status_counts = [0] * (len(REJECT_REASONS) + 1)
+        with open_position_member(self.zip_file, cassettes_ftte, prefetch=self.pipeline) as (rows, prefilter):
+            for cassette_code, fibre1, fibre2 in rows:
+                positions_processed += 1
+                if cassette_code not in cassettes_ftte:
+                    continue
+                classification = classify_position(fibre1, fibre2, fibre_to_cable)
+                status_counts[classification[0]] += 1
+                yield (cassette_code, fibre1, fibre2) + classification
+        
+        self.stats = AnalysisStats({
+            'positions': positions_processed + prefilter.skipped,
+            'results': status_counts[PM_RESOLVED],
+            'no_pe': status_counts[REJECT_NO_PE],
+            'no_site': status_counts[REJECT_NO_SITE],
+            'no_local': status_counts[REJECT_NO_LOCAL]
+        })
+    
+    def close(self):
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+        if self.member_store is not None:
+            self.member_store.close()
+            self.member_store = None
+        self.zip_file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def process_ftte_analysis(zip_path, fibre_plan='auto', workers=1, cache_dir=None,
+                          cache_size_mb=DEFAULT_CACHE_SIZE_MB, output_file=None, compact=False,
+                          profile=False, diagnostics=False, output_format='csv', engine='dict',
+                          sql_dir=None, sql_cache_mb=SQL_CACHE_MB, memory_limit_mb=None, spill_dir=None,
+                          pipeline=True, strict_encoding=False, trace=False, max_hops=DEFAULT_MAX_HOPS,
+                          member_store=None, member_store_size_mb=DEFAULT_MEMBER_STORE_MB, rejections_file=None):
+    """
+    Analyse les fibres FTTE dans un fichier ZIP
+    Version 4 : recherche du nœud PE dans cb_nd1 ou cb_nd2
+    fibre_plan : 'auto', 'direct' ou 'semijoin' (voir FIBRE_PLANS)
+    workers : nombre de processus pour le chargement des tables et le traitement des positions
+    cache_dir : répertoire du cache des index (None : pas de cache)
+    output_file : fichier de résultats (par défaut ftte_results_<date> et l'extension du format)
+    output_format : format du fichier de résultats (voir OUTPUT_FORMATS)
+    compact : index des fibres compact (CompactFibreIndex) pour les très gros exports
+    profile : écrit le rapport JSON des mesures par étape à côté des résultats
+    diagnostics : relève les rejets par cassette et écrit le rapport rejections_file
+    (<résultats>_rejets.txt par défaut)
+    engine : 'dict' (index en mémoire) ou 'sql' (base SQLite temporaire dans sql_dir,
+    cache de pages limité à sql_cache_mb)
+    memory_limit_mb : budget mémoire ; si l'index des fibres estimé le dépasse, jointure
+    partitionnée avec fichiers temporaires dans spill_dir (voir join_positions_partitioned)
+    pipeline : traitement séquentiel en pipeline (décompression de t_position.csv et
+    écriture des résultats dans des threads, files bornées)
+    strict_encoding : une séquence invalide dans l'encodage détecté d'un fichier arrête
+    l'analyse (fichier et ligne indiqués) au lieu d'être relue en latin-1
+    trace : suit les chemins au-delà de la cassette FTTE, au plus max_hops épissures
+    (voir join_positions_traced)
+    member_store : répertoire du magasin des fichiers décompressés et projetés en mémoire,
+    borné à member_store_size_mb (voir MemberStore)
+    Retourne le résumé de l'analyse (compteurs, durées, fichier de sortie), ou None en cas d'échec
+    """
+    print(f"Démarrage de l'analyse du fichier: {zip_path}")
+    start_time = time.time()
+    stages = []
+    
+    missing = missing_output_dependency(output_format)
+    if missing:
+        print(f"❌ Erreur: {missing}")
+        return
+    
+    analysis = None
+    try:
+        # 1 à 5. Vérifier l'export, charger les tables de référence et construire les index
+        analysis = FtteAnalysis(zip_path, fibre_plan=fibre_plan, workers=workers, compact=compact,
+                                cache_dir=cache_dir, cache_size_mb=cache_size_mb, diagnostics=diagnostics,
+                                engine=engine, sql_dir=sql_dir, sql_cache_mb=sql_cache_mb,
+                                memory_limit_mb=memory_limit_mb, spill_dir=spill_dir, pipeline=pipeline,
+                                strict_encoding=strict_encoding, trace=trace, max_hops=max_hops,
+                                member_store=member_store, member_store_size_mb=member_store_size_mb,
+                                verbose=True, stages=stages)
+        rejections = analysis.rejections
+        load_time = time.time() - start_time
+        
+        # 6. Traiter les positions et écrire les résultats
+        print("\n⚙️  Traitement des positions...")
+        if output_file is None:
+            output_file = (f"ftte_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                           f"{OUTPUT_FORMATS[output_format]}")
+        
+        threaded = analysis.pipeline and not analysis.parallel_join
+        with measure_stage('positions') as metrics, \
+                closing(open_output(output_file, output_format, profile, threaded)) as output:
+            stats = analysis.run(output, progress=True).as_dict()
+            metrics['rows_kept'] = stats['results']
+        if output_format == 'bundle':
+            # Le manifeste du bundle indique l'export analysé et les compteurs de rejets
+            update_bundle_manifest(output_file, source=os.path.basename(str(zip_path)),
+                                   stats={name: value for name, value in stats.items() if name != 'results'})
+        
+        if profile:
+            # Les écritures du fichier de résultats forment l'étape output
+            output_wall, output_cpu = output.timings()
+            if not output.overlapped:
+                # Écritures dans le thread de traitement (sinon masquées par le pipeline)
+                metrics['wall_s'] = round(metrics['wall_s'] - output_wall, 4)
+            metrics['cpu_s'] = round(metrics['cpu_s'] - output_cpu, 4)
+            stages.append(metrics)
+            stages.append({
+                'stage': 'output', 'process': 'main', 'format': output_format,
+                'wall_s': round(output_wall, 4), 'cpu_s': round(output_cpu, 4),
+                'members': [], 'rows_read': stats['results'], 'rows_kept': stats['results'],
+                'bytes_decompressed': 0, 'bytes_written': output_size(output_file),
+                'peak_rss_mb': metrics['peak_rss_mb']
+            })
+        
+        positions_processed = stats['positions']
+        results_count = stats['results']
+        no_pe_count = stats['no_pe']
+        no_site_count = stats['no_site']
+        no_local_count = stats['no_local']
+        
+        # Résumé final
+        elapsed_time = time.time() - start_time
+        print(f"\n✅ Analyse terminée en {elapsed_time:.2f} secondes")
+        print("\n📊 Résultats:")
+        print(f"   - Positions traitées: {positions_processed:,}")
+        print(f"   - Connexions FTTE trouvées: {results_count:,}")
+        print(f"   - Rejets - Pas de nœud PE: {no_pe_count:,}")
+        print(f"   - Rejets - Site non trouvé: {no_site_count:,}")
+        print(f"   - Rejets - Local non trouvé: {no_local_count:,}")
+        if analysis.splices is not None:
+            print(f"   - Connexions via des épissures intermédiaires: {stats['traced']:,}")
+        print(f"   - Fichier de sortie: {output_file}")
+        if os.path.exists(output_file):
+            print(f"   - Taille du fichier: {output_size(output_file) / 1024 / 1024:.2f} MB")
+        
+        if rejections is not None:
+            report_file = rejections_file or output_stem(output_file) + '_rejets.txt'
+            rejections.write_report(report_file, positions_processed, len(analysis.cassettes_ftte))
+            print(f"   - Rapport des rejets: {report_file}")
+        
+        if profile:
+            profile_file = write_profile_report(zip_path, output_file, stages, stats, elapsed_time, {
+                'fibre_plan': analysis.fibre_plan, 'workers': analysis.workers, 'compact': compact,
+                'cache_dir': analysis.cache_dir, 'output_format': output_format, 'engine': engine,
+                'memory_limit_mb': memory_limit_mb, 'pipeline': analysis.pipeline,
+                'strict_encoding': strict_encoding, 'trace': trace, 'max_hops': max_hops,
+                'member_store': member_store
+            })
+            print(f"   - Rapport de profilage: {profile_file}")
+        
+        return dict(stats, output_file=output_file, elapsed=elapsed_time,
+                    load_time=load_time, positions_time=elapsed_time - load_time)
+        
+    except (AnalysisError, EmptyMemberError, MemberDecodeError, MissingColumnsError) as e:
+        print(f"❌ {e}")
     except Exception as e:
         print(f"\n❌ Erreur lors du traitement: {str(e)}")
         import traceback
         traceback.print_exc()
+    finally:
+        if analysis is not None:
+            analysis.close()
+
+def process_validation(zip_path, max_errors=None, strict_encoding=False, report_file=None):
+    """
+    Contrôle d'intégrité d'un export (--validate) : affiche les erreurs par contrôle et
+    écrit le rapport JSON report_file (ftte_integrite_<date>.json par défaut)
+    max_errors : arrêt dès que le nombre d'erreurs dépasse ce seuil (export rejeté)
+    Retourne l'IntegrityReport, ou None en cas d'échec de lecture
+    """
+    print(f"Contrôle d'intégrité du fichier: {zip_path}")
+    start_time = time.time()
+    try:
+        with ExportZip(zip_path, strict_encoding) as zip_file:
+            for file_name in REQUIRED_FILES:
+                if file_name not in zip_file.namelist():
+                    raise AnalysisError(f"Erreur: Fichier manquant: {file_name}")
+            report = validate_export(zip_file, max_errors)
+    except (AnalysisError, EmptyMemberError, MemberDecodeError, MissingColumnsError) as e:
+        print(f"❌ {e}")
+        return
+    
+    elapsed_time = time.time() - start_time
+    report.print_summary()
+    if report.failed:
+        print(f"\n❌ Export rejeté : plus de {max_errors:,} erreur(s), contrôle arrêté dans "
+              f"{report.stopped} après {elapsed_time:.2f} secondes")
+    else:
+        print(f"\n✅ Contrôle terminé en {elapsed_time:.2f} secondes : {report.total_errors:,} erreur(s)")
+    
+    if report_file is None:
+        report_file = f"ftte_integrite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(report.as_dict(), zip=os.path.basename(zip_path), max_errors=max_errors,
+                       elapsed_s=round(elapsed_time, 3)), f, ensure_ascii=False, indent=2)
+    print(f"   - Rapport d'intégrité: {report_file}")
+    return report
+
+
+def write_profile_report(zip_path, output_file, stages, stats, elapsed, options):
+    """
+    Écrit le rapport --profile (JSON) à côté du fichier de résultats
+    Retourne le chemin du rapport
+    """
+    profile_file = output_stem(output_file) + '_profile.json'
+    report = {
+        'zip_path': zip_path,
+        'output_file': output_file,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'options': options,
+        'elapsed_s': round(elapsed, 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_children_mb': peak_rss_mb('children'),
+        'counters': stats,
+        'stages': stages
+    }
+    with open(profile_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return profile_file
+
+
+def expand_zip_paths(patterns):
+    """Développe les arguments (fichiers, motifs glob, répertoires) en liste de fichiers ZIP"""
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, '*.zip')))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if os.path.abspath(path) not in seen:
+                seen.add(os.path.abspath(path))
+                paths.append(path)
+    return paths
+
+
+def batch_stems(zip_paths):
+    """
+    Nom de base des fichiers produits pour chaque archive d'un lot : le nom de l'archive,
+    suivi d'une empreinte courte de son répertoire si plusieurs archives du lot portent
+    le même nom (les résultats ne s'écrasent pas)
+    """
+    stems = {zip_path: os.path.splitext(os.path.basename(zip_path))[0] for zip_path in zip_paths}
+    counts = defaultdict(int)
+    for stem in stems.values():
+        counts[stem] += 1
+    for zip_path, stem in stems.items():
+        if counts[stem] > 1:
+            directory = os.path.dirname(os.path.abspath(zip_path))
+            stems[zip_path] = f"{stem}_{hashlib.sha256(directory.encode('utf-8')).hexdigest()[:8]}"
+    return stems
+
+
+def _limit_memory(memory_mb):
+    """Plafonne la mémoire adressable du processus (MemoryError au-delà)"""
+    try:
+        import resource
+    except ImportError:
+        print("⚠️  Plafond mémoire non supporté sur ce système")
+        return
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _run_batch_job(zip_path, output_file, log_file, options, memory_mb, conn):
+    """Analyse une archive dans un processus dédié, journal redirigé vers log_file"""
+    with open(log_file, 'w', encoding='utf-8') as log, redirect_stdout(log), redirect_stderr(log):
+        if memory_mb:
+            _limit_memory(memory_mb)
+        summary = process_ftte_analysis(zip_path, output_file=output_file, **options)
+    conn.send(summary)
+    conn.close()
+
+
+BATCH_SUMMARY_FIELDNAMES = [
+    'Archive', 'Statut', 'Positions traitees', 'Connexions FTTE',
+    'Rejets PE', 'Rejets Site', 'Rejets Local',
+    'Duree chargement (s)', 'Duree positions (s)', 'Duree totale (s)',
+    'Fichier de sortie', 'Journal'
+]
+
+
+def process_batch(zip_paths, output_dir='.', jobs=1, memory_mb=None, **options):
+    """
+    Analyse plusieurs exports ZIP en parallèle (jobs processus)
+    Chaque archive est traitée dans son propre processus : un échec (erreur, plafond
+    mémoire atteint, processus tué) n'interrompt pas le lot. Chaque archive produit
+    ftte_results_<archive>.csv et son journal (nom complété par batch_stems si deux
+    archives portent le même nom) ; un résumé CSV consolidé est écrit dans output_dir.
+    Retourne le nombre d'archives en échec
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stems = batch_stems(zip_paths)
+    print(f"📦 Traitement par lot: {len(zip_paths)} archives, {jobs} en parallèle")
+    batch_start = time.time()
+    
+    # spawn : chaque archive démarre dans un processus neuf (mémoire rendue à la fin)
+    context = multiprocessing.get_context('spawn')
+    summaries = {}
+    pending = list(zip_paths)
+    running = {}
+    
+    while pending or running:
+        while pending and len(running) < jobs:
+            zip_path = pending.pop(0)
+            stem = stems[zip_path]
+            extension = OUTPUT_FORMATS[options.get('output_format', 'csv')]
+            output_file = os.path.join(output_dir, f"ftte_results_{stem}{extension}")
+            log_file = os.path.join(output_dir, f"ftte_results_{stem}.log")
+            
+            if not os.path.exists(zip_path) or not zip_path.endswith('.zip'):
+                summaries[zip_path] = {'status': 'ECHEC', 'log_file': '', 'elapsed': 0.0}
+                print(f"❌ {zip_path} : fichier ZIP introuvable")
+                continue
+            
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_run_batch_job,
+                                      args=(zip_path, output_file, log_file, options, memory_mb, sender))
+            process.start()
+            sender.close()
+            running[process.sentinel] = (process, receiver, zip_path, log_file, time.time())
+        
+        if not running:
+            continue
+        
+        for sentinel in multiprocessing.connection.wait(list(running)):
+            process, receiver, zip_path, log_file, job_start = running.pop(sentinel)
+            summary = receiver.recv() if receiver.poll() else None
+            process.join()
+            receiver.close()
+            
+            name = os.path.basename(zip_path)
+            if summary is None:
+                summaries[zip_path] = {'status': 'ECHEC', 'log_file': log_file,
+                                       'elapsed': time.time() - job_start}
+                print(f"❌ {name} : échec (code {process.exitcode}, voir {log_file})")
+            else:
+                summaries[zip_path] = dict(summary, status='OK', log_file=log_file)
+                print(f"✅ {name} : {summary['results']:,} connexions FTTE en {summary['elapsed']:.2f} s")
+    
+    summary_file = os.path.join(output_dir, f"ftte_batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    with open(summary_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile, delimiter=';')
+        writer.writerow(BATCH_SUMMARY_FIELDNAMES)
+        for zip_path in zip_paths:
+            summary = summaries[zip_path]
+            writer.writerow((
+                zip_path, summary['status'],
+                summary.get('positions', ''), summary.get('results', ''),
+                summary.get('no_pe', ''), summary.get('no_site', ''), summary.get('no_local', ''),
+                f"{summary['load_time']:.2f}" if 'load_time' in summary else '',
+                f"{summary['positions_time']:.2f}" if 'positions_time' in summary else '',
+                f"{summary['elapsed']:.2f}",
+                summary.get('output_file', ''), summary['log_file']
+            ))
+    
+    failures = sum(1 for summary in summaries.values() if summary['status'] != 'OK')
+    print(f"\n✅ Lot terminé en {time.time() - batch_start:.2f} secondes")
+    print(f"   - Archives traitées: {len(zip_paths) - failures:,} / {len(zip_paths):,}")
+    print(f"   - Résumé: {summary_file}")
+    return failures
+
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python ftte_analyzer.py <fichier.zip>")
-        print("\nExemple:")
-        print("  python ftte_analyzer.py 45lor2_SRO-BPI-12387439_REC_TR-DI-RA_V300_20250929-080034_S39.zip")
+    parser = argparse.ArgumentParser(
+        description="Analyseur FTTE - Recherche PM via nœud PE",
+        epilog="Exemple:\n  python ftte_analyzer.py "
+               "45lor2_SRO-BPI-12387439_REC_TR-DI-RA_V300_20250929-080034_S39.zip",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zip_paths', metavar='fichier.zip', nargs='+',
+                        help="Exports ZIP à analyser (fichiers, motifs glob ou répertoires)")
+    parser.add_argument('--plan', choices=FIBRE_PLANS, default='auto',
+                        help="Plan d'indexation des fibres (auto : selon la taille de t_fibre.csv)")
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help="Nombre de processus pour le chargement et le traitement (défaut : 1)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Index des fibres compact (empreintes 64 bits, ~5x moins de mémoire)")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="Répertoire du cache des index (réutilisés si l'export n'a pas changé)")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE_MB, metavar='MB',
+                        help=f"Taille maximale du cache en MB (défaut : {DEFAULT_CACHE_SIZE_MB})")
+    parser.add_argument('--profile', action='store_true',
+                        help="Écrit un rapport JSON des mesures par étape (temps, CPU, lignes, octets, mémoire)")
+    parser.add_argument('--diagnostics', action='store_true',
+                        help="Relève les rejets par cassette FTTE et écrit le rapport <résultats>_rejets.txt")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv', dest='output_format',
+                        help="Format du fichier de résultats : CSV (éventuellement compressé gzip/zstd), "
+                             "Parquet ou flux Arrow IPC (pyarrow), base SQLite (défaut : csv)")
+    parser.add_argument('--engine', choices=ENGINES, default='dict',
+                        help="Moteur d'exécution : index en mémoire (dict, défaut) ou base SQLite "
+                             "temporaire avec jointure SQL, qui déborde sur disque (sql)")
+    parser.add_argument('--sql-dir', metavar='DIR',
+                        help="Moteur SQL : répertoire de la base temporaire (défaut : répertoire temporaire)")
+    parser.add_argument('--sql-cache', type=int, default=SQL_CACHE_MB, metavar='MB',
+                        help=f"Moteur SQL : mémoire du cache de pages SQLite en MB (défaut : {SQL_CACHE_MB})")
+    parser.add_argument('--memory-limit', type=int, metavar='MB',
+                        help="Budget mémoire : si l'index des fibres ne tient pas, jointure partitionnée "
+                             "avec fichiers temporaires (résultats identiques)")
+    parser.add_argument('--spill-dir', metavar='DIR',
+                        help="Répertoire des fichiers temporaires de la jointure partitionnée "
+                             "(défaut : répertoire temporaire)")
+    parser.add_argument('--no-pipeline', action='store_false', dest='pipeline',
+                        help="Traitement séquentiel sans threads de décompression et d'écriture")
+    parser.add_argument('--strict-encoding', action='store_true',
+                        help="Arrête l'analyse sur la première séquence invalide dans l'encodage détecté "
+                             "d'un fichier (fichier et ligne indiqués) au lieu de la relire en latin-1")
+    parser.add_argument('--trace', action='store_true',
+                        help="Suit les chemins au-delà de la cassette FTTE (TR→TR→DI, DI→DI...) "
+                             "jusqu'à une fibre DI avec nœud PE")
+    parser.add_argument('--max-hops', type=int, default=DEFAULT_MAX_HOPS, metavar='N',
+                        help=f"Suivi des chemins : nombre maximal d'épissures suivies (défaut : {DEFAULT_MAX_HOPS})")
+    parser.add_argument('--member-store', metavar='DIR',
+                        help="Magasin des fichiers de l'export décompressés une fois et projetés en mémoire "
+                             "(relances sans décompression, pages partagées entre analyses)")
+    parser.add_argument('--member-store-size', type=int, default=DEFAULT_MEMBER_STORE_MB, metavar='MB',
+                        help=f"Taille maximale du magasin en MB, fichiers les moins récemment utilisés "
+                             f"évincés (défaut : {DEFAULT_MEMBER_STORE_MB})")
+    parser.add_argument('--validate', action='store_true',
+                        help="Contrôle d'intégrité seul : références entre les six tables et clés en double, "
+                             "sans analyse (rapport ftte_integrite_<date>.json)")
+    parser.add_argument('--max-errors', type=int, metavar='N',
+                        help="Contrôle d'intégrité : rejette l'export dès que plus de N erreurs sont relevées, "
+                             "sans lire les tables restantes")
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help="Lot : nombre d'archives traitées en parallèle (défaut : 1)")
+    parser.add_argument('--job-memory', type=int, metavar='MB',
+                        help="Lot : plafond mémoire par archive en MB")
+    parser.add_argument('--output-dir', default='.', metavar='DIR',
+                        help="Lot : répertoire des résultats et du résumé (défaut : répertoire courant)")
+    args = parser.parse_args()
+    
+    if args.workers < 1 or args.jobs < 1:
+        print("❌ Erreur: --workers et --jobs doivent être supérieurs ou égaux à 1")
         sys.exit(1)
     
-    zip_path = sys.argv[1]
+    options = {
+        'fibre_plan': args.plan,
+        'workers': args.workers,
+        'cache_dir': args.cache_dir,
+        'cache_size_mb': args.cache_size,
+        'compact': args.compact,
+        'profile': args.profile,
+        'diagnostics': args.diagnostics,
+        'output_format': args.output_format,
+        'engine': args.engine,
+        'sql_dir': args.sql_dir,
+        'sql_cache_mb': args.sql_cache,
+        'memory_limit_mb': args.memory_limit,
+        'spill_dir': args.spill_dir,
+        'pipeline': args.pipeline,
+        'strict_encoding': args.strict_encoding,
+        'trace': args.trace,
+        'max_hops': args.max_hops,
+        'member_store': args.member_store,
+        'member_store_size_mb': args.member_store_size,
+    }
+    
+    missing = missing_output_dependency(args.output_format)
+    if missing:
+        print(f"❌ Erreur: {missing}")
+        sys.exit(1)
+    
+    zip_paths = expand_zip_paths(args.zip_paths)
+    if not zip_paths:
+        print("❌ Erreur: Aucun fichier ZIP trouvé")
+        sys.exit(1)
+    
+    if args.validate:
+        # Un rapport par export ; code de sortie 1 si un export est rejeté ou illisible
+        failures = 0
+        stems = batch_stems(zip_paths)
+        for zip_path in zip_paths:
+            report_file = None
+            if len(zip_paths) > 1:
+                os.makedirs(args.output_dir, exist_ok=True)
+                report_file = os.path.join(args.output_dir, f"{stems[zip_path]}_integrite.json")
+            report = process_validation(zip_path, args.max_errors, args.strict_encoding, report_file)
+            if report is None or report.failed:
+                failures += 1
+        sys.exit(1 if failures else 0)
+    
+    if len(zip_paths) > 1 or len(args.zip_paths) > 1 or os.path.isdir(args.zip_paths[0]):
+        failures = process_batch(zip_paths, args.output_dir, args.jobs, args.job_memory, **options)
+        sys.exit(1 if failures else 0)
+    
+    zip_path = zip_paths[0]
     
     if not os.path.exists(zip_path):
         print(f"❌ Erreur: Le fichier '{zip_path}' n'existe pas")
@@ -353,7 +4210,8 @@ def main():
         print("❌ Erreur: Le fichier doit être un ZIP")
         sys.exit(1)
     
-    process_ftte_analysis(zip_path)
+    if process_ftte_analysis(zip_path, **options) is None:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
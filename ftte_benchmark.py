@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Banc de mesure de l'analyseur FTTE
+Génère (une seule fois) des exports synthétiques de différentes tailles, lance
+l'analyse de chacun dans un processus neuf avec --profile, puis affiche le temps
+et le débit de chaque étape et le pic mémoire. Le fichier de résultats est
+comparé à un résultat de référence (empreinte SHA-256 et compteurs) : une
+optimisation ne peut pas modifier les résultats sans que le banc échoue.
+Avec --engines dict,sql, chaque export est analysé par les deux moteurs, comparés
+à la même référence. Avec --baseline REV, la référence est produite par l'analyseur
+de la révision git REV (version d'origine : 6a11cad).
+"""
+
+import sys
+import os
+import re
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+import subprocess
+import multiprocessing
+import time
+from contextlib import redirect_stdout, redirect_stderr
+from datetime import datetime
+
+from ftte_analyzer import ENGINES, FIBRE_PLANS, process_ftte_analysis
+from ftte_generator import add_generator_arguments, generate_export, generator_params, parse_count
+
+DEFAULT_SIZES = '1M,10M,50M'
+DEFAULT_GOLDEN_FILE = 'ftte_benchmark_golden.json'
+
+# Compteurs affichés par l'analyseur d'origine (--baseline), dans l'ordre du résumé
+BASELINE_COUNTERS = (
+    ('positions', 'Positions traitées'),
+    ('results', 'Connexions FTTE trouvées'),
+    ('no_pe', 'Rejets - Pas de nœud PE'),
+    ('no_site', 'Rejets - Site non trouvé'),
+    ('no_local', 'Rejets - Local non trouvé'),
+)
+
+
+def export_name(positions, params):
+    """Nom de l'export synthétique : taille et empreinte des paramètres de génération"""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:8]
+    return f"bench_{positions}_{digest}"
+
+
+def file_digest(path):
+    """Empreinte SHA-256 d'un fichier"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _run_analysis(zip_path, output_file, log_file, options, conn):
+    """Analyse un export dans un processus neuf (pic mémoire propre à l'analyse)"""
+    with open(log_file, 'w', encoding='utf-8') as log, redirect_stdout(log), redirect_stderr(log):
+        summary = process_ftte_analysis(zip_path, output_file=output_file, profile=True, **options)
+    conn.send(summary)
+    conn.close()
+
+
+def run_analysis(zip_path, output_file, log_file, options):
+    """Lance l'analyse (processus spawn) et retourne son résumé, ou None en cas d'échec"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_analysis, args=(zip_path, output_file, log_file, options, sender))
+    process.start()
+    sender.close()
+    try:
+        summary = receiver.recv()
+    except EOFError:
+        summary = None
+    process.join()
+    return summary
+
+
+def baseline_script(data_dir, revision):
+    """Extrait ftte_analyzer.py de la révision git revision dans data_dir ; retourne son chemin"""
+    source = subprocess.run(['git', 'show', f'{revision}:ftte_analyzer.py'], capture_output=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    script = os.path.join(data_dir, f"ftte_analyzer_{revision}.py")
+    with open(script, 'wb') as f:
+        f.write(source)
+    return script
+
+
+def run_baseline(data_dir, script, name, zip_path):
+    """
+    Analyse un export avec l'analyseur extrait par baseline_script, avec son interface
+    d'origine : ZIP seul argument, ftte_results_<date>.csv écrit dans le répertoire
+    courant et compteurs lus dans le résumé affiché
+    Retourne le résultat (compteurs et empreinte du CSV), ou None en cas d'échec
+    """
+    work_dir = os.path.join(data_dir, name + '_baseline')
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    log_file = work_dir + '.log'
+    with open(log_file, 'w', encoding='utf-8') as log:
+        subprocess.run([sys.executable, os.path.abspath(script), os.path.abspath(zip_path)], cwd=work_dir,
+                       stdout=log, stderr=subprocess.STDOUT, env=dict(os.environ, PYTHONIOENCODING='utf-8'))
+    with open(log_file, encoding='utf-8') as f:
+        log_text = f.read()
+
+    result = {}
+    for key, label in BASELINE_COUNTERS:
+        match = re.search(rf"- {re.escape(label)}: ([\d,]+)", log_text)
+        if match is None:
+            return None
+        result[key] = int(match.group(1).replace(',', ''))
+    output_files = glob.glob(os.path.join(work_dir, 'ftte_results_*.csv'))
+    if len(output_files) != 1:
+        return None
+    result['sha256'] = file_digest(output_files[0])
+    return result
+
+
+def check_golden(golden, name, result):
+    """
+    Compare un résultat à la référence enregistrée
+    Retourne la liste des écarts (vide si identique ou sans référence)
+    """
+    expected = golden.get(name)
+    if expected is None:
+        return []
+    differences = []
+    for key, value in expected.items():
+        if result.get(key) != value:
+            differences.append(f"{key}: attendu {value}, obtenu {result.get(key)}")
+    return differences
+
+
+def print_stages(profile):
+    """Tableau des étapes : temps réel, CPU, lignes lues, débit, pic mémoire"""
+    print(f"   {'Étape':<12} {'Réel (s)':>9} {'CPU (s)':>9} {'Lignes lues':>13} {'Lignes/s':>12} {'Pic RSS (MB)':>13}")
+    for stage in profile['stages']:
+        wall = stage['wall_s']
+        rows = stage['rows_read'] or 0
+        rate = f"{rows / wall:,.0f}" if wall > 0 and rows else '-'
+        peak = stage['peak_rss_mb'] if stage['peak_rss_mb'] is not None else '-'
+        print(f"   {stage['stage']:<12} {wall:>9.2f} {stage['cpu_s']:>9.2f} {rows:>13,} {rate:>12} {peak:>13}")
+
+
+def run_engine(args, golden, report, name, positions, zip_path, engine, options, update=False):
+    """
+    Analyse un export avec un moteur et compare le résultat à la référence
+    update : le résultat devient la nouvelle référence (premier moteur avec --update-golden)
+    Retourne 1 en cas d'échec, sinon 0
+    """
+    print(f"   [{engine}]")
+    suffix = '' if engine == 'dict' else f'_{engine}'
+    output_file = os.path.join(args.data_dir, name + suffix + '_results.csv')
+    log_file = os.path.join(args.data_dir, name + suffix + '.log')
+    if engine != 'dict':
+        # --workers et --compact ne concernent que le moteur dict
+        options = dict(options, workers=1, compact=False)
+    summary = run_analysis(zip_path, output_file, log_file, dict(options, engine=engine))
+    if summary is None:
+        print(f"   ❌ Échec de l'analyse (voir {log_file})")
+        return 1
+
+    with open(os.path.splitext(output_file)[0] + '_profile.json', encoding='utf-8') as f:
+        profile = json.load(f)
+    print_stages(profile)
+    print(f"   Total: {summary['elapsed']:.2f} s, {positions / summary['elapsed']:,.0f} positions/s, "
+          f"pic RSS {profile['peak_rss_mb']} MB")
+
+    failed = 0
+    result = {key: summary[key] for key in ('positions', 'results', 'no_pe', 'no_site', 'no_local')}
+    result['sha256'] = file_digest(output_file)
+    differences = check_golden(golden, name, result)
+    if update:
+        golden[name] = result
+    elif name not in golden:
+        print("   ⚠️  Pas de résultat de référence (relancer avec --update-golden)")
+    elif differences:
+        failed = 1
+        print("   ❌ Résultat différent de la référence :")
+        for difference in differences:
+            print(f"      - {difference}")
+    else:
+        print("   ✅ Résultat identique à la référence")
+
+    report['runs'].append({'export': name, 'engine': engine, 'positions': positions,
+                           'elapsed_s': summary['elapsed'],
+                           'positions_per_s': positions / summary['elapsed'],
+                           'peak_rss_mb': profile['peak_rss_mb'], 'result': result,
+                           'golden_differences': differences, 'stages': profile['stages']})
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de mesure de l'analyseur FTTE (exports synthétiques)")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"Nombres de positions à mesurer, séparés par des virgules (défaut : {DEFAULT_SIZES})")
+    parser.add_argument('--data-dir', default='bench_data', metavar='DIR',
+                        help="Répertoire des exports générés et des résultats (défaut : bench_data)")
+    parser.add_argument('--golden', default=DEFAULT_GOLDEN_FILE, metavar='FICHIER',
+                        help=f"Résultats de référence (défaut : {DEFAULT_GOLDEN_FILE})")
+    parser.add_argument('--update-golden', action='store_true',
+                        help="Enregistre les résultats obtenus comme nouvelle référence")
+    parser.add_argument('--baseline', metavar='REV',
+                        help="Produit la référence avec l'analyseur de la révision git REV "
+                             "(ex. 6a11cad, version d'origine), puis compare les moteurs à cette référence")
+    parser.add_argument('--plan', choices=FIBRE_PLANS, default='auto',
+                        help="Plan d'indexation des fibres passé à l'analyseur")
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help="Nombre de processus de l'analyseur, moteur dict (défaut : 1)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Index des fibres compact (moteur dict)")
+    parser.add_argument('--engines', default='dict', metavar='MOTEURS',
+                        help=f"Moteurs comparés, séparés par des virgules parmi {', '.join(ENGINES)} (défaut : dict)")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        sizes = [parse_count(size) for size in args.sizes.split(',')]
+    except argparse.ArgumentTypeError as e:
+        print(f"❌ Erreur: {e}")
+        sys.exit(1)
+
+    engines = args.engines.split(',')
+    unknown = [engine for engine in engines if engine not in ENGINES]
+    if unknown:
+        print(f"❌ Erreur: moteur inconnu {', '.join(unknown)}")
+        sys.exit(1)
+
+    params = generator_params(args)
+    options = {'fibre_plan': args.plan, 'workers': args.workers, 'compact': args.compact}
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    baseline = None
+    if args.baseline:
+        try:
+            baseline = baseline_script(args.data_dir, args.baseline)
+        except (OSError, subprocess.CalledProcessError):
+            print(f"❌ Erreur: révision {args.baseline} introuvable (dépôt git requis)")
+            sys.exit(1)
+    golden = {}
+    if os.path.exists(args.golden):
+        with open(args.golden, encoding='utf-8') as f:
+            golden = json.load(f)
+
+    report = {'date': datetime.now().isoformat(timespec='seconds'), 'options': options, 'engines': engines,
+              'generator': params, 'runs': []}
+    failures = 0
+
+    for positions in sizes:
+        name = export_name(positions, params)
+        zip_path = os.path.join(args.data_dir, name + '.zip')
+        print(f"\n📏 {positions:,} positions ({name})")
+
+        if not os.path.exists(zip_path):
+            generate_start = time.time()
+            print("   → Génération de l'export...")
+            generate_export(zip_path + '.tmp', positions=positions, **params)
+            os.replace(zip_path + '.tmp', zip_path)
+            print(f"   → Export généré en {time.time() - generate_start:.2f} s")
+
+        if baseline:
+            print(f"   [{args.baseline}]")
+            result = run_baseline(args.data_dir, baseline, name, zip_path)
+            if result is None:
+                failures += 1
+                print(f"   ❌ Échec de l'analyseur de référence (voir {os.path.join(args.data_dir, name)}_baseline.log)")
+                continue
+            golden[name] = result
+            print(f"   ✅ Référence : {result['results']:,} connexions, SHA-256 {result['sha256'][:12]}...")
+
+        for engine in engines:
+            update = args.update_golden and not baseline and engine == engines[0]
+            failures += run_engine(args, golden, report, name, positions, zip_path, engine, options, update)
+
+    if args.update_golden or baseline:
+        with open(args.golden, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, indent=2, sort_keys=True)
+        print(f"\n💾 Référence mise à jour: {args.golden}")
+
+    report_file = os.path.join(args.data_dir, f"ftte_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📊 Rapport du banc: {report_file}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Analyse différentielle FTTE entre deux exports d'un même SRO
+L'état d'un export (instantané) conserve les tables de référence, les positions des
+cassettes FTTE et le câble des fibres qu'elles référencent. Pour un nouvel export,
+seuls les fichiers dont le CRC a changé sont relus ; les connexions sont recalculées
+pour les positions ajoutées ou retirées et pour celles dont une fibre, un câble ou
+un PM a changé. Produit le résultat complet et le fichier des différences
+(<résultats>_delta.csv : ajouts, suppressions, modifications).
+"""
+
+import os
+import sys
+import csv
+import time
+import pickle
+import zipfile
+import argparse
+from collections import Counter
+from contextlib import closing
+from datetime import datetime
+
+from ftte_analyzer import (
+    DEFAULT_CACHE_SIZE_MB, INDEX_CACHE_VERSION, OUTPUT_FORMATS, PM_RESOLVED, REQUIRED_FILES,
+    RESULT_FIELDNAMES, Cable, EmptyMemberError, MemberDecodeError, MissingColumnsError,
+    classify_position, connection_row, index_cache_key, join_positions, load_cables,
+    load_cached_indexes, load_cassettes, load_locals, load_sites, missing_output_dependency,
+    open_csv_member, open_output, open_position_member, output_stem, resolve_cable_pm,
+    store_cached_indexes
+)
+
+# Statuts du fichier des différences
+DELTA_ADDED = 'AJOUT'
+DELTA_REMOVED = 'SUPPRESSION'
+DELTA_CHANGED = 'MODIFICATION'
+DELTA_FIELDNAMES = ['Statut'] + RESULT_FIELDNAMES + ['Modifications']
+
+
+def member_signatures(zip_file):
+    """CRC et taille de chaque fichier requis, lus dans le répertoire central du ZIP"""
+    signatures = {}
+    for file_name in REQUIRED_FILES:
+        info = zip_file.getinfo(file_name)
+        signatures[file_name] = (info.CRC, info.file_size)
+    return signatures
+
+
+def copy_cable(cable):
+    """Copie d'un câble (le PM est résolu à nouveau sans modifier l'instantané précédent)"""
+    return Cable(cable.cb_code, cable.cb_typelog, cable.cb_etiquet, cable.cb_nd1, cable.cb_nd2,
+                 cable.pe_node)
+
+
+def read_ftte_positions(zip_file, cassettes_ftte):
+    """
+    Lit les positions des cassettes FTTE (préfiltre sur les octets bruts)
+    Retourne (liste des positions (ps_cs_code, ps_1, ps_2) dans l'ordre du fichier,
+    nombre total de positions)
+    """
+    positions = []
+    row_count = 0
+    with open_position_member(zip_file, cassettes_ftte) as (rows, prefilter):
+        for row in rows:
+            row_count += 1
+            if row[0] in cassettes_ftte:
+                positions.append(row)
+    return positions, row_count + prefilter.skipped
+
+
+def read_fibre_cables(zip_file, referenced, cables):
+    """
+    Câble des fibres référencées par les positions FTTE
+    Retourne fibre -> code câble (None si la fibre est absente ou son câble inconnu) ;
+    comme load_fibres, seules les lignes dont le câble existe sont retenues
+    """
+    fibre_cables = dict.fromkeys(referenced)
+    with open_csv_member(zip_file, 't_fibre.csv', ('fo_code', 'fo_cb_code')) as reader:
+        for fibre_code, cable_code in reader:
+            if fibre_code in fibre_cables and cable_code in cables:
+                fibre_cables[fibre_code] = cable_code
+    return fibre_cables
+
+
+def build_snapshot(zip_file, previous=None):
+    """
+    Construit l'instantané d'un export en réutilisant les tables inchangées de previous
+    Les fichiers sont comparés en entier (CRC et taille du répertoire central) : toute
+    modification de t_position.csv ou de t_fibre.csv, même d'une seule ligne, entraîne
+    la relecture complète du fichier ; il n'y a pas de relecture partielle des lignes
+    modifiées. Seul le recalcul des connexions (compute_delta) est limité aux
+    positions concernées.
+    Retourne (instantané, liste des fichiers relus)
+    """
+    signatures = member_signatures(zip_file)
+    reloaded = []
+
+    def unchanged(file_name):
+        return previous is not None and previous['signatures'][file_name] == signatures[file_name]
+
+    def reload(file_name, loader, *args):
+        print(f"   → Lecture de {file_name}")
+        reloaded.append(file_name)
+        return loader(zip_file, *args)
+
+    if unchanged('t_cassette.csv'):
+        cassettes_ftte = previous['cassettes_ftte']
+    else:
+        cassettes_ftte, _ = reload('t_cassette.csv', load_cassettes)
+
+    if unchanged('t_cable.csv'):
+        cables = {code: copy_cable(cable) for code, cable in previous['cables'].items()}
+    else:
+        cables, _ = reload('t_cable.csv', load_cables)
+
+    if unchanged('t_site.csv'):
+        noeud_to_site = previous['noeud_to_site']
+    else:
+        noeud_to_site, _ = reload('t_site.csv', load_sites)
+
+    if unchanged('t_local.csv'):
+        site_to_local = previous['site_to_local']
+    else:
+        site_to_local = reload('t_local.csv', load_locals)
+
+    resolve_cable_pm(cables, noeud_to_site, site_to_local)
+
+    # Positions : réutilisées si t_position.csv est inchangé et qu'aucune cassette FTTE n'est apparue
+    if unchanged('t_position.csv') and cassettes_ftte <= previous['cassettes_ftte']:
+        positions = previous['positions']
+        if cassettes_ftte != previous['cassettes_ftte']:
+            positions = [position for position in positions if position[0] in cassettes_ftte]
+        positions_total = previous['positions_total']
+    else:
+        positions, positions_total = reload('t_position.csv', read_ftte_positions, cassettes_ftte)
+
+    # Fibres : réutilisées si t_fibre.csv et les codes câble sont inchangés et toutes connues
+    fibres_reusable = unchanged('t_fibre.csv') and previous['cables'].keys() == cables.keys()
+    if fibres_reusable and positions is previous['positions']:
+        fibre_cables = previous['fibre_cables']
+    else:
+        referenced = {fibre for _, fibre1, fibre2 in positions for fibre in (fibre1, fibre2)}
+        if fibres_reusable and referenced <= previous['fibre_cables'].keys():
+            previous_fibres = previous['fibre_cables']
+            fibre_cables = {fibre: previous_fibres[fibre] for fibre in referenced}
+        else:
+            fibre_cables = reload('t_fibre.csv', read_fibre_cables, referenced, cables)
+
+    snapshot = {
+        'signatures': signatures,
+        'cassettes_ftte': cassettes_ftte,
+        'cables': cables,
+        'noeud_to_site': noeud_to_site,
+        'site_to_local': site_to_local,
+        'positions': positions,
+        'positions_total': positions_total,
+        'fibre_cables': fibre_cables,
+    }
+    return snapshot, reloaded
+
+
+def snapshot_fibre_index(snapshot):
+    """Index fibre -> câble de l'instantané (fibres dont le câble existe)"""
+    cables = snapshot['cables']
+    return {fibre: cables[code] for fibre, code in snapshot['fibre_cables'].items() if code is not None}
+
+
+def position_status(position, fibre_to_cable):
+    """
+    Statut d'une position FTTE (classify_position de ftte_analyzer)
+    Retourne (PM_RESOLVED, ligne de résultat), ou (code de rejet, None)
+    """
+    cassette_code, fibre1, fibre2 = position
+    status, fibre_tr, cable_tr, fibre_di, cable_di = classify_position(fibre1, fibre2, fibre_to_cable)
+    if status != PM_RESOLVED:
+        return status, None
+    return status, connection_row(cassette_code, fibre_tr, cable_tr, fibre_di, cable_di)
+
+
+def position_result(position, fibre_to_cable):
+    """Ligne de résultat d'une position FTTE, ou None si rejetée (voir position_status)"""
+    return position_status(position, fibre_to_cable)[1]
+
+
+def cable_signature(cable):
+    """Ce qui, dans un câble, détermine les connexions de ses fibres"""
+    if cable is None:
+        return None
+    return (cable.cb_code, cable.cb_typelog, cable.cb_etiquet, cable.pm_status, cable.pm)
+
+
+def compute_delta(previous, snapshot, writer):
+    """
+    Écrit les différences de connexions entre deux instantanés
+    Seules sont recalculées les positions ajoutées ou retirées et les positions
+    communes dont une fibre a changé de câble ou dont le câble (type, étiquette, PM)
+    a changé. Une position est identifiée par (cassette, ps_1, ps_2).
+    Retourne les compteurs : added, removed, changed, recomputed
+    """
+    old_index = snapshot_fibre_index(previous)
+    new_index = snapshot_fibre_index(snapshot)
+    changed_fibres = {
+        fibre for fibre in old_index.keys() | new_index.keys()
+        if cable_signature(old_index.get(fibre)) != cable_signature(new_index.get(fibre))
+    }
+    counts = dict.fromkeys(('added', 'removed', 'changed', 'recomputed'), 0)
+
+    def emit(status, row, changes=''):
+        writer.writerow((status,) + row + (changes,))
+        counts[{DELTA_ADDED: 'added', DELTA_REMOVED: 'removed', DELTA_CHANGED: 'changed'}[status]] += 1
+
+    def emit_difference(old_row, new_row):
+        if old_row is None:
+            emit(DELTA_ADDED, new_row)
+        elif new_row is None:
+            emit(DELTA_REMOVED, old_row)
+        else:
+            changes = '; '.join(
+                f"{name}: {old} → {new}"
+                for name, old, new in zip(RESULT_FIELDNAMES, old_row, new_row) if old != new)
+            emit(DELTA_CHANGED, new_row, changes)
+
+    if snapshot['positions'] == previous['positions']:
+        # Positions identiques : seules celles qui touchent une fibre modifiée sont recalculées
+        for position in snapshot['positions']:
+            if position[1] in changed_fibres or position[2] in changed_fibres:
+                counts['recomputed'] += 1
+                old_row = position_result(position, old_index)
+                new_row = position_result(position, new_index)
+                if old_row != new_row:
+                    emit_difference(old_row, new_row)
+        return counts
+
+    remaining = Counter(previous['positions'])
+    for position in snapshot['positions']:
+        if remaining[position] > 0:
+            remaining[position] -= 1
+            if position[1] not in changed_fibres and position[2] not in changed_fibres:
+                continue
+            old_row = position_result(position, old_index)
+            new_row = position_result(position, new_index)
+        else:
+            old_row = None
+            new_row = position_result(position, new_index)
+        counts['recomputed'] += 1
+
+        if old_row != new_row:
+            emit_difference(old_row, new_row)
+
+    # Positions disparues
+    for position, count in remaining.items():
+        if count <= 0:
+            continue
+        counts['recomputed'] += count
+        old_row = position_result(position, old_index)
+        if old_row is not None:
+            for _ in range(count):
+                emit(DELTA_REMOVED, old_row)
+
+    return counts
+
+
+def load_snapshot_file(path):
+    """Charge un instantané enregistré avec --snapshot"""
+    with open(path, 'rb') as f:
+        version, snapshot = pickle.load(f)
+    if version != INDEX_CACHE_VERSION:
+        raise ValueError(f"instantané {path} d'une version incompatible")
+    return snapshot
+
+
+def save_snapshot_file(path, snapshot):
+    """Enregistre un instantané (écriture atomique)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((INDEX_CACHE_VERSION, snapshot), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def open_export(zip_path):
+    """Ouvre un export ZIP en vérifiant la présence des fichiers requis"""
+    zip_file = zipfile.ZipFile(zip_path, 'r')
+    for file_name in REQUIRED_FILES:
+        if file_name not in zip_file.namelist():
+            zip_file.close()
+            raise ValueError(f"Fichier manquant dans {zip_path}: {file_name}")
+    return zip_file
+
+
+def load_previous(previous_path, cache_dir=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB):
+    """
+    Instantané de l'export précédent : fichier d'instantané, entrée du cache (clé
+    calculée sur le répertoire central du ZIP, sans décompression) ou, à défaut,
+    construit en lisant l'ancien ZIP
+    """
+    if not previous_path.endswith('.zip'):
+        print(f"\n♻️  Instantané précédent: {previous_path}")
+        return load_snapshot_file(previous_path)
+
+    with closing(open_export(previous_path)) as zip_file:
+        if cache_dir:
+            key = index_cache_key(zip_file)
+            snapshot = load_cached_indexes(cache_dir, key, '.snap')
+            if snapshot is not None:
+                print(f"\n♻️  Instantané de {previous_path} chargé depuis le cache")
+                return snapshot
+
+        print(f"\n📂 Lecture de l'export précédent {previous_path}...")
+        snapshot, _ = build_snapshot(zip_file)
+        if cache_dir:
+            store_cached_indexes(cache_dir, key, snapshot, cache_size_mb, '.snap')
+        return snapshot
+
+
+def process_delta_analysis(zip_path, previous_path=None, cache_dir=None,
+                           cache_size_mb=DEFAULT_CACHE_SIZE_MB, output_file=None,
+                           output_format='csv', snapshot_path=None):
+    """
+    Analyse un export en réutilisant l'instantané de l'export précédent
+    previous_path : ZIP ou instantané de l'export précédent (None : analyse complète)
+    cache_dir : cache des instantanés (clé : CRC et tailles des fichiers du ZIP)
+    snapshot_path : enregistre l'instantané du nouvel export dans ce fichier
+    Retourne le résumé (compteurs, différences, fichiers produits), ou None en cas d'échec
+    """
+    print(f"Démarrage de l'analyse différentielle du fichier: {zip_path}")
+    start_time = time.time()
+
+    missing = missing_output_dependency(output_format)
+    if missing:
+        print(f"❌ Erreur: {missing}")
+        return
+
+    try:
+        previous = None
+        if previous_path:
+            previous = load_previous(previous_path, cache_dir, cache_size_mb)
+
+        with closing(open_export(zip_path)) as zip_file:
+            print("\n🔍 Comparaison avec l'export précédent..." if previous else "\n📂 Lecture de l'export...")
+            snapshot, reloaded = build_snapshot(zip_file, previous)
+            if previous is not None:
+                print(f"   → {len(REQUIRED_FILES) - len(reloaded)} fichiers inchangés réutilisés")
+            if cache_dir:
+                store_cached_indexes(cache_dir, index_cache_key(zip_file), snapshot, cache_size_mb, '.snap')
+
+        if snapshot_path:
+            save_snapshot_file(snapshot_path, snapshot)
+
+        # Résultat complet : jointure des seules positions FTTE de l'instantané
+        if output_file is None:
+            output_file = f"ftte_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}{OUTPUT_FORMATS[output_format]}"
+        with closing(open_output(output_file, output_format)) as output:
+            stats = join_positions(snapshot['positions'], snapshot['cassettes_ftte'],
+                                   snapshot_fibre_index(snapshot), output)
+        stats['positions'] = snapshot['positions_total']
+
+        delta_file = None
+        delta = None
+        if previous is not None:
+            delta_file = output_stem(output_file) + '_delta.csv'
+            with open(delta_file, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile, delimiter=';')
+                writer.writerow(DELTA_FIELDNAMES)
+                delta = compute_delta(previous, snapshot, writer)
+
+        elapsed_time = time.time() - start_time
+        print(f"\n✅ Analyse terminée en {elapsed_time:.2f} secondes")
+        print("\n📊 Résultats:")
+        print(f"   - Positions traitées: {stats['positions']:,}")
+        print(f"   - Connexions FTTE trouvées: {stats['results']:,}")
+        print(f"   - Rejets - Pas de nœud PE: {stats['no_pe']:,}")
+        print(f"   - Rejets - Site non trouvé: {stats['no_site']:,}")
+        print(f"   - Rejets - Local non trouvé: {stats['no_local']:,}")
+        print(f"   - Fichier de sortie: {output_file}")
+        if delta is not None:
+            print("\n🔀 Différences avec l'export précédent:")
+            print(f"   - Positions FTTE recalculées: {delta['recomputed']:,}")
+            print(f"   - Connexions ajoutées: {delta['added']:,}")
+            print(f"   - Connexions supprimées: {delta['removed']:,}")
+            print(f"   - Connexions modifiées: {delta['changed']:,}")
+            print(f"   - Fichier des différences: {delta_file}")
+        if snapshot_path:
+            print(f"   - Instantané: {snapshot_path}")
+
+        return dict(stats, delta=delta, reloaded=reloaded, output_file=output_file,
+                    delta_file=delta_file, elapsed=elapsed_time)
+
+    except (EmptyMemberError, MemberDecodeError, MissingColumnsError) as e:
+        print(f"❌ {e}")
+    except Exception as e:
+        print(f"\n❌ Erreur lors du traitement: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyse différentielle FTTE entre deux exports d'un même SRO",
+        epilog="Exemples:\n"
+               "  python ftte_delta.py export_S40.zip --previous export_S39.zip --cache-dir cache/\n"
+               "  python ftte_delta.py export_S40.zip --previous S39.snap --snapshot S40.snap",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zip_path', metavar='fichier.zip', help="Nouvel export ZIP")
+    parser.add_argument('--previous', metavar='CHEMIN',
+                        help="Export précédent : fichier ZIP ou instantané (--snapshot)")
+    parser.add_argument('--snapshot', metavar='FICHIER',
+                        help="Enregistre l'instantané du nouvel export (pour la prochaine comparaison)")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="Cache des instantanés, retrouvés à partir du ZIP sans le décompresser")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE_MB, metavar='MB',
+                        help=f"Taille maximale du cache en MB (défaut : {DEFAULT_CACHE_SIZE_MB})")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv', dest='output_format',
+                        help="Format du fichier de résultats (défaut : csv)")
+    args = parser.parse_args()
+
+    for path in (args.zip_path, args.previous):
+        if path and not os.path.exists(path):
+            print(f"❌ Erreur: Le fichier '{path}' n'existe pas")
+            sys.exit(1)
+
+    summary = process_delta_analysis(args.zip_path, args.previous, args.cache_dir, args.cache_size,
+                                     output_format=args.output_format, snapshot_path=args.snapshot)
+    sys.exit(0 if summary is not None else 1)
+
+if __name__ == "__main__":
+    main()
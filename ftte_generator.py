@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Générateur d'exports FTTE synthétiques
+Construit un ZIP avec les six tables (t_cassette, t_position, t_fibre, t_cable,
+t_site, t_local) aux proportions réglables, pour mesurer l'analyseur sans
+exporter de données de production. À paramètres et graine identiques, le ZIP
+produit est identique.
+"""
+
+import zipfile
+import csv
+import io
+import argparse
+import random
+import time
+
+# Encodages et délimiteurs proposés
+ENCODINGS = ('utf-8', 'utf-8-sig', 'latin-1')
+DELIMITERS = (';', ',', 'mixte')
+
+# Tables écrites avec des virgules en délimiteur mixte (les autres avec ';')
+MIXED_COMMA_TABLES = ('t_site.csv', 't_local.csv')
+
+# Nombre de lignes écrites par bloc dans le ZIP
+WRITE_BATCH = 100000
+
+# Paramètres par défaut de la génération (proportions entre 0 et 1)
+GENERATOR_DEFAULTS = {
+    'positions': 1000000,
+    'seed': 42,
+    # Part des cassettes de type 'E' sans code BP
+    'ftte_ratio': 0.2,
+    # Répartition des câbles TR / DI (le reste est RA)
+    'tr_ratio': 0.3,
+    'di_ratio': 0.5,
+    # Part des câbles ayant un nœud PE, et part de ces nœuds PE placés dans cb_nd1 (sinon cb_nd2)
+    'pe_ratio': 0.8,
+    'pe_nd1_ratio': 0.5,
+    # Part des positions FTTE reliant une fibre TR et une fibre DI
+    'connection_ratio': 0.6,
+    # Orphelins : fibres sans câble connu, fibres de position inconnues,
+    # nœuds PE sans site, sites sans local SRO
+    'orphan_fibre_ratio': 0.01,
+    'orphan_position_ratio': 0.01,
+    'orphan_site_ratio': 0.05,
+    'orphan_local_ratio': 0.05,
+    'encoding': 'utf-8',
+    'delimiter': ';',
+}
+
+
+def table_delimiter(file_name, delimiter):
+    """Délimiteur d'une table selon le réglage ';', ',' ou 'mixte'"""
+    if delimiter == 'mixte':
+        return ',' if file_name in MIXED_COMMA_TABLES else ';'
+    return delimiter
+
+
+def table_sizes(positions):
+    """Nombre de lignes de chaque table, proportionnel au nombre de positions"""
+    return {
+        'cassettes': max(10, positions // 40),
+        'cables': max(10, positions // 200),
+        'fibres': max(20, positions * 3 // 2),
+        'pe_nodes': max(5, positions // 4000),
+    }
+
+
+class MemberWriter:
+    """Écrit un fichier CSV du ZIP par blocs de lignes, dans l'encodage demandé"""
+
+    def __init__(self, zip_file, file_name, encoding):
+        self.raw = zip_file.open(file_name, 'w', force_zip64=True)
+        self.encoding = encoding
+        self.lines = []
+        self.rows = 0
+        if encoding == 'utf-8-sig':
+            self.raw.write(b'\xef\xbb\xbf')
+            self.encoding = 'utf-8'
+
+    def write(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= WRITE_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.rows += len(self.lines)
+            self.raw.write(''.join(self.lines).encode(self.encoding, 'replace'))
+            self.lines = []
+
+    def close(self):
+        self.flush()
+        self.raw.close()
+
+
+def format_row(values, delimiter):
+    """Ligne CSV (avec guillemets si nécessaire) terminée par CRLF"""
+    output = io.StringIO()
+    csv.writer(output, delimiter=delimiter).writerow(values)
+    return output.getvalue()
+
+
+def generate_export(zip_path, **params):
+    """
+    Génère un export ZIP synthétique
+    Paramètres : voir GENERATOR_DEFAULTS
+    Retourne le nombre de lignes écrites par fichier
+    """
+    params = dict(GENERATOR_DEFAULTS, **params)
+    if params['encoding'] not in ENCODINGS:
+        raise ValueError(f"Encodage non supporté: {params['encoding']}")
+    if params['delimiter'] not in DELIMITERS:
+        raise ValueError(f"Délimiteur non supporté: {params['delimiter']}")
+
+    rng = random.Random(params['seed'])
+    sizes = table_sizes(params['positions'])
+    encoding = params['encoding']
+    counts = {}
+
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        def open_member(file_name, header):
+            delimiter = table_delimiter(file_name, params['delimiter'])
+            writer = MemberWriter(zip_file, file_name, encoding)
+            writer.write(delimiter.join(header) + '\r\n')
+            return writer, delimiter
+
+        def close_member(file_name, writer):
+            writer.close()
+            counts[file_name] = writer.rows - 1
+
+        # Cassettes : type 'E' sans code BP pour les cassettes FTTE
+        writer, delimiter = open_member('t_cassette.csv', ('cs_code', 'cs_nb_pas', 'cs_bp_code', 'cs_type', 'cs_num'))
+        cassette_codes = []
+        for i in range(sizes['cassettes']):
+            cs_code = f'CS{i:010d}'
+            cassette_codes.append(cs_code)
+            if rng.random() < params['ftte_ratio']:
+                cs_type, bp_code = 'E', ''
+            elif rng.random() < 0.5:
+                cs_type, bp_code = 'E', f'BP{i // 8:010d}'
+            else:
+                cs_type, bp_code = rng.choice('ACS'), f'BP{i // 8:010d}'
+            writer.write(delimiter.join((cs_code, '12', bp_code, cs_type, str(i % 24 + 1))) + '\r\n')
+        close_member('t_cassette.csv', writer)
+
+        # Nœuds PE et sites : un site par nœud PE, sauf les nœuds PE orphelins
+        pe_nodes = [f'PE{i:010d}' for i in range(sizes['pe_nodes'])]
+        writer, delimiter = open_member('t_site.csv', ('st_code', 'st_nd_code', 'st_nom', 'st_typelog'))
+        site_codes = []
+        for i, pe_node in enumerate(pe_nodes):
+            if rng.random() < params['orphan_site_ratio']:
+                continue
+            st_code = f'ST{i:010d}'
+            site_codes.append(st_code)
+            writer.write(format_row((st_code, pe_node, f'Site {i}, zone {i % 7}', 'CLIENT'), delimiter))
+            # Nœud non PE rattaché au même site
+            writer.write(format_row((st_code, f'ND{i:010d}', f'Site {i}, zone {i % 7}', 'CLIENT'), delimiter))
+        close_member('t_site.csv', writer)
+
+        # Locaux : un local SRO par site, sauf les sites orphelins (local NRO ou absent)
+        writer, delimiter = open_member('t_local.csv', ('lc_code', 'lc_etiquet', 'lc_typelog', 'lc_st_code'))
+        for i, st_code in enumerate(site_codes):
+            if rng.random() < params['orphan_local_ratio']:
+                if rng.random() < 0.5:
+                    writer.write(format_row((f'LC{i:010d}', f'NRO Étage {i}', 'NRO', st_code), delimiter))
+                continue
+            writer.write(format_row((f'LC{i:010d}', f'PM Étiquette {i}', 'SRO', st_code), delimiter))
+        close_member('t_local.csv', writer)
+
+        # Câbles : type TR / DI / RA, nœud PE dans cb_nd1 ou cb_nd2
+        writer, delimiter = open_member('t_cable.csv', ('cb_code', 'cb_etiquet', 'cb_typelog', 'cb_nd1', 'cb_nd2', 'cb_capafo'))
+        cables_by_type = {'TR': [], 'DI': [], 'RA': []}
+        for i in range(sizes['cables']):
+            draw = rng.random()
+            if draw < params['tr_ratio']:
+                typelog = 'TR'
+            elif draw < params['tr_ratio'] + params['di_ratio']:
+                typelog = 'DI'
+            else:
+                typelog = 'RA'
+            cables_by_type[typelog].append(i)
+
+            nd1, nd2 = f'ND{rng.randrange(sizes["pe_nodes"]):010d}', f'NX{i:010d}'
+            if rng.random() < params['pe_ratio']:
+                pe_node = rng.choice(pe_nodes)
+                if rng.random() < params['pe_nd1_ratio']:
+                    nd1 = pe_node
+                else:
+                    nd2 = pe_node
+            writer.write(format_row((f'CB{i:08d}', f'Câble {typelog} {i}', typelog, nd1, nd2, '144'), delimiter))
+        close_member('t_cable.csv', writer)
+
+        # Fibres : la fibre j appartient au câble j % nombre de câbles, sauf les orphelines
+        writer, delimiter = open_member('t_fibre.csv', ('fo_code', 'fo_cb_code', 'fo_nincab', 'fo_color'))
+        cable_count = sizes['cables']
+        orphan_fibre_ratio = params['orphan_fibre_ratio']
+        random_draw = rng.random
+        for j in range(sizes['fibres']):
+            cable = j % cable_count
+            cb_code = f'CB{cable:08d}' if random_draw() >= orphan_fibre_ratio else f'CZ{j:08d}'
+            writer.write(f'FO{j:012d}{delimiter}{cb_code}{delimiter}{j // cable_count % 144 + 1}{delimiter}BL\r\n')
+        close_member('t_fibre.csv', writer)
+
+        # Positions : les positions des cassettes reliant une fibre TR et une fibre DI
+        # forment les connexions ; les autres relient deux fibres quelconques
+        writer, delimiter = open_member('t_position.csv', ('ps_code', 'ps_numero', 'ps_1', 'ps_2', 'ps_cs_code', 'ps_type', 'ps_fonct'))
+        fibre_count = sizes['fibres']
+        per_cable = fibre_count // cable_count
+        tr_cables = cables_by_type['TR'] or [0]
+        di_cables = cables_by_type['DI'] or [0]
+        connection_ratio = params['connection_ratio']
+        orphan_position_ratio = params['orphan_position_ratio']
+
+        def typed_fibre(cables):
+            """Code d'une fibre tirée au hasard parmi les fibres des câbles donnés"""
+            return f'FO{rng.choice(cables) + rng.randrange(per_cable) * cable_count:012d}'
+
+        for i in range(params['positions']):
+            cs_code = cassette_codes[int(random_draw() * len(cassette_codes))]
+            if random_draw() < connection_ratio:
+                fibre1, fibre2 = typed_fibre(tr_cables), typed_fibre(di_cables)
+                if random_draw() < 0.5:
+                    fibre1, fibre2 = fibre2, fibre1
+            else:
+                fibre1 = f'FO{int(random_draw() * fibre_count):012d}'
+                fibre2 = f'FO{int(random_draw() * fibre_count):012d}'
+            if random_draw() < orphan_position_ratio:
+                fibre2 = f'FZ{i:012d}'
+            writer.write(f'PS{i:012d}{delimiter}{i % 12 + 1}{delimiter}{fibre1}{delimiter}{fibre2}'
+                         f'{delimiter}{cs_code}{delimiter}CO{delimiter}EPISSURE\r\n')
+        close_member('t_position.csv', writer)
+
+    return counts
+
+
+def parse_count(value):
+    """Nombre de lignes avec suffixe optionnel k ou M (ex. 500k, 10M)"""
+    value = value.strip()
+    multiplier = 1
+    if value[-1:] in ('k', 'K'):
+        multiplier, value = 1000, value[:-1]
+    elif value[-1:] in ('m', 'M'):
+        multiplier, value = 1000000, value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"nombre de lignes invalide: {value}")
+
+
+def add_generator_arguments(parser):
+    """Options de génération (partagées avec ftte_benchmark.py)"""
+    defaults = GENERATOR_DEFAULTS
+    parser.add_argument('--seed', type=int, default=defaults['seed'],
+                        help=f"Graine du générateur (défaut : {defaults['seed']})")
+    for name, help_text in (
+            ('ftte_ratio', "Part des cassettes FTTE"),
+            ('tr_ratio', "Part des câbles TR"),
+            ('di_ratio', "Part des câbles DI (le reste est RA)"),
+            ('pe_ratio', "Part des câbles avec nœud PE"),
+            ('pe_nd1_ratio', "Part des nœuds PE placés dans cb_nd1 (sinon cb_nd2)"),
+            ('connection_ratio', "Part des positions reliant une fibre TR et une fibre DI"),
+            ('orphan_fibre_ratio', "Part des fibres dont le câble est inconnu"),
+            ('orphan_position_ratio', "Part des positions dont une fibre est inconnue"),
+            ('orphan_site_ratio', "Part des nœuds PE sans site"),
+            ('orphan_local_ratio', "Part des sites sans local SRO")):
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, type=float, default=defaults[name],
+                            metavar='R', help=f"{help_text} (défaut : {defaults[name]})")
+    parser.add_argument('--encoding', choices=ENCODINGS, default=defaults['encoding'],
+                        help=f"Encodage des fichiers CSV (défaut : {defaults['encoding']})")
+    parser.add_argument('--delimiter', choices=DELIMITERS, default=defaults['delimiter'],
+                        help="Délimiteur ('mixte' : virgule pour t_site et t_local)")
+
+
+def generator_params(args):
+    """Paramètres de generate_export à partir des options de la ligne de commande"""
+    return {name: getattr(args, name) for name in GENERATOR_DEFAULTS if name != 'positions'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Générateur d'exports FTTE synthétiques")
+    parser.add_argument('zip_path', metavar='fichier.zip', help="ZIP à créer")
+    parser.add_argument('--positions', type=parse_count, default=GENERATOR_DEFAULTS['positions'],
+                        metavar='N', help="Nombre de positions, ex. 1M, 500k (défaut : 1M)")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    print(f"Génération de {args.zip_path} ({args.positions:,} positions)...")
+    counts = generate_export(args.zip_path, positions=args.positions, **generator_params(args))
+    for file_name, rows in counts.items():
+        print(f"   → {file_name}: {rows:,} lignes")
+    print(f"✅ Export généré en {time.time() - start_time:.2f} secondes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Serveur de requêtes FTTE
+Charge une fois un ou plusieurs exports (un par SRO) et garde en mémoire leurs
+connexions FTTE avec des index inverses (cassette, fibre, câble, nœud PE, site, PM).
+Les positions FTTE rejetées sont indexées par cassette, fibre et câble avec leur motif.
+Les recherches sont servies en JSON sur HTTP local ou sur une socket Unix :
+  GET /exports                      exports chargés
+  GET /cassette/<code>              connexions d'une cassette (et PM atteints)
+  GET /pm/<code ou étiquette>       connexions et cassettes FTTE aboutissant au local PM
+  GET /fibre/<code>, /cable/<code ou étiquette>, /pe/<nœud>, /site/<code>
+Les recherches par cassette, fibre et câble renvoient aussi les positions rejetées.
+Paramètres : ?export=<SRO> (un seul export), ?limit=N (connexions renvoyées).
+Un export plus récent du même SRO déposé à côté de l'export chargé est rechargé à
+chaud. Les index et le classement des positions sont ceux de l'analyseur
+(FtteAnalysis.classify_positions) : le serveur ne refait pas sa propre jointure.
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import argparse
+import zipfile
+import threading
+import socketserver
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from ftte_analyzer import (
+    DEFAULT_CACHE_SIZE_MB, PM_RESOLVED, REJECT_REASONS, RESULT_FIELDNAMES, AnalysisError,
+    EmptyMemberError, FtteAnalysis, MemberDecodeError, MissingColumnsError, connection_row,
+    expand_zip_paths
+)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Intervalle (secondes) de recherche d'un export plus récent ; un ZIP modifié depuis
+# moins de RELOAD_SETTLE_DELAY secondes est considéré en cours de copie
+DEFAULT_RELOAD_INTERVAL = 30.0
+RELOAD_SETTLE_DELAY = 2.0
+
+# Erreurs de chargement d'un export (l'export précédent du SRO reste servi)
+LOAD_ERRORS = (OSError, zipfile.BadZipFile, AnalysisError, EmptyMemberError, MemberDecodeError,
+               MissingColumnsError)
+
+# Nombre maximal de connexions renvoyées par défaut pour une recherche
+DEFAULT_LOOKUP_LIMIT = 1000
+
+# Colonnes d'une connexion : celles du fichier de résultats et les codes des câbles
+CONNECTION_FIELDNAMES = RESULT_FIELDNAMES + ['Code Cable Transport', 'Code Cable Distribution']
+
+# Recherches possibles : nom dans l'URL -> colonnes de la connexion indexées
+LOOKUP_COLUMNS = {
+    'cassette': (0,),
+    'fibre': (1, 3),
+    'cable': (2, 4, 9, 10),
+    'pe': (5,),
+    'site': (6,),
+    'pm': (7, 8),
+}
+
+# Positions FTTE rejetées : colonnes renvoyées et colonnes indexées par recherche
+REJECTION_FIELDNAMES = ['Cassette FTTE', 'Fibre 1', 'Fibre 2', 'Code Cable 1', 'Cable 1',
+                        'Code Cable 2', 'Cable 2', 'Motif']
+REJECTION_LOOKUP_COLUMNS = {
+    'cassette': (0,),
+    'fibre': (1, 2),
+    'cable': (3, 4, 5, 6),
+}
+
+# Nom d'export horodaté : ..._SRO-BPI-12387439_REC_..._20250929-080034_S39.zip
+SRO_PATTERN = re.compile(r'SRO-[^_]+')
+TIMESTAMP_PATTERN = re.compile(r'_(\d{8}-\d{6})_')
+
+
+def sro_key(zip_path):
+    """SRO d'un export (nom de fichier sans horodatage s'il ne contient pas de code SRO)"""
+    name = os.path.basename(zip_path)
+    match = SRO_PATTERN.search(name)
+    if match:
+        return match.group(0)
+    return TIMESTAMP_PATTERN.sub('_', os.path.splitext(name)[0])
+
+
+def export_version(zip_path):
+    """Ordre des exports d'un même SRO : horodatage du nom, puis date de modification"""
+    match = TIMESTAMP_PATTERN.search(os.path.basename(zip_path))
+    return (match.group(1) if match else '', os.path.getmtime(zip_path))
+
+
+def latest_exports(zip_paths):
+    """Export le plus récent de chaque SRO"""
+    latest = {}
+    for zip_path in zip_paths:
+        key = sro_key(zip_path)
+        if key not in latest or export_version(zip_path) > export_version(latest[key]):
+            latest[key] = zip_path
+    return latest
+
+
+def index_row(indexes, lookup_columns, row, row_id):
+    """Ajoute le numéro row_id aux index de chaque valeur renseignée des colonnes indexées de row"""
+    for name, columns in lookup_columns.items():
+        index = indexes[name]
+        for column in columns:
+            value = row[column]
+            if not value:
+                continue
+            row_ids = index.get(value)
+            if row_ids is None:
+                index[value] = [row_id]
+            elif row_ids[-1] != row_id:
+                row_ids.append(row_id)
+
+
+class ExportIndex:
+    """
+    Connexions FTTE d'un export et index inverses
+    Chaque index associe une valeur (code ou étiquette) aux numéros des connexions qui
+    la contiennent ; pm_cassettes associe chaque local PM (code et étiquette) aux
+    cassettes FTTE qui l'atteignent. Les positions FTTE sans connexion sont gardées
+    dans rejections avec leur motif (REJECT_REASONS) et indexées par cassette, fibre
+    et câble (rejection_indexes).
+    """
+
+    def __init__(self, zip_path, analysis):
+        self.zip_path = zip_path
+        self.version = export_version(zip_path)
+        self.loaded_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+        self.connections = []
+        self.indexes = {name: {} for name in LOOKUP_COLUMNS}
+        self.rejections = []
+        self.rejection_indexes = {name: {} for name in REJECTION_LOOKUP_COLUMNS}
+        self.pm_cassettes = {}
+        fibre_to_cable = analysis.indexes['fibre_to_cable']
+        for position in analysis.classify_positions():
+            cassette_code, fibre1, fibre2, status, fibre_tr, cable_tr, fibre_di, cable_di = position
+            if status != PM_RESOLVED:
+                # Câbles des deux fibres, dans l'ordre ps_1, ps_2
+                cable1 = fibre_to_cable.get(fibre1)
+                cable2 = fibre_to_cable.get(fibre2)
+                rejection = (cassette_code, fibre1, fibre2,
+                             cable1.cb_code if cable1 else None, cable1.cb_etiquet if cable1 else None,
+                             cable2.cb_code if cable2 else None, cable2.cb_etiquet if cable2 else None,
+                             REJECT_REASONS[status])
+                index_row(self.rejection_indexes, REJECTION_LOOKUP_COLUMNS, rejection, len(self.rejections))
+                self.rejections.append(rejection)
+                continue
+            connection = (connection_row(cassette_code, fibre_tr, cable_tr, fibre_di, cable_di) +
+                          (cable_tr.cb_code, cable_di.cb_code))
+            row_id = len(self.connections)
+            self.connections.append(connection)
+            index_row(self.indexes, LOOKUP_COLUMNS, connection, row_id)
+
+            for value in (connection[7], connection[8]):
+                if value:
+                    self.pm_cassettes.setdefault(value, {})[connection[0]] = None
+        self.stats = analysis.stats
+
+    def lookup(self, name, value, limit=DEFAULT_LOOKUP_LIMIT):
+        """
+        Connexions contenant value (recherche name), cassettes et PM concernés, et
+        positions rejetées (recherches par cassette, fibre et câble) ; None si value est
+        absente des deux
+        """
+        row_ids = self.indexes[name].get(value, [])
+        rejected_ids = self.rejection_indexes.get(name, {}).get(value, [])
+        if not row_ids and not rejected_ids:
+            return None
+        connections = [self.connections[row_id] for row_id in row_ids]
+        rejections = [self.rejections[row_id] for row_id in rejected_ids]
+        if name == 'pm':
+            cassettes = list(self.pm_cassettes[value])
+        else:
+            cassettes = list(dict.fromkeys([connection[0] for connection in connections] +
+                                           [rejection[0] for rejection in rejections]))
+        return {
+            'total': len(connections),
+            'cassettes': cassettes,
+            'pm': sorted({(connection[7], connection[8]) for connection in connections}),
+            'connections': [dict(zip(CONNECTION_FIELDNAMES, connection)) for connection in connections[:limit]],
+            'rejected_total': len(rejections),
+            'rejected': [dict(zip(REJECTION_FIELDNAMES, rejection)) for rejection in rejections[:limit]],
+        }
+
+    def summary(self):
+        """Description de l'export chargé"""
+        return {
+            'zip': self.zip_path,
+            'loaded_at': self.loaded_at,
+            'positions': self.stats.positions,
+            'ftte_positions': len(self.connections) + len(self.rejections),
+            'connections': len(self.connections),
+            'rejected': dict(Counter(rejection[-1] for rejection in self.rejections)),
+            'cassettes': len(self.indexes['cassette']),
+            'pm': len({connection[7] for connection in self.connections}),
+        }
+
+
+class QueryService:
+    """
+    Exports chargés (un par SRO) et rechargement à chaud
+    Un rechargement construit le nouvel index à part puis remplace le dictionnaire
+    des exports : les requêtes en cours gardent l'index précédent, sans verrou.
+    """
+
+    def __init__(self, cache_dir=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.cache_size_mb = cache_size_mb
+        self.exports = {}
+        self.failed = set()
+        self.reload_lock = threading.Lock()
+
+    def load(self, key, zip_path):
+        """
+        Charge (ou recharge) l'export zip_path du SRO key ; avec cache_dir, les index
+        de l'analyseur sont repris du cache (partagé avec ftte_analyzer.py --cache-dir)
+        """
+        start_time = time.time()
+        print(f"\n📂 {key}: chargement de {zip_path}...")
+        with FtteAnalysis(zip_path, cache_dir=self.cache_dir, cache_size_mb=self.cache_size_mb) as analysis:
+            export = ExportIndex(zip_path, analysis)
+        exports = dict(self.exports)
+        exports[key] = export
+        self.exports = exports
+        print(f"   ✅ {len(export.connections):,} connexions, {len(export.indexes['cassette']):,} cassettes "
+              f"indexées en {time.time() - start_time:.2f} s")
+
+    def check_updates(self):
+        """Recharge les SRO pour lesquels un export plus récent est apparu dans le répertoire"""
+        with self.reload_lock:
+            for key, export in list(self.exports.items()):
+                directory = os.path.dirname(os.path.abspath(export.zip_path))
+                candidates = []
+                for zip_path in glob.glob(os.path.join(glob.escape(directory), '*.zip')):
+                    try:
+                        if sro_key(zip_path) != key or zip_path in self.failed:
+                            continue
+                        if time.time() - os.path.getmtime(zip_path) < RELOAD_SETTLE_DELAY:
+                            continue
+                        version = export_version(zip_path)
+                    except OSError:
+                        continue
+                    if version > export.version:
+                        candidates.append((version, zip_path))
+                if not candidates:
+                    continue
+
+                _, zip_path = max(candidates)
+                try:
+                    self.load(key, zip_path)
+                except LOAD_ERRORS as e:
+                    print(f"   ❌ {key}: rechargement de {zip_path} impossible ({e}), export précédent conservé")
+                    self.failed.add(zip_path)
+
+    def watch(self, interval):
+        """Boucle de rechargement à chaud (thread dédié)"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.check_updates()
+            except Exception as e:
+                print(f"   ⚠️  Recherche des exports plus récents interrompue ({e})")
+
+    def query(self, path, query_string):
+        """Réponse (code HTTP, objet JSON) à une requête GET"""
+        parts = path.strip('/').split('/', 1)
+        params = parse_qs(query_string)
+        exports = self.exports
+        selected = params.get('export')
+        if selected:
+            exports = {key: export for key, export in exports.items() if key in selected}
+
+        if parts[0] in ('', 'exports'):
+            return 200, {key: export.summary() for key, export in exports.items()}
+
+        name = parts[0]
+        if name not in LOOKUP_COLUMNS or len(parts) != 2 or not parts[1]:
+            return 404, {'error': "recherche inconnue",
+                         'lookups': [f"/{lookup}/<valeur>" for lookup in LOOKUP_COLUMNS] + ['/exports']}
+        try:
+            limit = int(params.get('limit', [DEFAULT_LOOKUP_LIMIT])[0])
+        except ValueError:
+            return 400, {'error': "limit doit être un entier"}
+
+        value = unquote(parts[1])
+        results = {}
+        for key, export in exports.items():
+            result = export.lookup(name, value, limit)
+            if result is not None:
+                results[key] = result
+        if not results:
+            return 404, {'lookup': name, 'value': value, 'error': "valeur inconnue", 'exports': {}}
+        return 200, {'lookup': name, 'value': value, 'exports': results}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Requêtes GET du serveur (HTTP ou socket Unix)"""
+
+    server_version = 'FTTEQuery/1.0'
+
+    def do_GET(self):
+        start_time = time.perf_counter()
+        url = urlsplit(self.path)
+        status, body = self.server.service.query(url.path, url.query)
+        body['elapsed_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Socket Unix : pas d'adresse client
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixQueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serveur de requêtes sur socket Unix"""
+    daemon_threads = True
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """Serveur HTTP local, ou sur la socket Unix socket_path"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixQueryServer(socket_path, QueryHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serveur de requêtes FTTE : exports chargés une fois, recherches en JSON",
+        epilog="Exemples:\n"
+               "  python ftte_server.py exports/ --cache-dir cache/\n"
+               "  curl http://127.0.0.1:8765/cassette/CS000123\n"
+               "  python ftte_server.py export.zip --socket /tmp/ftte.sock\n"
+               "  curl --unix-socket /tmp/ftte.sock http://localhost/pm/PM-0042",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zip_paths', metavar='fichier.zip', nargs='+',
+                        help="Exports ZIP à charger (fichiers, motifs glob ou répertoires ; "
+                             "le plus récent de chaque SRO)")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Adresse d'écoute (défaut : {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port HTTP (défaut : {DEFAULT_PORT})")
+    parser.add_argument('--socket', metavar='CHEMIN', dest='socket_path',
+                        help="Écoute sur une socket Unix au lieu du port HTTP")
+    parser.add_argument('--reload-interval', type=float, default=DEFAULT_RELOAD_INTERVAL, metavar='S',
+                        help=f"Recherche d'un export plus récent toutes les S secondes, 0 pour désactiver "
+                             f"(défaut : {DEFAULT_RELOAD_INTERVAL:.0f})")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="Cache des index (partagé avec ftte_analyzer.py --cache-dir)")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE_MB, metavar='MB',
+                        help=f"Taille maximale du cache en MB (défaut : {DEFAULT_CACHE_SIZE_MB})")
+    args = parser.parse_args()
+
+    zip_paths = [path for path in expand_zip_paths(args.zip_paths) if os.path.exists(path)]
+    if not zip_paths:
+        print("❌ Erreur: Aucun fichier ZIP trouvé")
+        sys.exit(1)
+
+    service = QueryService(args.cache_dir, args.cache_size)
+    for key, zip_path in sorted(latest_exports(zip_paths).items()):
+        try:
+            service.load(key, zip_path)
+        except LOAD_ERRORS as e:
+            print(f"   ❌ {key}: chargement de {zip_path} impossible ({e})")
+    if not service.exports:
+        sys.exit(1)
+
+    if args.reload_interval > 0:
+        threading.Thread(target=service.watch, args=(args.reload_interval,), daemon=True).start()
+
+    server = create_server(service, args.host, args.port, args.socket_path)
+    where = args.socket_path or f"http://{args.host}:{args.port}"
+    print(f"\n🚀 Serveur prêt sur {where} ({len(service.exports)} export(s))")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Arrêt du serveur")
+    finally:
+        server.server_close()
+        if args.socket_path and os.path.exists(args.socket_path):
+            os.remove(args.socket_path)
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,17 @@ if errorlevel 1 (
     exit /b 1
 )
 
-:: Demander le fichier ZIP
-set /p zipfile="Glissez-déposez votre fichier ZIP ici et appuyez sur Entrée: "
+:: Fichiers déposés sur le script : traitement direct (lot si plusieurs archives)
+if not "%~1"=="" (
+    echo.
+    echo Démarrage de l'analyse (recherche noeud PE^)...
+    echo.
+    python ftte_analyzer.py %*
+    goto fin
+)
+
+:: Demander le fichier ZIP (ou un dossier contenant plusieurs exports)
+set /p zipfile="Glissez-déposez votre fichier ZIP ou un dossier ici et appuyez sur Entrée: "
 
 :: Retirer les guillemets si présents
 set zipfile=%zipfile:"=%
@@ -25,6 +34,8 @@ echo Démarrage de l'analyse (recherche noeud PE)...
 echo.
 python ftte_analyzer.py "%zipfile%"
 
+:fin
+
 echo.
 echo ========================================
 echo Traitement terminé
@@ -0,0 +1,116 @@
+"""
+Fixtures des tests : export synthétique généré par ftte_generator.py (paramètres par
+défaut, graine fixe) et son résultat de référence dans ftte_benchmark_golden.json,
+produit par l'analyseur d'origine (ftte_benchmark.py --baseline), et petits exports
+écrits table par table (write_export)
+"""
+
+import os
+import csv
+import sys
+import json
+import zipfile
+
+import pytest
+
+# Les scripts sont à la racine du dépôt
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from ftte_analyzer import Connection, FtteAnalysis, process_ftte_analysis  # noqa: E402
+from ftte_benchmark import DEFAULT_GOLDEN_FILE, export_name, file_digest  # noqa: E402
+from ftte_generator import GENERATOR_DEFAULTS, generate_export  # noqa: E402
+
+# Taille de l'export de test (entrée bench_20000_* de la référence) : assez de fibres
+# pour que --memory-limit 1 partitionne la jointure
+TEST_POSITIONS = 20000
+
+# Compteurs comparés à la référence
+COUNTERS = ('positions', 'results', 'no_pe', 'no_site', 'no_local')
+
+# Export minimal : une cassette FTTE reliant une fibre TR et une fibre DI
+BASE_TABLES = {
+    't_cassette.csv': ['cs_code;cs_type;cs_bp_code', 'CS1;E;', 'CS2;E;BP1'],
+    't_position.csv': ['ps_code;ps_1;ps_2;ps_cs_code', 'PS1;FT1;FD1;CS1', 'PS2;FT1;FD1;CS2'],
+    't_fibre.csv': ['fo_code;fo_cb_code', 'FT1;CB1', 'FD1;CB2'],
+    't_cable.csv': ['cb_code;cb_etiquet;cb_typelog;cb_nd1;cb_nd2',
+                    'CB1;Câble transport;TR;ND1;ND2', 'CB2;Câble distribution;DI;PE1;ND3'],
+    't_site.csv': ['st_code;st_nd_code', 'ST1;PE1'],
+    't_local.csv': ['lc_code;lc_etiquet;lc_typelog;lc_st_code', 'LC1;PM Été;SRO;ST1'],
+}
+
+EXPECTED = Connection('CS1', 'FT1', 'Câble transport', 'FD1', 'Câble distribution',
+                      'PE1', 'ST1', 'LC1', 'PM Été')
+
+
+def write_export(path, **tables):
+    """
+    Écrit un export à partir de BASE_TABLES ; les tables passées en argument (nom sans
+    .csv : octets, ou liste de lignes écrites en UTF-8) remplacent celles de la base
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for file_name, lines in BASE_TABLES.items():
+            data = tables.get(file_name[:-len('.csv')], lines)
+            if not isinstance(data, bytes):
+                data = '\r\n'.join(data).encode('utf-8') + b'\r\n'
+            zip_file.writestr(file_name, data)
+    return path
+
+
+def connections(zip_path, engine='dict', **options):
+    """Connexions trouvées dans l'export"""
+    with FtteAnalysis(str(zip_path), engine=engine, **options) as analysis:
+        return list(analysis)
+
+
+def run_analysis(zip_path, output_file, **options):
+    """
+    Analyse complète ; retourne le résultat sous la forme des entrées de la référence
+    (compteurs et empreinte SHA-256 du fichier de résultats)
+    """
+    summary = process_ftte_analysis(str(zip_path), output_file=str(output_file), **options)
+    assert summary is not None, "l'analyse a échoué"
+    result = {key: summary[key] for key in COUNTERS}
+    result['sha256'] = file_digest(output_file)
+    return result
+
+
+@pytest.fixture(scope='session')
+def generated_export(tmp_path_factory):
+    """Fabrique d'exports générés (même graine), mis en commun entre les tests"""
+    directory = tmp_path_factory.mktemp('exports')
+    exports = {}
+    
+    def make(**params):
+        key = tuple(sorted(params.items()))
+        if key not in exports:
+            path = directory / f"export_{len(exports)}.zip"
+            generate_export(str(path), positions=TEST_POSITIONS, **params)
+            exports[key] = path
+        return exports[key]
+    
+    return make
+
+
+@pytest.fixture(scope='session')
+def seeded_export(generated_export):
+    """Export de test aux réglages par défaut du générateur (UTF-8, ';')"""
+    return generated_export()
+
+
+@pytest.fixture(scope='session')
+def golden_result():
+    """Résultat de référence de l'export de test (analyseur d'origine)"""
+    with open(os.path.join(REPO_DIR, DEFAULT_GOLDEN_FILE), encoding='utf-8') as f:
+        golden = json.load(f)
+    params = {name: value for name, value in GENERATOR_DEFAULTS.items() if name != 'positions'}
+    return golden[export_name(TEST_POSITIONS, params)]
+
+
+@pytest.fixture(scope='session')
+def golden_rows(seeded_export, golden_result, tmp_path_factory):
+    """Lignes du fichier de résultats de référence (vérifié par son empreinte), sans l'en-tête"""
+    output_file = tmp_path_factory.mktemp('golden') / 'results.csv'
+    assert run_analysis(seeded_export, output_file) == golden_result
+    with open(output_file, newline='', encoding='utf-8') as f:
+        return [tuple(row) for row in csv.reader(f, delimiter=';')][1:]
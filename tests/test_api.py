@@ -0,0 +1,57 @@
+"""
+API Python (FtteAnalysis) : connexions, écriture, compteurs et erreurs
+"""
+
+import csv
+import io
+import zipfile
+
+import pytest
+
+from conftest import BASE_TABLES, EXPECTED, write_export
+from ftte_analyzer import AnalysisError, FtteAnalysis, RESULT_FIELDNAMES
+
+
+def test_connections_and_stats(tmp_path):
+    with FtteAnalysis(str(write_export(tmp_path / 'export.zip'))) as analysis:
+        assert list(analysis) == [EXPECTED]
+        assert analysis.stats.as_dict() == {'positions': 2, 'results': 1, 'no_pe': 0, 'no_site': 0,
+                                            'no_local': 0, 'traced': 0}
+
+
+def test_run_writer(tmp_path):
+    output = io.StringIO()
+    with FtteAnalysis(str(write_export(tmp_path / 'export.zip'))) as analysis:
+        stats = analysis.run(csv.writer(output, delimiter=';'))
+    assert stats.results == 1
+    assert list(csv.reader(io.StringIO(output.getvalue()), delimiter=';')) == [list(EXPECTED)]
+    assert len(EXPECTED) == len(RESULT_FIELDNAMES)
+
+
+def test_open_file_source(tmp_path):
+    zip_path = write_export(tmp_path / 'export.zip')
+    with open(zip_path, 'rb') as f, FtteAnalysis(f) as analysis:
+        assert list(analysis) == [EXPECTED]
+    # Export en mémoire : aucun chemin à rouvrir pour les processus de chargement
+    with open(zip_path, 'rb') as f:
+        data = io.BytesIO(f.read())
+    with FtteAnalysis(data) as analysis:
+        assert list(analysis) == [EXPECTED]
+    with pytest.raises(AnalysisError, match='--workers'):
+        FtteAnalysis(data, workers=2)
+
+
+def test_missing_member(tmp_path):
+    zip_path = tmp_path / 'incomplete.zip'
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        for file_name, lines in BASE_TABLES.items():
+            if file_name != 't_site.csv':
+                zip_file.writestr(file_name, '\r\n'.join(lines) + '\r\n')
+    with pytest.raises(AnalysisError, match='t_site.csv'):
+        FtteAnalysis(str(zip_path))
+
+
+def test_no_ftte_cassette(tmp_path):
+    zip_path = write_export(tmp_path / 'export.zip', t_cassette=['cs_code;cs_type;cs_bp_code', 'CS1;S;'])
+    with pytest.raises(AnalysisError, match='Aucune cassette FTTE'):
+        FtteAnalysis(str(zip_path))
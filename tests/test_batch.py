@@ -0,0 +1,31 @@
+"""
+Traitement par lot : un fichier de résultats par archive, même pour des archives homonymes
+"""
+
+import os
+import shutil
+
+from ftte_analyzer import batch_stems, process_batch
+from ftte_benchmark import file_digest
+
+
+def test_batch_stems():
+    stems = batch_stems([os.path.join('a', 'export.zip'), os.path.join('b', 'export.zip'), 'autre.zip'])
+    assert stems['autre.zip'] == 'autre'
+    first, second = stems[os.path.join('a', 'export.zip')], stems[os.path.join('b', 'export.zip')]
+    assert first.startswith('export_') and second.startswith('export_')
+    assert first != second
+
+
+def test_same_name_in_two_directories(seeded_export, golden_result, tmp_path):
+    zip_paths = []
+    for directory in ('lundi', 'mardi'):
+        os.makedirs(tmp_path / directory)
+        zip_paths.append(str(tmp_path / directory / 'export.zip'))
+        shutil.copy(seeded_export, zip_paths[-1])
+    
+    assert process_batch(zip_paths, str(tmp_path / 'resultats')) == 0
+    stems = batch_stems(zip_paths)
+    for zip_path in zip_paths:
+        output_file = tmp_path / 'resultats' / f"ftte_results_{stems[zip_path]}.csv"
+        assert file_digest(output_file) == golden_result['sha256']
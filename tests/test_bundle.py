@@ -0,0 +1,85 @@
+"""
+Bundle des résultats pour les pages web (--format bundle) : manifeste, fichiers par PM et index
+"""
+
+import gzip
+import json
+import os
+from collections import Counter
+
+import pytest
+
+import ftte_analyzer
+from ftte_analyzer import RESULT_FIELDNAMES, process_ftte_analysis
+
+
+def read_json_gz(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_bundle(zip_path, path):
+    """Analyse vers un bundle ; retourne le manifeste"""
+    assert process_ftte_analysis(str(zip_path), output_file=str(path), output_format='bundle') is not None
+    with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def shard_rows(path, shard):
+    """Lignes d'un fichier de PM, colonnes encodées par dictionnaire décodées"""
+    document = read_json_gz(os.path.join(path, shard['file']))
+    assert document['pm'] == shard['pm'] and document['label'] == shard['label']
+    assert document['columns'] == RESULT_FIELDNAMES
+    dictionaries = {int(index): values for index, values in document['dictionaries'].items()}
+    rows = []
+    for row in document['rows']:
+        rows.append(tuple(dictionaries[index][value] if index in dictionaries else value
+                          for index, value in enumerate(row)))
+    return rows
+
+
+@pytest.mark.parametrize('spill_rows', [None, 50], ids=['memoire', 'deversement'])
+def test_bundle_contents(spill_rows, seeded_export, golden_result, golden_rows, tmp_path, monkeypatch):
+    if spill_rows:
+        monkeypatch.setattr(ftte_analyzer, 'BUNDLE_SPILL_ROWS', spill_rows)
+    path = tmp_path / 'results.bundle'
+    manifest = write_bundle(seeded_export, path)
+    
+    assert manifest['format'] == 'ftte-bundle'
+    assert manifest['columns'] == RESULT_FIELDNAMES
+    assert manifest['results'] == golden_result['results']
+    assert not os.path.exists(path / '.spill')
+    
+    # Chaque PM : ses lignes dans l'ordre des résultats, sites et cassettes décrits par le manifeste
+    all_rows = []
+    shards = {}
+    for shard in manifest['shards']:
+        rows = shard_rows(path, shard)
+        assert rows == [row for row in golden_rows if row[7] == shard['pm']]
+        assert shard['rows'] == len(rows)
+        assert shard['sites'] == sorted({row[6] for row in rows})
+        assert shard['cassettes'] == len({row[0] for row in rows})
+        assert shard['bytes'] == os.path.getsize(path / shard['file'])
+        shards[shard['id']] = rows
+        all_rows += rows
+    assert Counter(all_rows) == Counter(golden_rows)
+    labels = [(shard['label'], shard['pm']) for shard in manifest['shards']]
+    assert labels == sorted(labels)
+    
+    # Index de recherche : PM où apparaît chaque cassette, câble, nœud PE et site
+    index = read_json_gz(path / manifest['index'])
+    for name, columns in (('cassette', (0,)), ('cable', (2, 4)), ('pe', (5,)), ('site', (6,))):
+        expected = {}
+        for shard_id, rows in shards.items():
+            for row in rows:
+                for column in columns:
+                    expected.setdefault(row[column], set()).add(shard_id)
+        assert {value: set(ids) for value, ids in index[name].items()} == expected
+
+
+def test_bundle_refuses_other_directory(seeded_export, tmp_path):
+    path = tmp_path / 'results.bundle'
+    os.makedirs(path)
+    (path / 'notes.txt').write_text('à garder', encoding='utf-8')
+    process_ftte_analysis(str(seeded_export), output_file=str(path), output_format='bundle')
+    assert (path / 'notes.txt').exists()
@@ -0,0 +1,31 @@
+"""
+Cache des index : une entrée par combinaison plan des fibres / --compact / magasin
+"""
+
+import os
+
+from conftest import run_analysis
+from ftte_analyzer import CompactFibreIndex, FtteAnalysis
+
+
+def test_compact_entry_not_reused(seeded_export, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    with FtteAnalysis(str(seeded_export), cache_dir=cache_dir, compact=True) as analysis:
+        assert isinstance(analysis.indexes['fibre_to_cable'], CompactFibreIndex)
+    with FtteAnalysis(str(seeded_export), cache_dir=cache_dir) as analysis:
+        assert not isinstance(analysis.indexes['fibre_to_cable'], CompactFibreIndex)
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_semijoin_entry_not_reused(seeded_export, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    with FtteAnalysis(str(seeded_export), cache_dir=cache_dir, fibre_plan='semijoin') as analysis:
+        pruned = len(analysis.indexes['fibre_to_cable'])
+    with FtteAnalysis(str(seeded_export), cache_dir=cache_dir, fibre_plan='direct') as analysis:
+        assert len(analysis.indexes['fibre_to_cable']) > pruned
+
+
+def test_cached_run_same_output(seeded_export, golden_result, tmp_path):
+    for _ in range(2):
+        result = run_analysis(seeded_export, tmp_path / 'results.csv', cache_dir=str(tmp_path / 'cache'))
+        assert result == golden_result
@@ -0,0 +1,32 @@
+"""
+Index des fibres compact (--compact) : mêmes correspondances et mêmes résultats que le dict
+"""
+
+import pytest
+
+from conftest import run_analysis
+from ftte_analyzer import Cable, CompactFibreIndex
+
+
+def test_compact_index_lookups():
+    cables = {code: Cable(code, 'TR', code, '', '', None) for code in ('CB1', 'CB2', 'CB3')}
+    reference = {f"FO{number:08d}": cables[f"CB{number % 3 + 1}"] for number in range(5000)}
+    # Estimation trop basse : la table est agrandie en cours de construction
+    index = CompactFibreIndex(cables, expected=100)
+    for fibre_code, cable in reference.items():
+        index[fibre_code] = cable
+    index['FO00000001'] = cables['CB3']
+    reference['FO00000001'] = cables['CB3']
+    
+    assert len(index) == len(reference)
+    assert all(index.get(fibre_code) is cable for fibre_code, cable in reference.items())
+    assert index.get('FO99999999') is None
+    assert 'FO99999999' not in index and 'FO00000042' in index
+    assert index.get(None) is None
+
+
+@pytest.mark.parametrize('options', [{}, {'fibre_plan': 'semijoin'}, {'workers': 2}],
+                         ids=['auto', 'semijoin', 'workers'])
+def test_compact_same_output_as_golden(options, seeded_export, golden_result, tmp_path):
+    result = run_analysis(seeded_export, tmp_path / 'results.csv', compact=True, **options)
+    assert result == golden_result
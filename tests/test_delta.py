@@ -0,0 +1,44 @@
+"""
+Analyse différentielle (ftte_delta.py) : même résultat complet que l'analyseur
+(classify_position partagé) et fichier des différences
+"""
+
+import csv
+
+from conftest import BASE_TABLES, COUNTERS, run_analysis, write_export
+from ftte_benchmark import file_digest
+from ftte_delta import DELTA_FIELDNAMES, process_delta_analysis
+
+
+def delta_result(summary):
+    result = {key: summary[key] for key in COUNTERS}
+    result['sha256'] = file_digest(summary['output_file'])
+    return result
+
+
+def test_full_result_same_as_golden(seeded_export, golden_result, tmp_path):
+    summary = process_delta_analysis(str(seeded_export), output_file=str(tmp_path / 'results.csv'))
+    assert delta_result(summary) == golden_result
+
+
+def test_delta_file(tmp_path):
+    previous = write_export(tmp_path / 'S39.zip')
+    current = write_export(
+        tmp_path / 'S40.zip',
+        t_local=['lc_code;lc_etiquet;lc_typelog;lc_st_code', 'LC1;PM Hiver;SRO;ST1'],
+        t_position=BASE_TABLES['t_position.csv'] + ['PS3;FD1;FT1;CS1', 'PS4;FX1;FD1;CS1'])
+    summary = process_delta_analysis(str(current), str(previous), output_file=str(tmp_path / 'S40.csv'))
+    # FX1 est absente de l'instantané précédent : t_fibre.csv est relu
+    assert summary['reloaded'] == ['t_local.csv', 't_position.csv', 't_fibre.csv']
+    # Résultat complet identique à une analyse complète du nouvel export
+    assert delta_result(summary) == run_analysis(current, tmp_path / 'full.csv')
+
+    with open(summary['delta_file'], newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    connection = ['CS1', 'FT1', 'Câble transport', 'FD1', 'Câble distribution', 'PE1', 'ST1', 'LC1', 'PM Hiver']
+    assert rows == [
+        DELTA_FIELDNAMES,
+        ['MODIFICATION'] + connection + ['Etiquette PM: PM Été → PM Hiver'],
+        ['AJOUT'] + connection + [''],
+    ]
+    assert summary['delta'] == {'added': 1, 'removed': 0, 'changed': 1, 'recomputed': 3}
@@ -0,0 +1,101 @@
+"""
+Diagnostic des rejets (--diagnostics, ftte_analyzer_debug.py) : raisons comptées par
+cassette FTTE et rapport ftte_rejets_<date>.txt
+"""
+
+import glob
+
+import pytest
+
+from conftest import run_analysis, write_export
+from ftte_analyzer import FtteAnalysis
+from ftte_analyzer_debug import process_ftte_analysis_debug
+
+# Une position de chaque raison de rejet : fibre absente, câble absent (fibre non indexée),
+# pas TR-DI, câble DI sans nœud PE, nœud PE sans site, site sans local SRO
+REJECTION_TABLES = {
+    't_cassette': ['cs_code;cs_type;cs_bp_code', 'CS1;E;', 'CS2;E;', 'CS3;S;BP1'],
+    't_cable': ['cb_code;cb_etiquet;cb_typelog;cb_nd1;cb_nd2',
+                'CT1;Transport;TR;ND1;ND2', 'CD1;Distribution;DI;PE1;ND3', 'CD2;Sans PE;DI;ND4;ND5',
+                'CD3;PE sans site;DI;PE9;ND6', 'CD4;Site sans SRO;DI;ND7;PE2', 'CR1;Raccordement;RA;ND8;ND9'],
+    't_fibre': ['fo_code;fo_cb_code', 'FT1;CT1', 'FD1;CD1', 'FD2;CD2', 'FD3;CD3', 'FD4;CD4', 'FR1;CR1',
+                'FO1;CB9'],
+    't_site': ['st_code;st_nd_code', 'ST1;PE1', 'ST2;PE2'],
+    't_local': ['lc_code;lc_etiquet;lc_typelog;lc_st_code', 'LC1;PM Été;SRO;ST1', 'LC2;Client;CLIENT;ST2'],
+    't_position': ['ps_code;ps_1;ps_2;ps_cs_code',
+                   'PS1;FT1;FD1;CS1', 'PS2;FX1;FD1;CS1', 'PS3;FT1;FO1;CS1', 'PS4;FT1;FR1;CS1',
+                   'PS5;FD2;FT1;CS2', 'PS6;FT1;FD3;CS2', 'PS7;FT1;FD4;CS2', 'PS8;FD1;FT1;CS2',
+                   'PS9;FT1;FD1;CS3'],
+}
+
+# Compteurs attendus par cassette : vues, puis REJECT_NO_PE, NO_SITE, NO_LOCAL,
+# FIBRE1_NOT_FOUND, FIBRE2_NOT_FOUND, NOT_TR_DI
+EXPECTED_COUNTERS = {'CS1': [4, 0, 0, 0, 1, 1, 1], 'CS2': [4, 1, 1, 1, 0, 0, 0]}
+
+EXPECTED_REPORT = """=== RAPPORT DEBUG CASSETTES FTTE ===
+
+PM AVEC PLUSIEURS CASSETTES:
+PM LC1: 2 cassettes - CS1, CS2
+
+
+CASSETTES REJETÉES ET RAISONS:
+
+Cassette CS1 (vue 4 fois):
+  - Fibre1 non trouvée: 1 (Fibre1 FX1 non trouvée)
+  - Fibre2 non trouvée: 1 (Fibre2 FO1 non trouvée)
+  - Pas TR-DI: 1 (Pas TR-DI: TR-RA (FT1, FR1))
+
+Cassette CS2 (vue 4 fois):
+  - Pas de PE dans le câble DI: 1 (Pas de PE dans câble DI Sans PE)
+  - Site non trouvé pour le PE: 1 (Site non trouvé pour PE PE9)
+  - Local non trouvé pour le site: 1 (Local non trouvé pour site ST2)
+
+
+REJETS PAR RAISON:
+Fibre1 non trouvée: 1
+Fibre2 non trouvée: 1
+Pas TR-DI: 1
+Pas de PE dans le câble DI: 1
+Site non trouvé pour le PE: 1
+Local non trouvé pour le site: 1
+
+
+STATISTIQUES:
+Total positions traitées: 9
+Total cassettes FTTE: 2
+Cassettes avec positions: 2
+PM distincts trouvés: 1
+"""
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_rejection_counters(workers, tmp_path):
+    zip_path = write_export(tmp_path / 'rejets.zip', **REJECTION_TABLES)
+    with FtteAnalysis(str(zip_path), diagnostics=True, workers=workers) as analysis:
+        rows = list(analysis)
+        diagnostics = analysis.rejections
+        assert len(rows) == 2
+        assert (analysis.stats.positions, analysis.stats.no_pe, analysis.stats.no_site,
+                analysis.stats.no_local) == (9, 1, 1, 1)
+    assert {cassette: list(counters) for cassette, counters in diagnostics.counters.items()} == \
+        EXPECTED_COUNTERS
+    assert dict(diagnostics.pm_cassettes) == {'LC1': {'CS1', 'CS2'}}
+
+
+def test_debug_report(tmp_path, monkeypatch):
+    zip_path = write_export(tmp_path / 'rejets.zip', **REJECTION_TABLES)
+    monkeypatch.chdir(tmp_path)
+    summary = process_ftte_analysis_debug(str(zip_path))
+    assert summary['results'] == 2
+    assert len(glob.glob('ftte_debug_*.csv')) == 1
+    report_files = glob.glob('ftte_rejets_*.txt')
+    assert len(report_files) == 1
+    with open(report_files[0], encoding='utf-8') as f:
+        report = f.read()
+    assert report == EXPECTED_REPORT
+
+
+def test_diagnostics_same_output_as_golden(seeded_export, golden_result, tmp_path):
+    result = run_analysis(seeded_export, tmp_path / 'results.csv', diagnostics=True,
+                          rejections_file=str(tmp_path / 'rejets.txt'))
+    assert result == golden_result
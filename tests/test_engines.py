@@ -0,0 +1,27 @@
+"""
+Les options de l'analyse produisent le résultat de référence de l'analyseur d'origine
+"""
+
+import pytest
+
+from conftest import run_analysis
+
+
+def options_cases(tmp_path):
+    """Options comparées à la référence (répertoires de travail dans tmp_path)"""
+    return {
+        'defaut': {},
+        'direct': {'fibre_plan': 'direct'},
+        'workers': {'workers': 2},
+    }
+
+
+@pytest.mark.parametrize('case', ['defaut', 'direct', 'workers'])
+def test_same_output_as_golden(case, seeded_export, golden_result, tmp_path):
+    options = options_cases(tmp_path)[case]
+    assert run_analysis(seeded_export, tmp_path / 'results.csv', **options) == golden_result
+
+
+def test_golden_has_connections(golden_result):
+    assert golden_result['results'] > 0
+
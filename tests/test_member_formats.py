@@ -0,0 +1,120 @@
+"""
+Formats des fichiers CSV de l'export : encodages, BOM et délimiteurs
+"""
+
+import pytest
+
+from conftest import BASE_TABLES, EXPECTED, connections, run_analysis, write_export
+from ftte_analyzer import EmptyMemberError, MemberDecodeError, MissingColumnsError, SNIFF_SIZE
+
+ENGINES = ('dict', 'sql')
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_base_export(engine, tmp_path):
+    assert connections(write_export(tmp_path / 'base.zip'), engine) == [EXPECTED]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_quoted_delimiter(engine, tmp_path):
+    cable = ('cb_code;cb_etiquet;cb_typelog;cb_nd1;cb_nd2\r\n'
+             '"CB1";"Câble; transport";TR;ND1;ND2\r\n'
+             'CB2;"Câble ""distribution""";DI;PE1;ND3\r\n')
+    zip_path = write_export(tmp_path / 'quoted.zip', t_cable=cable.encode('utf-8'))
+    assert connections(zip_path, engine) == [EXPECTED._replace(
+        cable_transport='Câble; transport', cable_distribution='Câble "distribution"')]
+
+
+def late_latin1_local():
+    """t_local.csv en UTF-8 sur ses premiers SNIFF_SIZE octets, puis une ligne en latin-1"""
+    lines = [b'lc_code;lc_etiquet;lc_typelog;lc_st_code']
+    count = 0
+    while sum(len(line) + 2 for line in lines) <= SNIFF_SIZE:
+        lines.append(f"LCX{count};Local Étage {count};SRO;STX".encode('utf-8'))
+        count += 1
+    lines.append('LC1;PM Été;SRO;ST1'.encode('latin-1'))
+    return b'\r\n'.join(lines) + b'\r\n', len(lines)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_late_latin1_fallback(engine, tmp_path):
+    local, _ = late_latin1_local()
+    zip_path = write_export(tmp_path / 'latin1.zip', t_local=local)
+    assert connections(zip_path, engine) == [EXPECTED]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_late_latin1_strict(engine, tmp_path):
+    local, line = late_latin1_local()
+    zip_path = write_export(tmp_path / 'latin1.zip', t_local=local)
+    with pytest.raises(MemberDecodeError) as error:
+        connections(zip_path, engine, strict_encoding=True)
+    assert error.value.file_name == 't_local.csv'
+    assert error.value.line == line
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_latin1_file(engine, tmp_path):
+    tables = {name[:-len('.csv')]: '\r\n'.join(lines).encode('latin-1') + b'\r\n'
+              for name, lines in BASE_TABLES.items()}
+    zip_path = write_export(tmp_path / 'latin1.zip', **tables)
+    assert connections(zip_path, engine, strict_encoding=True) == [EXPECTED]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_bom(engine, tmp_path):
+    tables = {name[:-len('.csv')]: '\r\n'.join(lines).encode('utf-8-sig') + b'\r\n'
+              for name, lines in BASE_TABLES.items()}
+    zip_path = write_export(tmp_path / 'bom.zip', **tables)
+    assert connections(zip_path, engine) == [EXPECTED]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_commas_in_header(engine, tmp_path):
+    # ';' l'emporte sur les virgules des noms de colonnes
+    cable = ('cb_code;cb_etiquet;"cb_commentaire, libre";cb_typelog;cb_nd1;cb_nd2\r\n'
+             'CB1;Câble transport;"pose, tirage";TR;ND1;ND2\r\n'
+             'CB2;Câble distribution;;DI;PE1;ND3\r\n')
+    zip_path = write_export(tmp_path / 'header.zip', t_cable=cable.encode('utf-8'))
+    assert connections(zip_path, engine) == [EXPECTED]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_comma_delimiter(engine, tmp_path):
+    tables = {name[:-len('.csv')]: '\r\n'.join(lines).replace(';', ',').encode('utf-8') + b'\r\n'
+              for name, lines in BASE_TABLES.items()}
+    zip_path = write_export(tmp_path / 'comma.zip', **tables)
+    assert connections(zip_path, engine) == [EXPECTED]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_missing_column(engine, tmp_path):
+    zip_path = write_export(tmp_path / 'missing.zip', t_fibre=['fo_code;fo_cable', 'FT1;CB1', 'FD1;CB2'])
+    with pytest.raises(MissingColumnsError) as error:
+        connections(zip_path, engine)
+    assert error.value.file_name == 't_fibre.csv'
+    assert error.value.columns == ['fo_cb_code']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_utf16_rejected(engine, tmp_path):
+    site = '\r\n'.join(BASE_TABLES['t_site.csv']).encode('utf-16')
+    with pytest.raises(MemberDecodeError):
+        connections(write_export(tmp_path / 'utf16.zip', t_site=site), engine)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_empty_member(engine, tmp_path):
+    with pytest.raises(EmptyMemberError):
+        connections(write_export(tmp_path / 'empty.zip', t_local=b''), engine)
+
+
+@pytest.mark.parametrize('params', [
+    {'encoding': 'latin-1'},
+    {'encoding': 'utf-8-sig'},
+    {'delimiter': ','},
+    {'delimiter': 'mixte'},
+], ids=lambda params: '-'.join(params.values()))
+def test_generated_formats(params, generated_export, golden_result, tmp_path):
+    # Mêmes données que l'export de référence, seul le format des fichiers change
+    assert run_analysis(generated_export(**params), tmp_path / 'results.csv') == golden_result
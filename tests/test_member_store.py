@@ -0,0 +1,57 @@
+"""
+Magasin des fichiers décompressés (--member-store) : mêmes résultats, extraction
+unique et taille bornée
+"""
+
+import os
+
+import pytest
+
+from conftest import EXPECTED, connections, run_analysis, write_export
+from ftte_analyzer import FtteAnalysis
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'workers': 2, 'member_store_size_mb': 1},
+    {'engine': 'sql'},
+    {'compact': True, 'fibre_plan': 'semijoin'},
+], ids=['defaut', 'workers', 'sql', 'compact-semijoin'])
+def test_member_store_same_output_as_golden(options, seeded_export, golden_result, tmp_path):
+    result = run_analysis(seeded_export, tmp_path / 'results.csv', member_store=str(tmp_path / 'store'),
+                          **options)
+    assert result == golden_result
+
+
+def test_cached_indexes_with_member_store(seeded_export, golden_result, tmp_path):
+    for _ in range(2):
+        result = run_analysis(seeded_export, tmp_path / 'results.csv', member_store=str(tmp_path / 'store'),
+                              cache_dir=str(tmp_path / 'cache'))
+        assert result == golden_result
+
+
+def test_members_extracted_once(tmp_path):
+    zip_path = write_export(tmp_path / 'export.zip')
+    store = str(tmp_path / 'store')
+    with FtteAnalysis(str(zip_path), member_store=store) as analysis:
+        assert list(analysis) == [EXPECTED]
+        assert 't_position.csv' in analysis.member_store.extracted
+    with FtteAnalysis(str(zip_path), member_store=store) as analysis:
+        assert list(analysis) == [EXPECTED]
+        assert analysis.member_store.extracted == []
+
+
+def test_store_evicts_other_exports(tmp_path):
+    store = str(tmp_path / 'store')
+    first = write_export(tmp_path / 'first.zip')
+    second = write_export(tmp_path / 'second.zip', t_local=['lc_code;lc_etiquet;lc_typelog;lc_st_code',
+                                                            'LC1;PM Hiver;SRO;ST1'])
+    assert connections(first, member_store=store, member_store_size_mb=0) == [EXPECTED]
+    first_files = set(os.listdir(store))
+    
+    # Budget nul : seuls les fichiers de l'export en cours restent dans le magasin
+    assert connections(second, member_store=store, member_store_size_mb=0) == [EXPECTED._replace(
+        pm_label='PM Hiver')]
+    second_files = set(os.listdir(store))
+    assert len(second_files) == 6
+    assert first_files & second_files == {name for name in first_files if 't_local' not in name}
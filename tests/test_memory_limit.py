@@ -0,0 +1,38 @@
+"""
+Jointure partitionnée (--memory-limit) : mêmes résultats que l'analyseur d'origine
+"""
+
+import pytest
+
+from conftest import run_analysis
+from ftte_analyzer import AnalysisError, FtteAnalysis
+
+
+@pytest.mark.parametrize('compact', [False, True], ids=['dict', 'compact'])
+def test_partitioned_same_output_as_golden(compact, seeded_export, golden_result, tmp_path):
+    result = run_analysis(seeded_export, tmp_path / 'results.csv', memory_limit_mb=1, spill_dir=str(tmp_path),
+                          compact=compact)
+    assert result == golden_result
+
+
+def test_small_budget_partitions(seeded_export, tmp_path):
+    with FtteAnalysis(str(seeded_export), memory_limit_mb=1, spill_dir=str(tmp_path)) as analysis:
+        assert analysis.partitions > 1
+        assert analysis.fibre_plan == 'partition'
+
+
+def test_large_budget_keeps_options(seeded_export, golden_result, tmp_path):
+    # Index dans le budget : pas de partition, les options s'appliquent
+    with FtteAnalysis(str(seeded_export), memory_limit_mb=1000, diagnostics=True) as analysis:
+        assert analysis.partitions is None
+        assert analysis.rejections is not None
+    result = run_analysis(seeded_export, tmp_path / 'results.csv', memory_limit_mb=1000, workers=2,
+                          cache_dir=str(tmp_path / 'cache'))
+    assert result == golden_result
+
+
+@pytest.mark.parametrize('option', ['cache_dir', 'diagnostics', 'workers'])
+def test_partitioned_rejects_options(option, seeded_export, tmp_path):
+    value = {'cache_dir': str(tmp_path / 'cache'), 'diagnostics': True, 'workers': 2}[option]
+    with pytest.raises(AnalysisError, match='--' + option.replace('_', '-')):
+        FtteAnalysis(str(seeded_export), memory_limit_mb=1, spill_dir=str(tmp_path), **{option: value})
@@ -0,0 +1,108 @@
+"""
+Formats du fichier de résultats (--format) : relecture de chaque format comparée aux
+lignes du CSV de référence, sur plusieurs lots pour les formats par colonnes
+"""
+
+import io
+import csv
+import gzip
+import sqlite3
+
+import pytest
+
+import ftte_analyzer
+from ftte_analyzer import OUTPUT_FORMATS, RESULT_FIELDNAMES, missing_output_dependency, process_ftte_analysis
+
+
+def read_csv_text(f):
+    return [tuple(row) for row in csv.reader(f, delimiter=';')]
+
+
+def read_csv_gz(path):
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        return read_csv_text(f)
+
+
+def read_csv_zst(path):
+    try:
+        from compression import zstd
+    except ImportError:
+        import zstandard
+        with open(path, 'rb') as raw:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+            return read_csv_text(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    with zstd.open(path, 'rt', encoding='utf-8', newline='') as f:
+        return read_csv_text(f)
+
+
+def read_table(table):
+    assert table.column_names == RESULT_FIELDNAMES
+    return [tuple(row) for row in zip(*(table.column(name).to_pylist() for name in RESULT_FIELDNAMES))]
+
+
+def read_parquet(path):
+    import pyarrow.parquet
+    return read_table(pyarrow.parquet.read_table(path))
+
+
+def read_arrow(path):
+    import pyarrow.ipc
+    with pyarrow.ipc.open_stream(path) as reader:
+        return read_table(reader.read_all())
+
+
+def read_sqlite(path):
+    connection = sqlite3.connect(path)
+    try:
+        cursor = connection.execute("SELECT * FROM ftte_results")
+        assert [column[0] for column in cursor.description] == RESULT_FIELDNAMES
+        return [tuple(row) for row in cursor]
+    finally:
+        connection.close()
+
+
+# Lecteurs : lignes avec l'en-tête pour les CSV, sans pour les formats par colonnes
+READERS = {
+    'csv.gz': (read_csv_gz, True),
+    'csv.zst': (read_csv_zst, True),
+    'parquet': (read_parquet, False),
+    'arrow': (read_arrow, False),
+    'sqlite': (read_sqlite, False),
+}
+
+
+@pytest.mark.parametrize('pipeline', [True, False], ids=['pipeline', 'sequentiel'])
+@pytest.mark.parametrize('output_format', list(READERS))
+def test_round_trip(output_format, pipeline, seeded_export, golden_rows, tmp_path, monkeypatch):
+    missing = missing_output_dependency(output_format)
+    if missing:
+        pytest.skip(missing)
+    # Lots de 500 lignes : plusieurs dictionnaires successifs pour les formats par colonnes
+    monkeypatch.setattr(ftte_analyzer, 'OUTPUT_BATCH_ROWS', 500)
+    path = tmp_path / f"results{OUTPUT_FORMATS[output_format]}"
+    summary = process_ftte_analysis(str(seeded_export), output_file=str(path),
+                                    output_format=output_format, pipeline=pipeline)
+    assert summary['results'] == len(golden_rows)
+    reader, has_header = READERS[output_format]
+    rows = reader(path)
+    if has_header:
+        assert rows[0] == tuple(RESULT_FIELDNAMES)
+        rows = rows[1:]
+    assert rows == golden_rows
+
+
+def test_sqlite_dictionary(seeded_export, golden_rows, tmp_path, monkeypatch):
+    # Chaque valeur des colonnes répétées n'est stockée qu'une fois dans la table valeurs
+    monkeypatch.setattr(ftte_analyzer, 'OUTPUT_BATCH_ROWS', 500)
+    path = tmp_path / 'results.sqlite'
+    process_ftte_analysis(str(seeded_export), output_file=str(path), output_format='sqlite')
+    connection = sqlite3.connect(path)
+    try:
+        stored = dict(connection.execute("SELECT colonne, COUNT(*) FROM valeurs GROUP BY colonne"))
+        codes = connection.execute("SELECT COUNT(*) FROM valeurs WHERE code >= ("
+                                   "SELECT COUNT(*) FROM valeurs v WHERE v.colonne = valeurs.colonne)")
+        assert codes.fetchone()[0] == 0
+    finally:
+        connection.close()
+    assert stored == {index: len({row[index] for row in golden_rows})
+                      for index in ftte_analyzer.DICTIONARY_COLUMNS}
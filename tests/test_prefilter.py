@@ -0,0 +1,48 @@
+"""
+Préfiltre de t_position.csv (PositionPrefilter) : champs entre guillemets sur
+plusieurs lignes et code de cassette FTTE présent hors de la colonne ps_cs_code
+"""
+
+import pytest
+
+import ftte_analyzer
+from conftest import EXPECTED, connections, write_export
+
+# PS1 : seule position FTTE, avec un commentaire sur deux lignes qui contient « CS1; »
+# PS2 : cassette non FTTE dont le commentaire entre guillemets cite CS1
+# PS3 : commentaire dont la deuxième ligne ressemble à une position de CS1
+# PS5 : après les champs multi-lignes, le filtrage reprend normalement
+QUOTED_POSITIONS = (
+    'ps_code;ps_1;ps_2;ps_cs_code;ps_comment\r\n'
+    'PS1;FT1;FD1;CS1;"ligne 1\r\nCS1;FT1;FD1 ; ligne 2"\r\n'
+    'PS2;FT1;FD1;CS2;"voir CS1"\r\n'
+    'PS3;FT1;FD1;CS9;"début\r\nPS4;FT1;FD1;CS1;x\r\nfin ""cité"""\r\n'
+    'PS5;FD1;FT1;CS1;Câble inversé\r\n'
+    'PS6;FT1;FD1;CS9;\r\n'
+).encode('utf-8')
+
+EXPECTED_CONNECTIONS = [EXPECTED, EXPECTED]
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'pipeline': False},
+    {'fibre_plan': 'direct'},
+    {'workers': 2},
+    {'engine': 'sql'},
+], ids=['defaut', 'sans-pipeline', 'direct', 'workers', 'sql'])
+def test_quoted_fields(options, tmp_path, monkeypatch):
+    # Échantillon de détection et blocs (mode parallèle) de quelques lignes : les champs
+    # multi-lignes chevauchent deux blocs
+    monkeypatch.setattr(ftte_analyzer, 'SNIFF_SIZE', 48)
+    monkeypatch.setattr(ftte_analyzer, 'POSITION_BLOCK_SIZE', 32)
+    zip_path = write_export(tmp_path / 'quoted.zip', t_position=QUOTED_POSITIONS)
+    assert connections(zip_path, **options) == EXPECTED_CONNECTIONS
+
+
+def test_quoted_fields_counts(tmp_path):
+    zip_path = write_export(tmp_path / 'quoted.zip', t_position=QUOTED_POSITIONS)
+    with ftte_analyzer.FtteAnalysis(str(zip_path)) as analysis:
+        list(analysis)
+        # 5 positions : les lignes des champs entre guillemets ne sont pas comptées à part
+        assert analysis.stats.positions == 5
@@ -0,0 +1,67 @@
+"""
+Rapport --profile (JSON) : clés du rapport et mesures de chaque étape, lues par
+ftte_benchmark.py
+"""
+
+import json
+
+import pytest
+
+from conftest import write_export
+from ftte_analyzer import process_ftte_analysis
+
+REPORT_KEYS = {'zip_path', 'output_file', 'date', 'options', 'elapsed_s', 'peak_rss_mb',
+               'peak_rss_children_mb', 'counters', 'stages'}
+OPTION_KEYS = {'fibre_plan', 'workers', 'compact', 'cache_dir', 'output_format', 'engine',
+               'memory_limit_mb', 'pipeline', 'strict_encoding', 'trace', 'max_hops', 'member_store'}
+# Mesures de temps et de mémoire : présentes, valeurs dépendant de la machine
+TIMING_KEYS = ('wall_s', 'cpu_s', 'peak_rss_mb')
+
+UTF8 = {'encoding': 'utf-8', 'bom': False, 'delimiter': ';', 'fallbacks': 0}
+
+
+def load_stage(stage, process, file_name, rows_read, rows_kept, size):
+    return {'stage': stage, 'process': process, 'members': [file_name], 'formats': {file_name: UTF8},
+            'rows_read': rows_read, 'rows_kept': rows_kept, 'bytes_decompressed': size}
+
+
+def expected_stages(pool):
+    """Étapes de l'export de base ; avec --workers, les tables indépendantes sont chargées par le pool"""
+    loader = 'pool' if pool else 'main'
+    return [
+        load_stage('cassettes', loader, 't_cassette.csv', 2, 1, 47),
+        load_stage('cables', loader, 't_cable.csv', 2, 2, 114),
+        load_stage('fibres', 'main', 't_fibre.csv', 2, 2, 38),
+        load_stage('sites', loader, 't_site.csv', 1, 1, 29),
+        load_stage('locals', loader, 't_local.csv', 1, 1, 64),
+        load_stage('positions', 'main', 't_position.csv', 2, 1, 64),
+        {'stage': 'output', 'process': 'main', 'format': 'csv', 'members': [], 'rows_read': 1,
+         'rows_kept': 1, 'bytes_decompressed': 0, 'bytes_written': 192},
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_profile_report(workers, tmp_path):
+    zip_path = write_export(tmp_path / 'base.zip')
+    output_file = tmp_path / 'results.csv'
+    summary = process_ftte_analysis(str(zip_path), output_file=str(output_file), profile=True, workers=workers)
+    with open(tmp_path / 'results_profile.json', encoding='utf-8') as f:
+        report = json.load(f)
+    
+    assert set(report) == REPORT_KEYS
+    assert report['zip_path'] == str(zip_path)
+    assert report['output_file'] == str(output_file)
+    assert set(report['options']) == OPTION_KEYS
+    assert report['options']['workers'] == workers
+    assert report['counters'] == {'positions': 2, 'results': 1, 'no_pe': 0, 'no_site': 0, 'no_local': 0,
+                                  'traced': 0}
+    assert report['counters']['results'] == summary['results']
+    assert report['elapsed_s'] >= 0
+    
+    stages = []
+    for stage in report['stages']:
+        for key in TIMING_KEYS:
+            value = stage.pop(key)
+            assert value is None or value >= 0, key
+        stages.append(stage)
+    assert stages == expected_stages(pool=workers > 1)
@@ -0,0 +1,100 @@
+"""
+Serveur de requêtes (ftte_server.py) : recherches en JSON sur HTTP, positions
+rejetées avec leur motif et rechargement à chaud d'un export plus récent
+"""
+
+import os
+import json
+import time
+import threading
+import http.client
+
+import pytest
+
+from conftest import BASE_TABLES, write_export
+from ftte_analyzer import REJECT_NO_PE, REJECT_REASONS
+from ftte_server import RELOAD_SETTLE_DELAY, QueryService, create_server
+
+# Exports successifs d'un même SRO (horodatage dans le nom)
+S39 = 'export_SRO-T1_REC_20250929-080034_S39.zip'
+S40 = 'export_SRO-T1_REC_20251006-080034_S40.zip'
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Serveur HTTP sur un port libre, export S39 chargé ; retourne (service, get)"""
+    zip_path = write_export(tmp_path / S39,
+                            t_position=BASE_TABLES['t_position.csv'] + ['PS3;FX1;FD1;CS1'])
+    service = QueryService()
+    service.load('SRO-T1', str(zip_path))
+    http_server = create_server(service, port=0)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    
+    def get(path):
+        connection = http.client.HTTPConnection(*http_server.server_address, timeout=10)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read().decode('utf-8'))
+        finally:
+            connection.close()
+    
+    yield service, get
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def test_lookup(server):
+    _, get = server
+    status, body = get('/pm/PM%20%C3%89t%C3%A9')
+    assert status == 200
+    result = body['exports']['SRO-T1']
+    assert result['cassettes'] == ['CS1']
+    assert result['pm'] == [['LC1', 'PM Été']]
+    assert result['connections'] == [{
+        'Cassette FTTE': 'CS1', 'Fibre Transport': 'FT1', 'Cable Transport': 'Câble transport',
+        'Fibre Distribution': 'FD1', 'Cable Distribution': 'Câble distribution', 'Noeud PE': 'PE1',
+        'Site': 'ST1', 'Local PM': 'LC1', 'Etiquette PM': 'PM Été',
+        'Code Cable Transport': 'CB1', 'Code Cable Distribution': 'CB2'}]
+    assert get('/cassette/CS9')[0] == 404
+
+
+def test_rejected_position(server):
+    _, get = server
+    status, body = get('/fibre/FX1')
+    assert status == 200
+    result = body['exports']['SRO-T1']
+    assert result['total'] == 0
+    assert result['rejected'] == [{
+        'Cassette FTTE': 'CS1', 'Fibre 1': 'FX1', 'Fibre 2': 'FD1', 'Code Cable 1': None, 'Cable 1': None,
+        'Code Cable 2': 'CB2', 'Cable 2': 'Câble distribution', 'Motif': 'Fibre1 non trouvée'}]
+    summary = get('/exports')[1]['SRO-T1']
+    assert (summary['positions'], summary['ftte_positions'], summary['connections']) == (3, 2, 1)
+    assert summary['rejected'] == {'Fibre1 non trouvée': 1}
+
+
+def test_hot_reload(server, tmp_path):
+    service, get = server
+    zip_path = write_export(tmp_path / S40,
+                            t_local=['lc_code;lc_etiquet;lc_typelog;lc_st_code', 'LC1;PM Hiver;SRO;ST1'])
+    # Export déposé depuis plus de RELOAD_SETTLE_DELAY secondes (copie terminée)
+    settled = time.time() - RELOAD_SETTLE_DELAY - 1
+    os.utime(zip_path, (settled, settled))
+    service.check_updates()
+    
+    status, body = get('/cassette/CS1')
+    assert status == 200
+    assert body['exports']['SRO-T1']['pm'] == [['LC1', 'PM Hiver']]
+    assert body['exports']['SRO-T1']['rejected_total'] == 0
+    assert get('/exports')[1]['SRO-T1']['zip'] == str(zip_path)
+
+
+def test_connections_same_as_golden(seeded_export, golden_rows, golden_result):
+    service = QueryService()
+    service.load('SRO', str(seeded_export))
+    export = service.exports['SRO']
+    assert [connection[:9] for connection in export.connections] == golden_rows
+    summary = export.summary()
+    assert summary['positions'] == golden_result['positions']
+    assert summary['rejected'].get(REJECT_REASONS[REJECT_NO_PE], 0) == golden_result['no_pe']
@@ -0,0 +1,31 @@
+"""
+Moteur SQL (--engine sql) : mêmes résultats que l'analyseur d'origine, options du
+moteur dict refusées
+"""
+
+import pytest
+
+from conftest import connections, run_analysis, write_export
+from ftte_analyzer import AnalysisError, process_ftte_analysis
+
+
+@pytest.mark.parametrize('fibre_plan', ['auto', 'direct', 'semijoin'])
+def test_sql_same_output_as_golden(fibre_plan, seeded_export, golden_result, tmp_path):
+    result = run_analysis(seeded_export, tmp_path / 'results.csv', engine='sql', sql_dir=str(tmp_path),
+                          fibre_plan=fibre_plan)
+    assert result == golden_result
+
+
+def requested_option(option, tmp_path):
+    """Valeur demandée pour une option du moteur dict"""
+    return {'cache_dir': str(tmp_path / 'cache'), 'compact': True, 'diagnostics': True, 'workers': 2}[option]
+
+
+@pytest.mark.parametrize('option', ['cache_dir', 'compact', 'diagnostics', 'workers'])
+def test_sql_rejects_dict_options(option, tmp_path):
+    zip_path = write_export(tmp_path / 'export.zip')
+    options = {option: requested_option(option, tmp_path)}
+    with pytest.raises(AnalysisError, match='--' + option.replace('_', '-')):
+        connections(zip_path, 'sql', **options)
+    assert process_ftte_analysis(str(zip_path), output_file=str(tmp_path / 'results.csv'), engine='sql',
+                                 **options) is None
@@ -0,0 +1,91 @@
+"""
+Suivi des chemins (--trace) au-delà de la cassette FTTE
+"""
+
+import pytest
+
+from conftest import EXPECTED, write_export
+from ftte_analyzer import AnalysisError, FtteAnalysis
+
+# Câbles TR, DI sans nœud PE et DI avec nœud PE (dans cb_nd2) ; CS9 n'est pas une cassette FTTE
+TRACE_TABLES = {
+    't_cassette': ['cs_code;cs_type;cs_bp_code', 'CS1;E;', 'CS9;S;BP1'],
+    't_cable': ['cb_code;cb_etiquet;cb_typelog;cb_nd1;cb_nd2',
+                'CT1;Transport 1;TR;ND1;ND2', 'CT2;Transport 2;TR;ND3;ND4',
+                'CD0;Distribution sans PE;DI;ND5;ND6', 'CD1;Distribution 1;DI;ND7;PE1'],
+    't_fibre': ['fo_code;fo_cb_code', 'FT1;CT1', 'FT2;CT2', 'FT3;CT2', 'FA;CD0', 'FB;CD0', 'FD1;CD1'],
+}
+
+TRACED = EXPECTED._replace(cable_transport='Transport 1', cable_distribution='Distribution 1')
+
+
+def trace_export(path, *positions):
+    """Export TRACE_TABLES avec les positions (cassette, fibre 1, fibre 2) données"""
+    lines = ['ps_code;ps_1;ps_2;ps_cs_code']
+    lines += [f"PS{number};{fibre1};{fibre2};{cassette}"
+              for number, (cassette, fibre1, fibre2) in enumerate(positions, 1)]
+    return write_export(path, t_position=lines, **TRACE_TABLES)
+
+
+def traced(zip_path, max_hops=16):
+    """Connexions et compteurs de l'analyse avec suivi des chemins"""
+    with FtteAnalysis(str(zip_path), trace=True, max_hops=max_hops) as analysis:
+        return list(analysis), analysis.stats
+
+
+@pytest.mark.parametrize('option, value', [
+    ('engine', 'sql'), ('fibre_plan', 'semijoin'), ('memory_limit_mb', 1), ('cache_dir', 'cache'),
+    ('diagnostics', True),
+])
+def test_trace_rejects_options(option, value, tmp_path):
+    if option == 'cache_dir':
+        value = str(tmp_path / value)
+    with pytest.raises(AnalysisError, match='Suivi des chemins'):
+        FtteAnalysis(str(write_export(tmp_path / 'export.zip')), trace=True, **{option: value})
+
+
+def test_multi_hop_tr_tr_di(tmp_path):
+    # FT1 (TR) - FT2 (TR) sur la cassette FTTE, puis FT2 - FT3 - FD1 (DI avec PE) ailleurs
+    zip_path = trace_export(tmp_path / 'chain.zip', ('CS1', 'FT1', 'FT2'), ('CS9', 'FT2', 'FT3'),
+                            ('CS9', 'FT3', 'FD1'))
+    rows, stats = traced(zip_path)
+    assert rows == [TRACED._replace(fibre_transport='FT1', fibre_distribution='FD1')]
+    assert (stats.results, stats.traced, stats.no_pe, stats.positions) == (1, 1, 0, 3)
+    
+    # Deux épissures à suivre au-delà de la cassette : hors de portée avec --max-hops 1
+    rows, stats = traced(zip_path, max_hops=1)
+    assert rows == [] and stats.results == 0
+    rows, _ = traced(zip_path, max_hops=2)
+    assert len(rows) == 1
+    
+    # Sans suivi, une position TR→TR n'est pas une connexion
+    with FtteAnalysis(str(zip_path)) as analysis:
+        assert list(analysis) == []
+
+
+def test_di_di_position(tmp_path):
+    # Aucune fibre TR sur la cassette : FT1 est derrière FA, FD1 est sur la cassette
+    zip_path = trace_export(tmp_path / 'didi.zip', ('CS1', 'FA', 'FD1'), ('CS9', 'FT1', 'FA'))
+    rows, stats = traced(zip_path)
+    assert rows == [TRACED._replace(fibre_transport='FT1', fibre_distribution='FD1')]
+    assert stats.traced == 1
+
+
+@pytest.mark.parametrize('max_hops', [2, 16])
+def test_splice_loop(max_hops, tmp_path):
+    # FT1 - FA sur la cassette, FA - FB - FT1 ferment une boucle sans fibre DI avec nœud PE
+    zip_path = trace_export(tmp_path / 'loop.zip', ('CS1', 'FT1', 'FA'), ('CS9', 'FA', 'FB'),
+                            ('CS9', 'FB', 'FT1'))
+    rows, stats = traced(zip_path, max_hops)
+    assert rows == []
+    assert (stats.positions, stats.results, stats.no_pe) == (3, 0, 1)
+
+
+def test_dangling_splice(tmp_path):
+    # FA (DI sans nœud PE) n'est épissurée qu'à une fibre absente de t_fibre.csv ;
+    # FT2 (TR) à une fibre DI sans nœud PE qui ne mène nulle part
+    zip_path = trace_export(tmp_path / 'dangling.zip', ('CS1', 'FT1', 'FA'), ('CS9', 'FA', 'FX'),
+                            ('CS1', 'FT3', 'FT2'), ('CS9', 'FT2', 'FB'))
+    rows, stats = traced(zip_path)
+    assert rows == []
+    assert (stats.positions, stats.results, stats.no_pe, stats.traced) == (4, 0, 1, 0)
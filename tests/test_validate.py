@@ -0,0 +1,70 @@
+"""
+Contrôle d'intégrité (--validate) : erreurs comptées par contrôle, arrêt au-delà de --max-errors
+"""
+
+import json
+
+from conftest import write_export
+from ftte_analyzer import INTEGRITY_CHECKS, ExportZip, process_validation, validate_export
+
+# Une erreur de chaque contrôle d'INTEGRITY_CHECKS, dans l'ordre de lecture des tables
+BROKEN_TABLES = {
+    't_cassette': ['cs_code;cs_type;cs_bp_code', 'CS1;E;', 'CS2;E;BP1', 'CS1;S;'],
+    't_cable': ['cb_code;cb_etiquet;cb_typelog;cb_nd1;cb_nd2',
+                'CB1;Transport;TR;ND1;ND2', 'CB2;Distribution;DI;PE1;ND3', 'CB3;Sans site;DI;PE9;ND4',
+                'CB4;Site sans SRO;DI;ND5;PE2', 'CB1;Doublon;TR;ND1;ND2'],
+    't_site': ['st_code;st_nd_code', 'ST1;PE1', 'ST2;PE2', 'ST1;ND7', 'ST3;ND7'],
+    't_local': ['lc_code;lc_etiquet;lc_typelog;lc_st_code', 'LC1;PM 1;SRO;ST1', 'LC2;PM 2;SRO;ST1',
+                'LC3;Hors site;CLIENT;ST8', 'LC1;Doublon;CLIENT;ST1'],
+    't_fibre': ['fo_code;fo_cb_code', 'FT1;CB1', 'FD1;CB2', 'FX;CB9', 'FT1;CB1'],
+    't_position': ['ps_code;ps_1;ps_2;ps_cs_code', 'PS1;FT1;FD1;CS1', 'PS2;FT1;FZ;CS7', 'PS3;;FD1;'],
+}
+
+
+def validate(zip_path, max_errors=None):
+    with ExportZip(str(zip_path), verbose=False) as zip_file:
+        return validate_export(zip_file, max_errors)
+
+
+def test_clean_export(tmp_path):
+    report = validate(write_export(tmp_path / 'export.zip'))
+    assert report.total_errors == 0 and not report.failed
+    assert report.rows == {'t_cassette.csv': 2, 't_cable.csv': 2, 't_site.csv': 1, 't_local.csv': 1,
+                           't_fibre.csv': 2, 't_position.csv': 2}
+
+
+def test_broken_export_counts(tmp_path):
+    report = validate(write_export(tmp_path / 'broken.zip', **BROKEN_TABLES))
+    assert report.errors == dict.fromkeys(INTEGRITY_CHECKS, 1)
+    assert report.total_errors == len(INTEGRITY_CHECKS)
+    assert not report.failed
+    assert report.checked['position_cassette'] == 2
+    assert report.checked['position_fibre'] == 5
+    assert report.checked['fibre_cable'] == 4
+    assert report.samples['cable_pe_site'] == ['câble CB3 -> PE9']
+    assert report.samples['position_fibre'] == ['fibre FZ (cassette CS7)']
+
+
+def test_stops_at_max_errors(tmp_path):
+    zip_path = write_export(tmp_path / 'broken.zip', **BROKEN_TABLES)
+    # 4e erreur (cable_pe_site) dans t_site.csv : fibres et positions ne sont pas lues
+    report = validate(zip_path, max_errors=3)
+    assert report.failed and report.stopped == 't_site.csv'
+    assert report.total_errors == 4
+    assert 't_fibre.csv' not in report.rows and 't_position.csv' not in report.rows
+    
+    report = validate(zip_path, max_errors=len(INTEGRITY_CHECKS))
+    assert not report.failed
+
+
+def test_report_file(tmp_path):
+    zip_path = write_export(tmp_path / 'broken.zip', **BROKEN_TABLES)
+    report_file = tmp_path / 'integrite.json'
+    report = process_validation(str(zip_path), max_errors=3, report_file=str(report_file))
+    assert report.failed
+    with open(report_file, encoding='utf-8') as f:
+        document = json.load(f)
+    assert document['stopped'] == 't_site.csv'
+    assert document['total_errors'] == 4 and document['max_errors'] == 3
+    assert document['zip'] == 'broken.zip'
+    assert set(document['checks']) == set(INTEGRITY_CHECKS)